@@ -14,9 +14,18 @@ Created: 2025
 
 import json
 import csv
+import os
+import sys
+import atexit
+import codecs
+import mmap
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-appliances = []
+import ingest
+import snapshot
+
 audit_log = []
 last_deleted = None
 
@@ -31,6 +40,101 @@ def choose_status():
             return STATUS_OPTIONS[int(choice) - 1]
         print("Invalid choice, try again.")
 
+# Status names by code; statuses outside STATUS_OPTIONS (e.g. from a CSV) get appended
+STATUS_NAMES = list(STATUS_OPTIONS)
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+def status_code(name):
+    code = STATUS_CODES.get(name)
+    if code is None:
+        code = STATUS_CODES[name] = len(STATUS_NAMES)
+        STATUS_NAMES.append(name)
+    return code
+
+HISTORY_FIELD_SEP = '\x1f'
+HISTORY_ENTRY_SEP = '\x1e'
+
+class ApplianceRecord:
+    """One appliance, stored compactly.
+
+    Store and brand names are interned, the status is a small int code into
+    STATUS_NAMES and the status history stays packed in a single string until
+    someone reads it. Supports the dict-style access (record['brand'],
+    .get(), 'history' in record) the menus were written against, and
+    from_dict()/to_dict() convert to and from the JSON save format.
+    """
+    __slots__ = ('store_name', 'item_number', 'brand', 'model', 'serial', '_status', 'notes', 'archived', '_history')
+    FIELDS = ('store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes', 'archived', 'history')
+
+    def __init__(self, store_name, item_number, brand='', model='', serial='', status='',
+                 notes='', archived=False, history=None):
+        self.store_name = sys.intern(store_name)
+        self.item_number = item_number
+        self.brand = sys.intern(brand)
+        self.model = model
+        self.serial = serial
+        self.status = status
+        self.notes = notes
+        self.archived = archived
+        self.history = history
+
+    @property
+    def status(self):
+        return STATUS_NAMES[self._status]
+
+    @status.setter
+    def status(self, name):
+        self._status = status_code(name)
+
+    @property
+    def history(self):
+        if not self._history:
+            return []
+        return [
+            tuple(entry.split(HISTORY_FIELD_SEP)) if HISTORY_FIELD_SEP in entry else entry
+            for entry in self._history.split(HISTORY_ENTRY_SEP)
+        ]
+
+    @history.setter
+    def history(self, entries):
+        if not entries:
+            self._history = None
+            return
+        self._history = HISTORY_ENTRY_SEP.join(
+            HISTORY_FIELD_SEP.join(entry) if isinstance(entry, (tuple, list)) else str(entry)
+            for entry in entries or []
+        ) or None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data[field] for field in cls.FIELDS if data.get(field) is not None})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self.FIELDS else default
+
+    def update(self, changes):
+        for field, value in changes.items():
+            self[field] = value
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
 def log_action(action, details):
     """Add an action to the audit log with timestamp."""
     audit_log.append({
@@ -39,6 +143,288 @@ def log_action(action, details):
         'details': details
     })
 
+def appliance_key(store_name, item_number):
+    """Normalized (store, item number) key, matching the web app's unique index.
+
+    The web app strips both parts before storing or checking them, so the
+    index sees the same lower(store)/item pair this key does.
+    """
+    return (store_name.strip().lower(), item_number.strip())
+
+class Inventory:
+    """Appliance records plus hash indexes for the lookups the menus make.
+
+    Records are indexed by normalized (store, item number), store, status,
+    brand and archived flag. Any change to those fields has to go through
+    add(), update() or set_archived() so the indexes stay in step.
+    """
+
+    def __init__(self):
+        self.journal = None    # set once the saved inventory has been loaded
+        self.clear()
+
+    def clear(self):
+        self.records = {}      # record id -> record, in insertion order
+        self.ids = {}          # id(record) -> record id
+        self.by_key = {}       # appliance_key -> record id
+        self.by_store = {}     # lowercase store -> {record id: None}
+        self.by_status = {}
+        self.by_brand = {}
+        self.archived = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(list(self.records.values()))
+
+    def _buckets(self, record):
+        return (
+            (self.by_store, record.store_name.strip().lower()),
+            (self.by_status, record.status.strip().lower()),
+            (self.by_brand, record.brand.strip().lower()),
+        )
+
+    def _index(self, rid, record):
+        buckets = self._buckets(record)
+        self.by_key.setdefault((buckets[0][1], record.item_number.strip()), rid)
+        for index, value in buckets:
+            index.setdefault(value, {})[rid] = None
+        if record.archived:
+            self.archived[rid] = None
+
+    def _unindex(self, rid, record):
+        key = appliance_key(record['store_name'], record['item_number'])
+        store_bucket = self.by_store.get(key[0], {})
+        for index, value in self._buckets(record):
+            bucket = index.get(value, {})
+            bucket.pop(rid, None)
+            if not bucket:
+                index.pop(value, None)
+        self.archived.pop(rid, None)
+        if self.by_key.get(key) == rid:
+            del self.by_key[key]
+            # Older saves can hold duplicates; point the key at the next one
+            for other in store_bucket:
+                other_record = self.records[other]
+                if appliance_key(other_record['store_name'], other_record['item_number']) == key:
+                    self.by_key[key] = other
+                    break
+
+    def add(self, record, allow_duplicate=False):
+        """Add a record (or a dict of its fields); raises ValueError if its store/item number is taken."""
+        if isinstance(record, dict):
+            record = ApplianceRecord.from_dict(record)
+        if not allow_duplicate and self.find(record['store_name'], record['item_number']):
+            raise ValueError("An appliance with this store and item number already exists")
+        rid = self.next_id
+        self.next_id += 1
+        self.records[rid] = record
+        self.ids[id(record)] = rid
+        self._index(rid, record)
+        if self.journal:
+            self.journal.append({'op': 'add', 'record': record.to_dict()})
+        return record
+
+    def extend(self, records):
+        """Add records as loaded from a file, keeping any duplicates it contains."""
+        for record in records:
+            self.add(record, allow_duplicate=True)
+
+    def find(self, store_name, item_number):
+        rid = self.by_key.get(appliance_key(store_name, item_number))
+        return None if rid is None else self.records[rid]
+
+    def update(self, record, **changes):
+        """Change fields on a record and reindex it."""
+        rid = self.ids[id(record)]
+        new_key = appliance_key(
+            changes.get('store_name', record['store_name']), changes.get('item_number', record['item_number'])
+        )
+        if self.by_key.get(new_key, rid) != rid:
+            raise ValueError("An appliance with this store and item number already exists")
+        old_key = [record['store_name'], record['item_number']]
+        self._unindex(rid, record)
+        record.update(changes)
+        self._index(rid, record)
+        if self.journal:
+            self.journal.append({'op': 'update', 'key': old_key, 'changes': changes})
+
+    def apply(self, entry):
+        """Re-apply one journal entry. Entries already reflected in the snapshot are skipped."""
+        if entry['op'] == 'add':
+            record = ApplianceRecord.from_dict(entry['record'])
+            existing = self.find(record['store_name'], record['item_number'])
+            if existing:
+                self.update(existing, **{field: record[field] for field in ApplianceRecord.FIELDS})
+            else:
+                self.add(record, allow_duplicate=True)
+        elif entry['op'] == 'update':
+            record = self.find(*entry['key'])
+            if record:
+                self.update(record, **entry['changes'])
+
+    def take(self, other):
+        """Replace this inventory's contents with another's (e.g. one loaded off to the side)."""
+        for attr in ('records', 'ids', 'by_key', 'by_store', 'by_status', 'by_brand', 'archived', 'next_id'):
+            setattr(self, attr, getattr(other, attr))
+
+    def set_archived(self, record, archived):
+        self.update(record, archived=archived)
+
+    def filter(self, store=None, status=None, brand=None, archived=None):
+        """Records matching every given criterion, intersecting the smallest index buckets first."""
+        buckets = []
+        for index, value in ((self.by_store, store), (self.by_status, status), (self.by_brand, brand)):
+            if value is not None:
+                buckets.append(index.get(value.strip().lower(), {}))
+        if archived:
+            buckets.append(self.archived)
+        if not buckets:
+            candidates = self.records
+        else:
+            buckets.sort(key=len)
+            candidates, others = buckets[0], buckets[1:]
+            candidates = [rid for rid in candidates if all(rid in other for other in others)]
+        if archived is False:
+            candidates = [rid for rid in candidates if rid not in self.archived]
+        return [self.records[rid] for rid in sorted(candidates)]
+
+    def status_counts(self):
+        return {status: len(rids) for status, rids in self.by_status.items()}
+
+inventory = Inventory()
+
+SNAPSHOT_FILE = "appliance_inventory.json"
+JOURNAL_FILE = "appliance_inventory.journal"
+JOURNAL_FSYNC_EVERY = 20        # changes between fsyncs
+JOURNAL_COMPACT_AFTER = 5000    # changes before the journal is folded into a new snapshot
+
+class Journal:
+    """Append-only JSON-lines log of inventory changes made since the last snapshot.
+
+    Every add/edit/archive/unarchive is appended as it happens and fsynced in
+    batches, so saving costs as much as the change rather than the whole
+    inventory. Once the journal grows past JOURNAL_COMPACT_AFTER entries it is
+    folded into a fresh snapshot and truncated.
+
+    Entries carry a sequence number that keeps counting across truncations,
+    and each snapshot records the last one it contains, so a crash between
+    writing a snapshot and truncating the journal does not replay changes
+    the snapshot already holds.
+    """
+
+    def __init__(self, path, fsync_every, compact_after):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.compact_after = compact_after
+        self.file = None
+        self.entries = 0
+        self.pending = 0
+        self.batching = 0
+        self.seq = 0           # sequence number of the last entry written
+        self.skipped = []      # (line, problem) for entries that could not be replayed
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, entry):
+        self.open()
+        self.seq += 1
+        entry = {'seq': self.seq, **entry}
+        self.file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        self.file.flush()
+        self.entries += 1
+        self.pending += 1
+        if not self.batching:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.pending >= self.fsync_every:
+            self.sync()
+        if self.entries >= self.compact_after:
+            write_snapshot()
+
+    @contextmanager
+    def batch(self):
+        """Hold fsyncs and compaction until a bulk operation finishes."""
+        self.batching += 1
+        try:
+            yield
+        finally:
+            self.batching -= 1
+            if not self.batching:
+                self.checkpoint()
+
+    def sync(self):
+        if self.file is not None and self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def truncate(self):
+        self.close()
+        with open(self.path, "w") as f:
+            os.fsync(f.fileno())
+        self.entries = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def replay(self, target, after=0):
+        """Apply journaled changes newer than sequence number after to target; returns how many were applied.
+
+        Entries that no longer apply (e.g. a rename onto a key that has since
+        been taken) are skipped and listed in self.skipped.
+        """
+        count = 0
+        self.seq = after
+        self.skipped = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn write from a crash; nothing after it was synced
+                    seq = entry.get('seq')
+                    if seq is not None:
+                        if seq <= after:
+                            continue  # already in the snapshot
+                        self.seq = max(self.seq, seq)
+                    try:
+                        target.apply(entry)
+                    except ValueError as e:
+                        self.skipped.append((number, str(e)))
+                        continue
+                    count += 1
+        except FileNotFoundError:
+            pass
+        self.entries = count
+        return count
+
+SNAPSHOT_HEADER_KEY = 'journal_seq'   # first element of the snapshot: last journal entry it contains
+
+journal = Journal(JOURNAL_FILE, JOURNAL_FSYNC_EVERY, JOURNAL_COMPACT_AFTER)
+atexit.register(journal.close)
+
+def write_snapshot():
+    """Write the whole inventory as the new snapshot and start an empty journal."""
+    journal.sync()
+    tmp = SNAPSHOT_FILE + ".tmp"
+    header = {SNAPSHOT_HEADER_KEY: journal.seq}
+    with open(tmp, "w") as f:
+        json.dump([header] + [record.to_dict() for record in inventory], f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, SNAPSHOT_FILE)
+    journal.truncate()
+
 def get_required_input(prompt):
     while True:
         value = input(prompt).strip()
@@ -49,18 +435,15 @@ def get_required_input(prompt):
 def import_from_csv(filename="appliance_inventory.csv"):
     """Import appliances from a CSV file and add them to the inventory."""
     try:
-        with open(filename, "r", newline="") as csvfile:
+        with open(filename, "r", newline="") as csvfile, journal.batch():
             reader = csv.DictReader(csvfile)
             count = 0
             for row in reader:
                 # Check for required keys and prevent duplicates
                 if 'store_name' in row and 'item_number' in row:
-                    if not any(
-                        app['store_name'].lower() == row['store_name'].lower() and app['item_number'] == row['item_number']
-                        for app in appliances
-                    ):
+                    if not inventory.find(row['store_name'], row['item_number']):
                         # Optionally, add default status/history if missing
-                        appliances.append({
+                        inventory.add({
                             'store_name': row['store_name'],
                             'item_number': row['item_number'],
                             'brand': row.get('brand', ''),
@@ -74,22 +457,51 @@ def import_from_csv(filename="appliance_inventory.csv"):
     except FileNotFoundError:
         print(f"File '{filename}' not found.\n")
 
+def import_csv_directory():
+    """Import every CSV file in a folder, parsing them across several processes."""
+    directory = input("Folder of CSV files to import: ").strip()
+    if not os.path.isdir(directory):
+        print(f"Folder '{directory}' not found.\n")
+        return
+    workers = input(f"Worker processes [{os.cpu_count() or 1}]: ").strip()
+    workers = int(workers) if workers.isdigit() else None
+    paths = ingest.csv_files(directory)
+    report = {}
+    count = duplicates = 0
+    started = time.perf_counter()
+    try:
+        with journal.batch():
+            for row in ingest.parallel_rows(paths, report, workers=workers):
+                if inventory.find(row['store_name'], row['item_number']):
+                    duplicates += 1
+                    continue
+                inventory.add(row)
+                count += 1
+    except (UnicodeDecodeError, csv.Error) as e:
+        print(f"Import stopped: {e}\n")
+        return
+    elapsed = time.perf_counter() - started
+    print(f"Imported {count} new appliances from {report['files']} files in {elapsed:.1f}s "
+          f"({duplicates + report['duplicates']} duplicates, {len(report['rejected'])} rejected).")
+    for where, reason in report['rejected'][:10]:
+        print(f"  {where}: {reason}")
+    print()
+
 def add_appliance():
     """Add a new appliance with basic info, preventing duplicates within the same store."""
     store_name = get_required_input("Store name: ")
     item_number = get_required_input("Store Item Number: ")
     #duplicate check
-    for app in appliances:
-        if app['store_name'].lower() == store_name.lower() and app['item_number'] == item_number:    #11-11-2025
-            print("Error: An appliance with this store and item number already exists!\n")
-            return
+    if inventory.find(store_name, item_number):    #11-11-2025
+        print("Error: An appliance with this store and item number already exists!\n")
+        return
     brand = get_required_input("Brand: ")
     model = get_required_input("Model: ")
     serial = get_required_input("Serial: ")
     status = choose_status()
     notes = input("Notes/Comments (optional): ")
     log_action('add', f"{item_number} at {store_name}")
-    appliances.append({
+    inventory.add({
         'store_name': store_name,
         'item_number': item_number,
         'brand': brand,
@@ -104,55 +516,286 @@ def add_appliance():
 
 def list_appliances():
     """List all appliances."""
-    if not appliances:
+    if not len(inventory):
         print("No appliances in inventory.\n")
         return
-    for idx, app in enumerate([a for a in appliances if not a.get('archived', False)], 1):
+    for idx, app in enumerate(inventory.filter(archived=False), 1):
         print(f"{idx}. {app['store_name']} | {app['item_number']} | {app['brand']} | {app['model']} | {app['serial']} | {app['status']}")#J
     print()
 
-def save_to_file(filename="appliance_inventory.json"):
-    """Save appliances to JSON."""
-    with open(filename, "w") as f:
-        json.dump(appliances, f, indent=4)
+LOAD_CHUNK_SIZE = 1 << 20           # bytes read (or mapped) per step
+LOAD_MAX_RECORD_CHARS = 16 << 20    # a single record bigger than this is treated as malformed
+LOAD_PROGRESS_EVERY = 100000
+RECORD_TEXT_FIELDS = ('brand', 'model', 'serial', 'status', 'notes')
+
+def validate_record(data):
+    """Return a description of what is wrong with a loaded record, or None if it is usable."""
+    if not isinstance(data, dict):
+        return "not a JSON object"
+    for field in ('store_name', 'item_number'):
+        if not isinstance(data.get(field), str) or not data[field].strip():
+            return f"missing {field}"
+    for field in RECORD_TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} is not text"
+    if data.get('archived') is not None and not isinstance(data['archived'], bool):
+        return "archived is not true/false"
+    if data.get('history') is not None and not isinstance(data['history'], list):
+        return "history is not a list"
+    return None
+
+def text_chunks(filename, use_mmap=False):
+    """Yield (text, bytes read so far) from a UTF-8 file, optionally through a read-only mmap."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    with open(filename, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start in range(0, len(mm), LOAD_CHUNK_SIZE):
+                    end = min(start + LOAD_CHUNK_SIZE, len(mm))
+                    yield decoder.decode(mm[start:end]), end
+        else:
+            read = 0
+            while True:
+                chunk = f.read(LOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                read += len(chunk)
+                yield decoder.decode(chunk), read
+    yield decoder.decode(b'', final=True), None
+
+def iter_json_records(chunks):
+    """Parse records one at a time out of a JSON array or a JSON-lines document.
+
+    Yields (record, bytes read so far). A JSON-lines line that does not parse
+    is yielded as its JSONDecodeError so the caller can skip it; a syntax
+    error inside a JSON array cannot be skipped past and is raised.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos, bytes_read = '', 0, 0
+
+    def fill():
+        nonlocal buf, pos, bytes_read
+        for text, read in chunks:
+            buf, pos = buf[pos:] + text, 0
+            if read is not None:
+                bytes_read = read
+            return True
+        return False
+
+    def skip_space():
+        nonlocal pos
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+
+    skip_space()
+    while pos >= len(buf):
+        if not fill():
+            return
+        skip_space()
+
+    if buf[pos] != '[':
+        # JSON lines
+        while True:
+            newline = buf.find('\n', pos)
+            if newline == -1:
+                if fill():
+                    continue
+                line, pos = buf[pos:], len(buf)
+            else:
+                line, pos = buf[pos:newline], newline + 1
+            if line.strip():
+                try:
+                    yield json.loads(line), bytes_read
+                except json.JSONDecodeError as e:
+                    yield e, bytes_read
+            if newline == -1:
+                return
+
+    pos += 1
+    while True:
+        skip_space()
+        if pos >= len(buf):
+            if not fill():
+                raise ValueError("JSON array is not closed; the file looks truncated")
+            continue
+        if buf[pos] == ']':
+            return
+        if buf[pos] == ',':
+            pos += 1
+            continue
+        try:
+            record, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Most likely the record runs past the end of the buffer
+            if len(buf) - pos > LOAD_MAX_RECORD_CHARS or not fill():
+                raise
+            continue
+        yield record, bytes_read
+
+def load_records(filename, target, strict=True, use_mmap=False, progress=None, header=None):
+    """Stream records from a JSON or JSON-lines file into target as they are parsed.
+
+    With strict=True the first malformed record raises ValueError; otherwise
+    it is skipped and reported. A snapshot's leading header element is not a
+    record; it is copied into header if one is given. Returns (records loaded,
+    [(record number, problem)]).
+    """
+    total = os.path.getsize(filename)
+    loaded = 0
+    problems = []
+    for number, (data, bytes_read) in enumerate(iter_json_records(text_chunks(filename, use_mmap)), 1):
+        is_header = isinstance(data, dict) and SNAPSHOT_HEADER_KEY in data and 'store_name' not in data
+        if number == 1 and is_header:
+            if header is not None:
+                header.update(data)
+            continue
+        problem = f"bad JSON ({data.msg})" if isinstance(data, json.JSONDecodeError) else validate_record(data)
+        if problem:
+            if strict:
+                raise ValueError(f"Record {number}: {problem}")
+            problems.append((number, problem))
+        else:
+            target.add(data, allow_duplicate=True)
+            loaded += 1
+        if progress and number % LOAD_PROGRESS_EVERY == 0:
+            progress(number, bytes_read, total)
+    return loaded, problems
+
+def print_load_progress(count, bytes_read, total):
+    print(f"  {count} records read ({bytes_read * 100 // max(total, 1)}%)")
+
+def print_load_problems(problems):
+    if problems:
+        print(f"Skipped {len(problems)} bad records:")
+        for number, problem in problems[:10]:
+            print(f"  Record {number}: {problem}")
+        if len(problems) > 10:
+            print(f"  ...and {len(problems) - 10} more")
+
+def write_json_lines(filename):
+    """Write the inventory as JSON lines, one record per line."""
+    with open(filename, "w", encoding="utf-8") as f:
+        for record in inventory:
+            f.write(json.dumps(record.to_dict(), separators=(',', ':')) + "\n")
+
+SNAPSHOT_DICTIONARY = ('store_name', 'brand', 'status')
+
+def write_binary_backup(filename, compression='none'):
+    """Write the inventory as a binary columnar snapshot (see snapshot.py)."""
+    records = list(inventory)
+    columns = {field: [getattr(record, field) for record in records] for field in ApplianceRecord.FIELDS[:-1]}
+    # History goes in still packed, as one string per record
+    columns['history'] = [record._history or '' for record in records]
+    with open(filename, "wb") as f:
+        snapshot.write_snapshot(f, columns, SNAPSHOT_DICTIONARY, compression)
+
+def load_binary_backup(filename, target, strict=True, progress=None):
+    """Load a binary snapshot into target; same contract as load_records()."""
+    count, columns = snapshot.read_snapshot(filename)
+    missing = [field for field in ('store_name', 'item_number') if field not in columns]
+    if missing:
+        raise ValueError(f"snapshot has no {', '.join(missing)} column")
+    # Validate a column at a time rather than record by record
+    bad = {}
+    for field in ('store_name', 'item_number'):
+        for i, value in enumerate(columns[field]):
+            if type(value) is not str or not value.strip():
+                bad.setdefault(i, f"missing {field}")
+    for field in RECORD_TEXT_FIELDS + ('history',):
+        values = columns.setdefault(field, [''] * count)
+        if None in values:
+            values[:] = ['' if value is None else value for value in values]
+        for i, value in enumerate(values):
+            if type(value) is not str:
+                bad.setdefault(i, f"{field} is not text")
+    archived = columns.setdefault('archived', [False] * count)
+    for i, value in enumerate(archived):
+        if type(value) is not bool:
+            bad.setdefault(i, "archived is not true/false")
+    problems = [(i + 1, bad[i]) for i in sorted(bad)]
+    if problems and strict:
+        raise ValueError("Record %d: %s" % problems[0])
+
+    size = os.path.getsize(filename)
+    loaded = 0
+    fields = [columns[field] for field in ApplianceRecord.FIELDS[:-1]]
+    for i, (values, packed) in enumerate(zip(zip(*fields), columns['history'])):
+        if i in bad:
+            continue
+        record = ApplianceRecord(*values)
+        record._history = packed or None
+        target.add(record, allow_duplicate=True)
+        loaded += 1
+        if progress and (i + 1) % LOAD_PROGRESS_EVERY == 0:
+            progress(i + 1, size * (i + 1) // count, size)
+    return loaded, problems
+
+def save_to_file(filename=SNAPSHOT_FILE):
+    """Make sure every change is on disk (changes are journaled as they happen)."""
+    if filename != SNAPSHOT_FILE:
+        with open(filename, "w") as f:
+            json.dump([record.to_dict() for record in inventory], f, indent=4)
+    else:
+        journal.sync()
     print("Data saved!\n")
 
-def load_from_file(filename="appliance_inventory.json"):
-    """Load appliances from JSON file."""
-    appliances.clear()
+def load_from_file(filename=SNAPSHOT_FILE):
+    """Load appliances from the JSON snapshot, then replay the journal written since."""
+    inventory.journal = None
+    inventory.clear()
+    header = {}
     try:
-        with open(filename, "r") as f:
-            data = json.load(f)
-            appliances.extend(data)
+        loaded, problems = load_records(
+            filename, inventory, strict=False, progress=print_load_progress, header=header
+        )
+        print_load_problems(problems)
         print("Data loaded.\n")
     except FileNotFoundError:
         print("No saved file found. Starting empty.\n")
+    except ValueError as e:
+        print(f"Could not finish loading '{filename}': {e}\n")
+    if filename == SNAPSHOT_FILE:
+        after = header.get(SNAPSHOT_HEADER_KEY)
+        recovered = journal.replay(inventory, after if isinstance(after, int) else 0)
+        if recovered:
+            print(f"Recovered {recovered} changes from the journal.\n")
+        if journal.skipped:
+            print(f"Skipped {len(journal.skipped)} journal changes that no longer apply:")
+            for number, problem in journal.skipped[:10]:
+                print(f"  Line {number}: {problem}")
+            print()
+        inventory.journal = journal
 
 def edit_appliance():
     """Edit an appliance by store name and item number."""
     item_number = input("Enter Store Item Number to edit: ")
     store_name = input("Enter Store Name: ").strip().lower()
-    for app in appliances:
-        if app['item_number'] == item_number and app['store_name'].lower() == store_name:
-            print(f"Current info: {app}")
-            print("Leave blank to keep current value.")
-            app['store_name'] = input(f"Store Name [{app['store_name']}]: ") or app['store_name']
-            app['brand'] = input(f"Brand [{app['brand']}]: ") or app['brand']
-            app['model'] = input(f"Model [{app['model']}]: ") or app['model']
-            app['serial'] = input(f"Serial [{app['serial']}]: ") or app['serial']
-            app['item_number'] = input(f"Item number [{app['item_number']}]: ") or app['item_number']
-            app['notes'] = input(f"Notes/Comments [{app.get('notes', '')}]: ") or app.get('notes', '')
-            print("Current Status:", app['status'])
-            if input("Change status? (y/n): ").strip().lower() == 'y':
-                new_status = choose_status()
-                app['status'] = new_status
-                if 'history' not in app:
-                    app['history'] = []
-                app['history'].append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), new_status))
-            print("Appliance updated!\n")
-            log_action('edit', f"{item_number} at {app['store_name']}")
-            return
-    print("Appliance not found.\n")
+    app = inventory.find(store_name, item_number)
+    if not app:
+        print("Appliance not found.\n")
+        return
+    print(f"Current info: {app}")
+    print("Leave blank to keep current value.")
+    changes = {}
+    changes['store_name'] = input(f"Store Name [{app['store_name']}]: ") or app['store_name']
+    changes['brand'] = input(f"Brand [{app['brand']}]: ") or app['brand']
+    changes['model'] = input(f"Model [{app['model']}]: ") or app['model']
+    changes['serial'] = input(f"Serial [{app['serial']}]: ") or app['serial']
+    changes['item_number'] = input(f"Item number [{app['item_number']}]: ") or app['item_number']
+    changes['notes'] = input(f"Notes/Comments [{app.get('notes', '')}]: ") or app.get('notes', '')
+    print("Current Status:", app['status'])
+    if input("Change status? (y/n): ").strip().lower() == 'y':
+        new_status = choose_status()
+        changes['status'] = new_status
+        changes['history'] = app.get('history', []) + [(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), new_status)]
+    try:
+        inventory.update(app, **changes)
+    except ValueError:
+        print("Error: An appliance with this store and item number already exists!\n")
+        return
+    print("Appliance updated!\n")
+    log_action('edit', f"{item_number} at {app['store_name']}")
 
 def advanced_search():
     """Filter appliances by store, status, or brand (non-archived only)."""
@@ -164,7 +807,7 @@ def advanced_search():
     choice = input("Select an option: ")
     if choice == '1':
         store = input("Enter the store name: ").strip().lower()
-        results = [app for app in appliances if app['store_name'].lower() == store and not app.get('archived', False)]
+        results = inventory.filter(store=store, archived=False)
     elif choice == '2':
         print("\nStatus Options:")
         for idx, status in enumerate(STATUS_OPTIONS, 1):
@@ -172,13 +815,13 @@ def advanced_search():
         status_choice = input("Enter the status number: ")
         if status_choice.isdigit() and 1 <= int(status_choice) <= len(STATUS_OPTIONS):
             status = STATUS_OPTIONS[int(status_choice) - 1]
-            results = [app for app in appliances if app['status'] == status and not app.get('archived', False)]
+            results = inventory.filter(status=status, archived=False)
         else:
             print("Invalid choice.\n")
             return
     elif choice == '3':
         brand = input("Enter the brand: ").strip().lower()
-        results = [app for app in appliances if app['brand'].lower() == brand and not app.get('archived', False)]
+        results = inventory.filter(brand=brand, archived=False)
     else:
         return
 
@@ -194,18 +837,18 @@ def archive_appliance():
     """Archive an appliance by store name and item number."""
     item_number = input("Enter Store Item Number to archive: ")
     store_name = input("Enter Store Name: ").strip().lower()
-    for app in appliances:
-        if app['item_number'] == item_number and app['store_name'].lower() == store_name:
-            app['archived'] = True
-            log_action('archive', f"{item_number} at {app['store_name']}")
-            print("Appliance archived! (It is now hidden from regular lists and reports)\n")
-            return
+    app = inventory.find(store_name, item_number)
+    if app:
+        inventory.set_archived(app, True)
+        log_action('archive', f"{item_number} at {app['store_name']}")
+        print("Appliance archived! (It is now hidden from regular lists and reports)\n")
+        return
     print("Appliance not found.\n")
 
 def view_archived():
     """Show all archived appliances."""
     print("\nArchived Appliances:")
-    archived = [a for a in appliances if a.get('archived', False)]
+    archived = inventory.filter(archived=True)
     if not archived:
         print("No archived appliances.\n")
         return
@@ -215,10 +858,7 @@ def view_archived():
 
 def quick_summary():
     """Print a summary of inventory by status."""
-    summary = {}
-    for app in appliances:
-        status = app['status'].lower()
-        summary[status] = summary.get(status, 0) + 1
+    summary = inventory.status_counts()
     print("\nInventory Summary:")
     for status, count in summary.items():
         print(f"  {status.title()}: {count}")
@@ -228,27 +868,27 @@ def view_appliance_details():
     """Show all details and history for one appliance."""
     item_number = input("Enter Store Item Number to view: ")
     store_name = input("Enter Store name: ")
-    for app in appliances:
-        if app['item_number'] == item_number and app['store_name'].lower() == store_name.lower():
-            print("\nDetailed Appliance Info:")
-            print(f"Store: {app['store_name']}")
-            print(f"Item Number: {app['item_number']}")
-            print(f"Brand: {app['brand']}")
-            print(f"Model: {app['model']}")
-            print(f"Serial: {app['serial']}")
-            print(f"Status: {app['status']}")
-            print(f"Notes: {app.get('notes', '')}")
-            # Show status history if available
-            if 'history' in app:
-                print("Status History:")
-                for entry in app['history']:
-                    if isinstance(entry, (tuple, list)) and len(entry) == 2:
-                        timestamp, stat = entry
-                        print((f" {timestamp}; {stat}"))
-                    else:
-                        print(f" {entry}")
-            print()
-            return
+    app = inventory.find(store_name, item_number)
+    if app:
+        print("\nDetailed Appliance Info:")
+        print(f"Store: {app['store_name']}")
+        print(f"Item Number: {app['item_number']}")
+        print(f"Brand: {app['brand']}")
+        print(f"Model: {app['model']}")
+        print(f"Serial: {app['serial']}")
+        print(f"Status: {app['status']}")
+        print(f"Notes: {app.get('notes', '')}")
+        # Show status history if available
+        if 'history' in app:
+            print("Status History:")
+            for entry in app['history']:
+                if isinstance(entry, (tuple, list)) and len(entry) == 2:
+                    timestamp, stat = entry
+                    print((f" {timestamp}; {stat}"))
+                else:
+                    print(f" {entry}")
+        print()
+        return
     print("Appliance not found.\n")
 
 def export_to_csv(filename="appliance_inventory.csv"):
@@ -257,7 +897,7 @@ def export_to_csv(filename="appliance_inventory.csv"):
         fieldnames = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        for app in appliances:
+        for app in inventory:
             writer.writerow({
                 'store_name': app['store_name'],
                 'item_number': app['item_number'],
@@ -282,30 +922,50 @@ def export_audit_log(filename="audit_log.csv"):
     print(f"Audit log exported to '{filename}'\n")
 
 def backup_inventory():
-    """Save appliances to a user-specified JSON backup file."""
-    filename = input("Enter filename for backup (e.g., backup.json): ").strip()
+    """Save appliances to a user-specified JSON, JSON-lines or binary backup file."""
+    filename = input("Enter filename for backup (e.g., backup.json, backup.jsonl for JSON lines, backup.snap for binary): ").strip()
     if not filename:
         print("Backup canceled.\n")
         return
-    with open(filename, "w") as f:
-        json.dump(appliances, f, indent=4)
+    if filename.endswith('.snap'):
+        compression = input("Compression (none/zlib/lzma) [none]: ").strip().lower() or 'none'
+        if compression not in snapshot.COMPRESSION:
+            print("Unknown compression.\n")
+            return
+        write_binary_backup(filename, compression)
+    elif filename.endswith('.jsonl'):
+        write_json_lines(filename)
+    else:
+        with open(filename, "w") as f:
+            json.dump([record.to_dict() for record in inventory], f, indent=4)
     print(f"Backup saved as '{filename}'\n")
 
 def restore_inventory():
-    """Load appliances from a user-specified JSON backup file."""
+    """Load appliances from a user-specified JSON, JSON-lines or binary backup file."""
     filename = input("Enter filename to restore from: ").strip()
     if not filename:
         print("Restore canceled.\n")
         return
+    strict = input("Stop at the first bad record? (y/n): ").strip().lower() != 'n'
+    restored = Inventory()
     try:
-        with open(filename, "r") as f:
-            data = json.load(f)
-            appliances.clear()
-            appliances.extend(data)
-        print(f"Inventory restored from '{filename}'\n")
+        if snapshot.is_snapshot(filename):
+            loaded, problems = load_binary_backup(filename, restored, strict=strict, progress=print_load_progress)
+        else:
+            loaded, problems = load_records(
+                filename, restored, strict=strict, use_mmap=True, progress=print_load_progress
+            )
+    except ValueError as e:
+        print(f"Restore aborted, inventory unchanged: {e}\n")
+        return
     except FileNotFoundError:
         print(f"File '{filename}' not found.\n")
         log_action('undo delete', f"{last_deleted['item_number']} at {last_deleted['store_name']}")
+        return
+    inventory.take(restored)
+    write_snapshot()
+    print_load_problems(problems)
+    print(f"Inventory restored from '{filename}' ({loaded} appliances)\n")
 
 def view_audit_log():
     """Display the audit log (action history)."""
@@ -335,13 +995,9 @@ def bulk_archive():
         return
     status = STATUS_OPTIONS[int(status_choice) - 1]
     count = 0
-    for app in appliances:
-        if (
-            app['store_name'].lower() == store_name
-            and app['status'] == status
-            and not app.get('archived', False)
-        ):
-            app['archived'] = True
+    with journal.batch():
+        for app in inventory.filter(store=store_name, status=status, archived=False):
+            inventory.set_archived(app, True)
             count += 1
             log_action('archive', f"{app['item_number']} at {app['store_name']}")
     print(f"{count} appliances archived.\n")
@@ -358,13 +1014,9 @@ def bulk_unarchive():
         return
     status = STATUS_OPTIONS[int(status_choice) - 1]
     count = 0
-    for app in appliances:
-        if (
-            app['store_name'].lower() == store_name
-            and app['status'] == status
-            and app.get('archived', False)
-        ):
-            app['archived'] = False
+    with journal.batch():
+        for app in inventory.filter(store=store_name, status=status, archived=True):
+            inventory.set_archived(app, False)
             count += 1
             log_action('unarchive', f"{app['item_number']} at {app['store_name']}")
     print(f"{count} appliances restored from archive.\n")
@@ -383,7 +1035,8 @@ def file_options_menu():
         print("9. View Archived Appliances")
         print("10. Bulk Archive By Store/Status")
         print("11. Bulk Unarchive By Store/status")
-        print("12. Back to Main Menu")
+        print("12. Import Folder of CSVs (parallel)")
+        print("13. Back to Main Menu")
         choice = input("Select an option: ")
         if choice == '1':
             save_to_file()
@@ -408,6 +1061,8 @@ def file_options_menu():
         elif choice == '11':
             bulk_unarchive()
         elif choice == '12':
+            import_csv_directory()
+        elif choice == '13':
             break
         else:
             print("Invalid choice.\n")
@@ -416,7 +1071,7 @@ def report_by_store():
     """Show all active (non-archived) appliances for a selected store, grouped by status with notes."""
     store = input("Enter store name to report: ").strip().lower()
     # Filter to non-archived appliances for the given store
-    results = [app for app in appliances if app['store_name'].lower() == store and not app.get('archived', False)]
+    results = inventory.filter(store=store, archived=False)
     if not results:
         print("No active appliances found for that store.\n")
         return
@@ -436,14 +1091,12 @@ def unarchive_appliance():
     """Restore (unarchive) an appliance by store name and item number."""
     item_number = input("Enter Store Item Number to restore: ")
     store_name = input("Enter Store Name: ").strip().lower()
-    for app in appliances:
-        if (app['item_number'] == item_number 
-            and app['store_name'].lower() == store_name 
-            and app.get('archived', False)):
-            app['archived'] = False
-            log_action('unarchive', f"{item_number} at {app['store_name']}")
-            print("Appliance has been restored from archive!\n")
-            return
+    app = inventory.find(store_name, item_number)
+    if app and app.get('archived', False):
+        inventory.set_archived(app, False)
+        log_action('unarchive', f"{item_number} at {app['store_name']}")
+        print("Appliance has been restored from archive!\n")
+        return
     print("Archived appliance not found.\n")
 
 def menu():
@@ -478,12 +1131,14 @@ def menu():
         elif choice == '9':
             view_audit_log()
         elif choice == '10':
-            print("Don't forget to save your work using File Options before quitting!")
+            journal.close()
+            print("All changes saved.")
             print("Goodbye!")
             break
         else:
             print("Invalid choice.\n")
 
 if __name__ == "__main__":
+    load_from_file()
     menu()
      
\ No newline at end of file
@@ -1,7 +1,10 @@
 from flask import Flask, render_template, request, redirect, session, url_for, send_from_directory, flash, get_flashed_messages
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex
 import os
 import csv
+import time
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'
@@ -9,7 +12,212 @@ app.secret_key = 'supersecretkey'
 import os
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///appliances.db')
 
-db = SQLAlchemy(app)
+# Engine tuning. SQLite connections get WAL, synchronous=NORMAL, a busy
+# timeout and mmap reads so several gunicorn workers can share the file;
+# other databases get a sized, pre-pinged, recycled connection pool.
+# DATABASE_READ_URL adds a read replica that read-only views query.
+import click
+import functools
+import logging
+import sqlite3
+import tempfile
+import threading
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_WAL'] = os.environ.get('SQLITE_WAL', '1') != '0'
+app.config['READ_REPLICA_STICKY_SECONDS'] = float(os.environ.get('READ_REPLICA_STICKY_SECONDS', '5'))
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+    }
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+    }
+if os.environ.get('DATABASE_READ_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {'replica': os.environ['DATABASE_READ_URL']}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    apply_sqlite_pragmas(cursor)
+    cursor.close()
+
+def apply_sqlite_pragmas(cursor):
+    # Also used by asgi.py for its aiosqlite connections
+    if app.config['SQLITE_WAL']:
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}")
+
+class RoutingSession(FlaskSession):
+    """Sends SELECTs made inside @read_replica views to the replica engine; everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_request_context() and g.get('use_read_replica')):
+            return self._db.engines['replica']
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_write(db_session):
+    # Read-your-writes: a user who just changed something reads from the primary for a while
+    if has_request_context() and 'replica' in app.config.get('SQLALCHEMY_BINDS', {}):
+        session['last_write'] = time.time()
+
+def read_replica(view):
+    """Mark a read-only view as safe to serve from the read replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'replica' in app.config.get('SQLALCHEMY_BINDS', {}):
+            recent_write = time.time() - session.get('last_write', 0) < app.config['READ_REPLICA_STICKY_SECONDS']
+            g.use_read_replica = not recent_write
+        return view(*args, **kwargs)
+    # asgi.py serves these through the async database drivers
+    wrapper.read_only = True
+    return wrapper
+
+def engine_settings(engines=None):
+    """Describe the effective settings of each engine, one line per engine."""
+    lines = []
+    for key, engine in (db.engines if engines is None else engines).items():
+        name = key or 'primary'
+        pool = engine.pool
+        line = f"{name}: {engine.dialect.name} {engine.url.render_as_string(hide_password=True)} pool={type(pool).__name__}"
+        if hasattr(pool, 'size'):
+            line += f" size={pool.size()} max_overflow={pool._max_overflow} timeout={pool._timeout}"
+        line += f" recycle={pool._recycle} pre_ping={pool._pre_ping}"
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                pragmas = {
+                    pragma: conn.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+                }
+            line += ' ' + ' '.join(f'{pragma}={value}' for pragma, value in pragmas.items())
+        lines.append(line)
+    return lines
+
+@app.cli.command('db-benchmark')
+@click.option('--writers', type=int, default=4, help='Writer threads.')
+@click.option('--readers', type=int, default=4, help='Reader threads.')
+@click.option('--seconds', type=float, default=5.0, help='How long to run.')
+@click.option('--database', default=None,
+              help='Scratch database URL to run against (default: a temporary SQLite file).')
+@click.option('--versioned', is_flag=True,
+              help='End every write by bumping a DataVersion row, as the app does, to measure that contention.')
+def db_benchmark_command(writers, readers, seconds, database, versioned):
+    """Run parallel writers and readers against a scratch appliance table and report throughput.
+
+    The live database is never touched: the table is created in a temporary
+    SQLite file (or the --database given) with the same engine options as
+    the app, and dropped again afterwards.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        url = make_url(database or f"sqlite:///{os.path.join(tmp, 'benchmark.db')}")
+        same_backend = url.get_backend_name() == db.engine.dialect.name
+        engine = create_engine(url, **(app.config['SQLALCHEMY_ENGINE_OPTIONS'] if same_backend else {}))
+        tables = [Appliance.__table__] + ([DataVersion.__table__] if versioned else [])
+        created = [table for table in tables if not db.inspect(engine).has_table(table.name)]
+        for table in created:
+            table.create(engine)
+        try:
+            if versioned:
+                with engine.begin() as conn:
+                    if not conn.execute(db.select(DataVersion.id).where(DataVersion.id == 1)).first():
+                        conn.execute(db.insert(DataVersion).values(id=1, version=0))
+            run_db_benchmark(engine, writers, readers, seconds, versioned)
+        finally:
+            for table in created:
+                table.drop(engine)
+            engine.dispose()
+
+def run_db_benchmark(engine, writers, readers, seconds, versioned=False):
+    store = '__benchmark__'
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    latencies = {'write': [], 'read': []}
+    errors = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def timed(role, operation):
+        started = time.perf_counter()
+        try:
+            operation()
+        except OperationalError:
+            with lock:
+                errors[role] += 1
+            return
+        with lock:
+            latencies[role].append(time.perf_counter() - started)
+
+    def write(n):
+        i = 0
+        while time.monotonic() < deadline:
+            def operation():
+                with engine.begin() as conn:
+                    conn.execute(db.insert(Appliance).values(
+                        store_name=store, item_number=f'{n}-{i}', brand='b', model='m', serial='s',
+                        status='In', archived=False, last_updated=now
+                    ))
+                    conn.execute(db.update(Appliance).where(
+                        Appliance.store_name == store, Appliance.item_number == f'{n}-{i // 2}'
+                    ).values(notes=str(i)))
+                    if versioned:
+                        conn.execute(data_version_update())
+            timed('write', operation)
+            i += 1
+
+    def read(n):
+        while time.monotonic() < deadline:
+            def operation():
+                with engine.connect() as conn:
+                    conn.execute(db.select(db.func.count()).select_from(Appliance).where(
+                        Appliance.store_name == store, Appliance.archived == False
+                    )).scalar()
+                    conn.execute(db.select(Appliance.id, Appliance.item_number).where(
+                        Appliance.archived == False
+                    ).order_by(Appliance.last_updated.desc()).limit(50)).all()
+            timed('read', operation)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=read, args=(n,)) for n in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with engine.begin() as conn:
+        conn.execute(db.delete(Appliance).where(Appliance.store_name == store))
+
+    for line in engine_settings({'benchmark': engine}):
+        print(line)
+    print(f"{'role':<8}{'threads':>8}{'ops':>8}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    for role, threads_count in (('write', writers), ('read', readers)):
+        times = sorted(latencies[role])
+        p50 = times[len(times) // 2] * 1000 if times else 0
+        p95 = times[int(len(times) * 0.95)] * 1000 if times else 0
+        print(f"{role:<8}{threads_count:>8}{len(times):>8}{len(times) / seconds:>10.0f}{p50:>9.1f}{p95:>9.1f}{errors[role]:>8}")
+
+@app.cli.command('db-settings')
+def db_settings_command():
+    """Print the effective database engine settings."""
+    for line in engine_settings():
+        print(line)
 
 from datetime import datetime
 
@@ -26,10 +234,28 @@ class Appliance(db.Model):
     invoice_file = db.Column(db.String(255))
     last_updated = db.Column(db.String(30), nullable=False, default=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
+    __table_args__ = (
+        # Exact lookups from the edit/details/archive/tech routes
+        db.Index('ix_appliance_store_item', store_name, item_number),
+        db.Index('ix_appliance_item_number', item_number),
+        # Store portal, tech lookup, bulk actions and the dashboard summary
+        db.Index('ix_appliance_store_archived_status', store_name, archived, status),
+        # List/archived pages filter on archived and seek/sort on (column, id)
+        db.Index('ix_appliance_archived_updated_id', archived, last_updated, id),
+        db.Index('ix_appliance_archived_store_id', archived, store_name, id),
+        db.Index('ix_appliance_archived_item_id', archived, item_number, id),
+        db.Index('ix_appliance_archived_status_id', archived, status, id),
+        # One item number per store, whatever case the store name was typed in
+        db.Index('uq_appliance_store_item_ci', db.func.lower(store_name), item_number, unique=True),
+    )
+
 class StatusHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     appliance_id = db.Column(db.Integer, db.ForeignKey('appliance.id'))
-    appliance = db.relationship('Appliance', backref='status_history')
+    appliance = db.relationship(
+        'Appliance',
+        backref=db.backref('status_history', order_by='(StatusHistory.timestamp, StatusHistory.id)')
+    )
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     timestamp = db.Column(db.String(30), nullable=False)
     status = db.Column(db.String(40), nullable=False)
@@ -37,9 +263,13 @@ class StatusHistory(db.Model):
     verified_serial = db.Column(db.String(80), nullable=True)
     user= db.relationship('User')
 
+    __table_args__ = (
+        db.Index('ix_status_history_appliance_ts', appliance_id, timestamp),
+    )
+
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.String(30), nullable=False)
+    timestamp = db.Column(db.String(30), nullable=False, index=True)
     action = db.Column(db.String(80), nullable=False)
     details = db.Column(db.String(255), nullable=False)
 
@@ -51,83 +281,1248 @@ class User(db.Model):
     store = db.Column(db.String(80))  # Only for stores
     active = db.Column(db.Boolean, default=True)
 
+class StoreStatusCount(db.Model):
+    """Running count of active appliances per store and status, for the admin dashboard."""
+    store_name = db.Column(db.String(80), primary_key=True)
+    status = db.Column(db.String(40), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    """Single row counting committed changes to appliances; cached pages are keyed on it."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.String(30))
+
+class ApplianceChange(db.Model):
+    """One row per appliance write, numbered in commit order; /changes reads it from a client's cursor."""
+    seq = db.Column(db.Integer, primary_key=True)
+    appliance_id = db.Column(db.Integer, nullable=False)
+    store_name = db.Column(db.String(80), nullable=False)
+    action = db.Column(db.String(20), nullable=False)  # add, edit, archive, unarchive, remove, delete
+    changed_at = db.Column(db.String(30), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_appliance_change_store_seq', store_name, seq),
+        # Never hand out a pruned seq again
+        {'sqlite_autoincrement': True},
+    )
+
+class Job(db.Model):
+    """A long-running admin operation, queued here and picked up by a job worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    params = db.Column(db.Text, nullable=False, default='{}')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.String(30), nullable=False)
+    started_at = db.Column(db.String(30))
+    finished_at = db.Column(db.String(30))
+
+    __table_args__ = (
+        db.Index('ix_job_state_id', state, id),
+    )
+
+class LoginAttempt(db.Model):
+    """One login attempt against a rate limit key, when LOGIN_LIMIT_SHARED is on."""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(120), nullable=False)
+    at = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_login_attempt_key_at', key, at),
+    )
+
+# Keep StoreStatusCount up to date on every write and read the dashboard from it.
+# Run `flask --app app_web rebuild-status-counts` after turning this on.
+app.config['STATUS_COUNTERS'] = os.environ.get('STATUS_COUNTERS') == '1'
+
 from datetime import datetime
 
+import atexit
+import json
+import queue
+import threading
+
+app.config.setdefault('AUDIT_BATCH_SIZE', 200)
+app.config.setdefault('AUDIT_QUEUE_SIZE', 10000)
+app.config.setdefault('AUDIT_FLUSH_INTERVAL', 1.0)
+app.config.setdefault('AUDIT_MAX_ATTEMPTS', 5)
+app.config.setdefault('AUDIT_RETRY_DELAY', 0.5)  # doubled after each failed attempt
+
+class AuditWriter:
+    """Buffers audit entries in a bounded queue and inserts them in batches.
+
+    A background thread flushes the queue every AUDIT_FLUSH_INTERVAL seconds
+    or as soon as AUDIT_BATCH_SIZE entries are waiting. Requests flush on
+    teardown and the process flushes at exit. When the queue is full the
+    writer flushes inline instead of dropping entries.
+
+    A batch that fails to insert (e.g. SQLITE_BUSY) is held and retried ahead
+    of newer entries, backing off from AUDIT_RETRY_DELAY seconds. Only after
+    AUDIT_MAX_ATTEMPTS failures, or at exit, is it given up, and then the
+    entries themselves go to the error log.
+    """
+
+    def __init__(self, batch_size, max_queue, flush_interval, max_attempts=5, retry_delay=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.held = []  # entries from failed attempts, written before anything newer
+        self.attempts = 0
+        self.retry_at = 0.0
+        self.stats = {
+            'queued': 0, 'written': 0, 'retried': 0, 'failed': 0, 'flushes': 0, 'max_depth': 0,
+            'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0,
+        }
+
+    def put(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.flush()
+            self.queue.put(entry)
+        depth = self.queue.qsize()
+        self.stats['queued'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+        if depth >= self.batch_size:
+            self.wake.set()
+        self.start()
+
+    def start(self):
+        # Started lazily so each gunicorn worker gets its own thread after the fork
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self, final=False):
+        with self.lock:
+            if self.held and not final and time.monotonic() < self.retry_at:
+                return  # backing off; the writer thread tries again once it is time
+            batch = self.held
+            self.held = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(db.insert(AuditLog), batch)
+            except Exception:
+                self.attempts += 1
+                if final or self.attempts >= self.max_attempts:
+                    self.stats['failed'] += len(batch)
+                    app.logger.exception(
+                        "Gave up writing %d audit log entries after %d attempts: %s",
+                        len(batch), self.attempts, json.dumps(batch)
+                    )
+                    self.attempts = 0
+                    return
+                self.held = batch
+                self.retry_at = time.monotonic() + self.retry_delay * 2 ** (self.attempts - 1)
+                self.stats['retried'] += len(batch)
+                app.logger.warning(
+                    "Failed to write %d audit log entries (attempt %d), retrying", len(batch), self.attempts,
+                    exc_info=True
+                )
+                return
+            self.attempts = 0
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stats['written'] += len(batch)
+            self.stats['flushes'] += 1
+            self.stats['last_flush_ms'] = elapsed
+            self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed)
+            self.stats['total_flush_ms'] += elapsed
+
+    def metrics(self):
+        metrics = dict(self.stats, queue_depth=self.queue.qsize() + len(self.held))
+        metrics['avg_flush_ms'] = metrics['total_flush_ms'] / metrics['flushes'] if metrics['flushes'] else 0.0
+        return metrics
+
+audit_writer = AuditWriter(
+    app.config['AUDIT_BATCH_SIZE'], app.config['AUDIT_QUEUE_SIZE'], app.config['AUDIT_FLUSH_INTERVAL'],
+    app.config['AUDIT_MAX_ATTEMPTS'], app.config['AUDIT_RETRY_DELAY']
+)
+atexit.register(audit_writer.flush, final=True)
+
+@app.teardown_request
+def flush_audit_log(exc):
+    audit_writer.flush()
+
+# A flush (autoflush included) empties new/dirty/deleted, so the session
+# also remembers that its open transaction has written something
+@event.listens_for(RoutingSession, 'after_flush')
+def note_flush_write(db_session, flush_context):
+    db_session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def note_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['has_writes'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_writes(db_session):
+    db_session.info.pop('has_writes', None)
+
 def log_action(action, details):
-    entry = AuditLog(
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        action=action,
-        details=details
+    """Record an audit log entry.
+
+    If the session has written anything in its open transaction, or has
+    unsaved changes, the entry joins that transaction and is committed (or
+    rolled back) with them. Otherwise it is queued on the audit writer
+    rather than paying for a commit of its own.
+    """
+    entry = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'action': action,
+        'details': details,
+    }
+    if db.session.info.get('has_writes') or db.session.new or db.session.dirty or db.session.deleted:
+        db.session.add(AuditLog(**entry))
+    else:
+        audit_writer.put(entry)
+
+import hmac
+import random
+
+# METRICS_ENABLED=0 switches instrumentation off entirely; METRICS_SAMPLE_RATE
+# profiles only that fraction of requests. The counters live in each process
+# and every series carries a worker="<pid>" label: with several gunicorn
+# workers a scrape sees only the worker that answered, so the scraper has to
+# keep each worker's series and sum them (sum without(worker)) for totals.
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+app.config['METRICS_SAMPLE_RATE'] = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', '100'))
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    """Per-route latency histograms and SQL totals, rendered in Prometheus text format."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def observe(self, route, seconds, queries, query_seconds, held=False):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                    'queries': 0, 'query_seconds': 0.0, 'slow': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['queries'] += queries
+            stats['query_seconds'] += query_seconds
+            if not held and seconds * 1000 >= app.config['SLOW_REQUEST_MS']:
+                stats['slow'] += 1
+
+    def render(self):
+        with self.lock:
+            routes = {route: dict(stats, buckets=list(stats['buckets'])) for route, stats in self.routes.items()}
+        lines = [
+            '# HELP appliance_request_duration_seconds Request latency by route.',
+            '# TYPE appliance_request_duration_seconds histogram',
+        ]
+        for route, stats in sorted(routes.items()):
+            for bound, count in zip(self.buckets, stats['buckets']):
+                lines.append(f'appliance_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+            lines.append(f'appliance_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'appliance_request_duration_seconds_sum{{route="{route}"}} {stats["sum"]:.6f}')
+            lines.append(f'appliance_request_duration_seconds_count{{route="{route}"}} {stats["count"]}')
+        for name, key, help_text in (
+            ('appliance_request_queries_total', 'queries', 'SQL statements run by profiled requests.'),
+            ('appliance_request_query_seconds_total', 'query_seconds', 'Time spent in SQL by profiled requests.'),
+            ('appliance_slow_requests_total', 'slow', 'Profiled requests slower than SLOW_REQUEST_MS.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for route, stats in sorted(routes.items()):
+                lines.append(f'{name}{{route="{route}"}} {stats[key]}')
+        return lines
+
+request_metrics = RequestMetrics(LATENCY_BUCKETS)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('profile'):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and g.get('profile')) or not conn.info.get('query_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    g.query_count += 1
+    g.query_seconds += elapsed
+    if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        app.logger.warning("Slow query (%.0f ms) in %s: %s params=%r", elapsed * 1000, request.path, statement, parameters)
+
+def start_request_profile():
+    g.profile = random.random() < app.config['METRICS_SAMPLE_RATE']
+    if g.profile:
+        g.request_start = time.perf_counter()
+        g.query_count = 0
+        g.query_seconds = 0.0
+
+def finish_request_profile(response):
+    if g.get('profile'):
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        # Long-polls are slow by design; kept apart so they don't skew the route's latency
+        held = g.get('long_poll', False)
+        if held:
+            route += ' (long-poll)'
+        request_metrics.observe(route, elapsed, g.query_count, g.query_seconds, held=held)
+        if not held and elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+            app.logger.warning(
+                "Slow request %s %s: %.0f ms, %d queries (%.0f ms in SQL)",
+                request.method, request.path, elapsed * 1000, g.query_count, g.query_seconds * 1000
+            )
+    return response
+
+if app.config['METRICS_ENABLED']:
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
+
+def appliance_exists(store_name, item_number, exclude_id=None):
+    """Check the case-insensitive (store, item number) key backed by uq_appliance_store_item_ci."""
+    query = Appliance.query.filter(
+        db.func.lower(Appliance.store_name) == store_name.lower(),
+        Appliance.item_number == item_number
+    )
+    if exclude_id is not None:
+        query = query.filter(Appliance.id != exclude_id)
+    return db.session.query(query.exists()).scalar()
+
+def dialect_insert(model):
+    """An INSERT for model with on_conflict_* support, or None where the dialect has none."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
+def adjust_status_count(store_name, status, delta):
+    """Add delta to the StoreStatusCount row for store/status, creating it if needed.
+
+    An upsert, so two transactions creating the same new counter both land
+    instead of one failing on the primary key.
+    """
+    if not app.config['STATUS_COUNTERS'] or not delta:
+        return
+    stmt = dialect_insert(StoreStatusCount)
+    if stmt is not None:
+        stmt = stmt.values(store_name=store_name, status=status, count=delta)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[StoreStatusCount.store_name, StoreStatusCount.status],
+            set_={'count': StoreStatusCount.count + stmt.excluded.count}
+        ))
+        return
+    result = db.session.execute(
+        db.update(StoreStatusCount)
+        .where(StoreStatusCount.store_name == store_name, StoreStatusCount.status == status)
+        .values(count=StoreStatusCount.count + delta)
+    )
+    if result.rowcount == 0:
+        db.session.add(StoreStatusCount(store_name=store_name, status=status, count=delta))
+
+def counter_key(app_rec):
+    """The (store, status) an appliance counts towards, or None while it is archived."""
+    return None if app_rec.archived else (app_rec.store_name, app_rec.status)
+
+def track_status_count(before, after):
+    """Move one appliance between counters; before/after come from counter_key()."""
+    if before == after:
+        return
+    if before:
+        adjust_status_count(*before, -1)
+    if after:
+        adjust_status_count(*after, 1)
+
+def status_summary():
+    """Active appliance counts as {store: {status: count}}."""
+    if app.config['STATUS_COUNTERS']:
+        rows = db.session.execute(
+            db.select(StoreStatusCount.store_name, StoreStatusCount.status, StoreStatusCount.count)
+            .where(StoreStatusCount.count > 0)
+            .order_by(StoreStatusCount.store_name, StoreStatusCount.status)
+        )
+    else:
+        rows = db.session.execute(
+            db.select(Appliance.store_name, Appliance.status, db.func.count())
+            .where(Appliance.archived == False)
+            .group_by(Appliance.store_name, Appliance.status)
+            .order_by(Appliance.store_name, Appliance.status)
+        )
+    summary = {}
+    for store, status, count in rows:
+        summary.setdefault(store, {})[status] = count
+    return summary
+
+@app.cli.command('rebuild-status-counts')
+def rebuild_status_counts():
+    """Check StoreStatusCount against the appliance table and rebuild it from scratch."""
+    actual = {
+        (store, status): count for store, status, count in db.session.execute(
+            db.select(Appliance.store_name, Appliance.status, db.func.count())
+            .where(Appliance.archived == False)
+            .group_by(Appliance.store_name, Appliance.status)
+        )
+    }
+    stored = {
+        (row.store_name, row.status): row.count
+        for row in StoreStatusCount.query.filter(StoreStatusCount.count != 0)
+    }
+    for key in sorted(set(actual) | set(stored)):
+        if actual.get(key, 0) != stored.get(key, 0):
+            print(f"{key[0]} / {key[1]}: counter {stored.get(key, 0)}, actual {actual.get(key, 0)}")
+    StoreStatusCount.query.delete()
+    db.session.add_all(
+        StoreStatusCount(store_name=store, status=status, count=count)
+        for (store, status), count in actual.items()
     )
-    db.session.add(entry)
     db.session.commit()
+    print(f"Rebuilt {len(actual)} store/status counters.")
+
+# Request identity. The logged-in user is loaded at most once per request
+# (kept on g) and cached per process for USER_CACHE_TTL seconds, so role
+# checks don't query the users table on every hit. activate, deactivate and
+# change-password drop the user from the cache and touch USER_CACHE_STAMP,
+# which every worker on the host stats per request to clear its own cache.
+# Sessions carry a stamp of the password hash, so changing a password ends
+# the user's other sessions.
+from collections import namedtuple
+
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', '30'))
+app.config['USER_CACHE_STAMP'] = os.environ.get('USER_CACHE_STAMP', os.path.join(app.instance_path, 'users.stamp'))
+
+Identity = namedtuple('Identity', 'id username role store active stamp')
+
+def credential_stamp(password_hash):
+    # A digest rather than part of the hash itself: the session cookie is signed, not encrypted
+    return hashlib.sha256(password_hash.encode('utf-8')).hexdigest()[:16]
+
+class UserCache:
+    """Identities by user id, expiring after ttl seconds or when the stamp file changes."""
+
+    def __init__(self, ttl, stamp_path):
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.seen_stamp = self.read_stamp()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def read_stamp(self):
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, user_id):
+        stamp = self.read_stamp()
+        with self.lock:
+            if stamp != self.seen_stamp:
+                self.entries.clear()
+                self.seen_stamp = stamp
+            entry = self.entries.get(user_id)
+        if entry and entry[1] > time.monotonic():
+            self.stats['hits'] += 1
+            return entry[0]
+        self.stats['misses'] += 1
+        # Always from the primary, so a deactivation isn't hidden by replica lag
+        user = db.session.execute(
+            db.select(User).where(User.id == user_id), bind_arguments={'bind': db.engine}
+        ).scalar()
+        identity = None
+        if user:
+            identity = Identity(user.id, user.username, user.role, user.store, bool(user.active),
+                                credential_stamp(user.password_hash))
+        with self.lock:
+            self.entries[user_id] = (identity, time.monotonic() + self.ttl)
+        return identity
+
+    def forget(self, user_id):
+        """Drop a user here and tell the other workers to drop their cached users too."""
+        with self.lock:
+            self.entries.pop(user_id, None)
+        try:
+            os.makedirs(os.path.dirname(self.stamp_path) or '.', exist_ok=True)
+            with open(self.stamp_path, 'a'):
+                os.utime(self.stamp_path, None)
+        except OSError as e:
+            app.logger.warning("Could not touch %s: %s", self.stamp_path, e)
+
+user_cache = UserCache(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_STAMP'])
+
+def current_user():
+    """The logged-in user's Identity for this request, or None.
+
+    A session whose user has been deactivated, deleted or has changed
+    password since it logged in is cleared.
+    """
+    if 'current_user' not in g:
+        identity = None
+        user_id = session.get('user_id')
+        if user_id is not None:
+            identity = user_cache.get(user_id)
+            if not identity or not identity.active or session.get('auth_stamp') != identity.stamp:
+                session.clear()
+                identity = None
+        g.current_user = identity
+    return g.current_user
+
+@app.context_processor
+def inject_current_user():
+    return {'current_user': current_user()}
+
+def can_access_store(user, store_name):
+    """Store users only see their own store; other roles see every store."""
+    return user.role != 'store' or (store_name or '').lower() == (user.store or '').lower()
+
+def role_required(*roles):
+    """Only let logged-in users with one of these roles into the view; others go back to login.
+
+    When the view takes a store_name, store users are held to their own store.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user = current_user()
+            if not user or user.role not in roles:
+                return redirect('/')
+            if 'store_name' in kwargs and not can_access_store(user, kwargs['store_name']):
+                return redirect('/')
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Response cache for the read-heavy pages. Entries are keyed by path, role
+# and store and tagged with the DataVersion they were rendered at; any
+# transaction that writes appliances or their history bumps the version, so
+# stale entries are simply never matched again. CACHE_DIR adds an on-disk
+# tier shared by all gunicorn workers.
+#
+# DataVersion is one row, so bumping it serialises committing writers on
+# PostgreSQL (SQLite serialises them anyway). The change feed relies on that
+# ordering, so rather than spreading the counter out the bump is held back
+# until the transaction commits: writers queue on the row only for their
+# commit, not for everything they do before it. `flask --app app_web
+# db-benchmark --versioned` shows what the bump costs on a given database.
+import hashlib
+import pickle
+from collections import OrderedDict
+from flask import make_response
+
+app.config['CACHE_ENABLED'] = os.environ.get('CACHE_ENABLED', '1') != '0'
+app.config['CACHE_TTL'] = float(os.environ.get('CACHE_TTL', '300'))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', '512'))
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR')
+app.config['CACHE_DIR_MAX_ENTRIES'] = int(os.environ.get('CACHE_DIR_MAX_ENTRIES', '5000'))
+VERSIONED_TABLES = {'appliance', 'status_history'}
+
+class ResponseCache:
+    """LRU of rendered responses with a TTL, optionally backed by a shared directory."""
+
+    def __init__(self, max_entries, ttl, directory=None, directory_max_entries=5000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.directory_max_entries = directory_max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'not_modified': 0}
+        self.writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key, version):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['version'] == version and entry['expires'] > now:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry
+        if self.directory:
+            try:
+                with open(self.path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError):
+                entry = None
+            if entry and entry['key'] == key and entry['version'] == version and entry['expires'] > now:
+                self.put(key, entry, disk=False)
+                with self.lock:
+                    self.stats['disk_hits'] += 1
+                return entry
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key, entry, disk=True):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if self.directory and disk:
+            path = self.path(key)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp, path)
+            self.writes += 1
+            if self.writes % 100 == 0:
+                self.prune_directory()
+
+    def prune_directory(self):
+        """Drop the oldest files once the directory holds more than directory_max_entries."""
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        if len(files) <= self.directory_max_entries:
+            return
+        files.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in files[:len(files) - self.directory_max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+response_cache = ResponseCache(
+    app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'],
+    app.config['CACHE_DIR'], app.config['CACHE_DIR_MAX_ENTRIES']
+)
+
+def data_version():
+    """The current DataVersion, always read from the primary."""
+    return db.session.execute(
+        db.select(DataVersion.version).where(DataVersion.id == 1), bind_arguments={'bind': db.engine}
+    ).scalar() or 0
+
+def bump_data_version(db_session):
+    """Bump DataVersion once when db_session's transaction commits, inside that transaction."""
+    db_session.info['data_version_bumped'] = True
+
+def data_version_update():
+    return db.update(DataVersion).where(DataVersion.id == 1).values(
+        version=DataVersion.version + 1, changed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+@event.listens_for(RoutingSession, 'before_commit')
+def commit_data_version(db_session):
+    # Runs before the commit's own flush; flush first so its writes are counted.
+    # Registered ahead of write_changes(), which needs the row lock this takes.
+    db_session.flush()
+    if db_session.info.get('data_version_bumped'):
+        db_session.connection().execute(data_version_update())
+
+@event.listens_for(RoutingSession, 'before_flush')
+def version_orm_writes(db_session, flush_context, instances):
+    for obj in (*db_session.new, *db_session.dirty, *db_session.deleted):
+        if getattr(obj, '__tablename__', None) in VERSIONED_TABLES:
+            bump_data_version(db_session)
+            return
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def version_bulk_writes(orm_execute_state):
+    # insert()/update()/delete() run through session.execute(), e.g. imports and bulk archive
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in VERSIONED_TABLES:
+            bump_data_version(orm_execute_state.session)
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def reset_data_version_flag(db_session):
+    db_session.info.pop('data_version_bumped', None)
+
+def last_modified():
+    """When DataVersion last moved on; cached pages are versioned by it, so it stands in for their Last-Modified."""
+    value = db.session.execute(
+        db.select(DataVersion.changed_at).where(DataVersion.id == 1), bind_arguments={'bind': db.engine}
+    ).scalar()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").astimezone() if value else None
+    except ValueError:
+        return None
+
+def cached_view(per_user=False):
+    """Serve a GET view from response_cache, with ETag/Last-Modified so browsers revalidate with 304s.
+
+    Pages are keyed by path, query string, role and store (and user, for
+    pages that show something per user). Nothing is cached while flash
+    messages are waiting to be shown.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config['CACHE_ENABLED'] or request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            user = current_user()
+            key = f"{request.full_path}|{user.role if user else None}|{user.store if user else None}"
+            if per_user:
+                key += f"|{user.id if user else None}"
+            version = data_version()
+            etag = hashlib.sha1(f'{key}|{version}'.encode('utf-8')).hexdigest()
+            if request.if_none_match.contains(etag):
+                response_cache.stats['not_modified'] += 1
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            entry = response_cache.get(key, version)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                entry = {
+                    'key': key,
+                    'version': version,
+                    'expires': time.time() + response_cache.ttl,
+                    'body': response.get_data(),
+                    'headers': [(name, value) for name, value in response.headers if name.lower() != 'set-cookie'],
+                    'last_modified': last_modified(),
+                }
+                response_cache.put(key, entry)
+            response = make_response(entry['body'])
+            response.headers.clear()
+            response.headers.extend(entry['headers'])
+            response.set_etag(etag)
+            if entry['last_modified']:
+                response.last_modified = entry['last_modified']
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+@app.route('/cache-metrics')
+@role_required('admin')
+def cache_metrics():
+    return jsonify({**response_cache.stats, 'entries': len(response_cache.entries), 'version': data_version()})
+
+# Change feed. Every appliance write appends (appliance, store, action) rows
+# to appliance_change in the same transaction: ORM writes from after_flush,
+# bulk archive and imports by calling record_changes(). The rows are written
+# at commit, after the transaction has bumped DataVersion, whose row lock
+# serialises writers, so seq order is commit order and a cursor never skips a change
+# that commits late. /changes?since=<seq> returns what changed after a
+# cursor, one entry per appliance with its current state, and with wait=N
+# holds the request until something changes (long polling) so the store
+# portal can patch its table instead of reloading the whole store. A held
+# request ties up whatever serves it, so requests only wait when that is a
+# thread or coroutine (asgi.py, gunicorn gthread/gevent workers, the threaded
+# dev server); under sync workers /changes answers at once and tells the
+# client to come back in CHANGE_FEED_POLL_INTERVAL seconds.
+from datetime import timedelta
+
+app.config['CHANGE_FEED_LIMIT'] = int(os.environ.get('CHANGE_FEED_LIMIT', '500'))
+app.config['CHANGE_FEED_MAX_WAIT'] = float(os.environ.get('CHANGE_FEED_MAX_WAIT', '25'))
+app.config['CHANGE_FEED_POLL'] = float(os.environ.get('CHANGE_FEED_POLL', '1'))
+app.config['CHANGE_FEED_KEEP_DAYS'] = int(os.environ.get('CHANGE_FEED_KEEP_DAYS', '7'))
+app.config['CHANGE_FEED_LONG_POLL'] = os.environ.get('CHANGE_FEED_LONG_POLL', 'auto')  # 'auto', '1' or '0'
+app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', '15'))
+
+def can_long_poll():
+    """True if holding this request open costs a thread or coroutine rather than a whole worker."""
+    setting = app.config['CHANGE_FEED_LONG_POLL']
+    if setting == 'auto':
+        return bool(request.environ.get('wsgi.multithread'))
+    return setting == '1'
+
+def record_changes(db_session, changes):
+    """Append (appliance id, store name, action) triples to the change feed when db_session's transaction commits."""
+    if not changes:
+        return
+    db_session.info.setdefault('pending_changes', []).extend(changes)
+    db_session.info['appliance_changes'] = True
+    bump_data_version(db_session)
+
+@event.listens_for(RoutingSession, 'before_commit')
+def write_changes(db_session):
+    changes = db_session.info.pop('pending_changes', None)
+    if not changes:
+        return
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db_session.connection().execute(db.insert(ApplianceChange), [
+        {'appliance_id': appliance_id, 'store_name': store_name, 'action': action, 'changed_at': now}
+        for appliance_id, store_name, action in changes
+    ])
+
+@event.listens_for(RoutingSession, 'after_flush')
+def record_orm_changes(db_session, flush_context):
+    # new/dirty/deleted and attribute history still show the flushed changes here
+    changes = []
+    for obj in db_session.new:
+        if isinstance(obj, Appliance):
+            changes.append((obj.id, obj.store_name, 'add'))
+    for obj in db_session.dirty:
+        if not isinstance(obj, Appliance) or not db_session.is_modified(obj):
+            continue
+        attrs = db.inspect(obj).attrs
+        old_store = attrs.store_name.history.deleted
+        if old_store and old_store[0] != obj.store_name:
+            # Moved to another store: that store's clients drop it
+            changes.append((obj.id, old_store[0], 'remove'))
+        if attrs.archived.history.deleted:
+            changes.append((obj.id, obj.store_name, 'archive' if obj.archived else 'unarchive'))
+        else:
+            changes.append((obj.id, obj.store_name, 'edit'))
+    for obj in db_session.deleted:
+        if isinstance(obj, Appliance):
+            changes.append((obj.id, obj.store_name, 'delete'))
+    record_changes(db_session, changes)
+
+class ChangeNotifier:
+    """Wakes this process's long-polling /changes requests when a change commits.
+
+    Commits made by other processes are picked up by re-reading the feed every
+    CHANGE_FEED_POLL seconds.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+
+    def notify(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """Wait up to timeout seconds unless something was notified since generation seen."""
+        with self.condition:
+            if self.generation == seen:
+                self.condition.wait(timeout)
+
+change_notifier = ChangeNotifier()
+
+@event.listens_for(RoutingSession, 'after_commit')
+def notify_changes(db_session):
+    if db_session.info.pop('appliance_changes', None):
+        change_notifier.notify()
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_changes(db_session):
+    db_session.info.pop('appliance_changes', None)
+    db_session.info.pop('pending_changes', None)
+
+def change_cursor():
+    """The newest change seq; a page rendered after reading it shows at least everything up to it."""
+    return db.session.execute(db.select(db.func.max(ApplianceChange.seq))).scalar() or 0
+
+def appliance_json(app_rec):
+    return {
+        'id': app_rec.id,
+        'store_name': app_rec.store_name,
+        'item_number': app_rec.item_number,
+        'brand': app_rec.brand,
+        'model': app_rec.model,
+        'serial': app_rec.serial,
+        'status': app_rec.status,
+        'notes': app_rec.notes,
+        'archived': bool(app_rec.archived),
+        'last_updated': app_rec.last_updated,
+        'invoice_url': f'/invoices/{app_rec.invoice_file}' if app_rec.invoice_file else None,
+        'thumbnail_url': invoice_thumbnail_url(app_rec.invoice_file) if app_rec.invoice_file else None,
+    }
+
+def changes_since(since, store=None, limit=None):
+    """The feed after cursor since, for one store if given.
+
+    Changes are collapsed to one entry per appliance carrying its current
+    state, or appliance None once it is deleted or has left the store.
+    'reset' means the cursor is older than the retained feed (or newer than
+    it, after a restore) and the client has to reload.
+    """
+    limit = limit or app.config['CHANGE_FEED_LIMIT']
+    # Read the head first: everything up to it is committed, whatever commits while we read
+    head = change_cursor()
+    oldest = db.session.execute(db.select(db.func.min(ApplianceChange.seq))).scalar()
+    if since > head or (oldest and since < oldest - 1):
+        return {'cursor': head, 'reset': True, 'more': False, 'changes': []}
+    query = db.select(ApplianceChange.seq, ApplianceChange.appliance_id, ApplianceChange.action).where(
+        ApplianceChange.seq > since, ApplianceChange.seq <= head
+    )
+    if store:
+        query = query.where(ApplianceChange.store_name == store)
+    rows = db.session.execute(query.order_by(ApplianceChange.seq).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for row in rows:
+        latest.pop(row.appliance_id, None)
+        latest[row.appliance_id] = row
+    appliances = {}
+    ids = list(latest)
+    for i in range(0, len(ids), 500):
+        for app_rec in Appliance.query.filter(Appliance.id.in_(ids[i:i + 500])):
+            appliances[app_rec.id] = app_rec
+    changes = []
+    for appliance_id, row in latest.items():
+        app_rec = appliances.get(appliance_id)
+        if app_rec and store and app_rec.store_name != store:
+            app_rec = None
+        changes.append({
+            'seq': row.seq, 'id': appliance_id, 'action': row.action,
+            'appliance': appliance_json(app_rec) if app_rec else None,
+        })
+    return {'cursor': rows[-1].seq if more else head, 'reset': False, 'more': more, 'changes': changes}
+
+@app.route('/changes')
+@role_required('admin', 'tech', 'store')
+@read_replica
+def change_feed():
+    """Appliance changes after ?since=<cursor>; ?wait=<seconds> long-polls until there are some.
+
+    poll_after in the response is how many seconds the client should wait
+    before asking again: 0 when it may long-poll straight away.
+    """
+    user = current_user()
+    store = user.store if user.role == 'store' else request.args.get('store') or None
+    since = request.args.get('since', type=int)
+    long_poll = can_long_poll()
+    if since is None:
+        page = {'cursor': change_cursor(), 'reset': False, 'more': False, 'changes': []}
+    else:
+        wait = min(max(request.args.get('wait', 0, type=float), 0), app.config['CHANGE_FEED_MAX_WAIT'])
+        if not long_poll:
+            wait = 0
+        if wait:
+            # Held open on purpose: its timings go under their own route, not the slow-request log
+            g.long_poll = True
+        deadline = time.monotonic() + wait
+        while True:
+            seen = change_notifier.generation
+            page = changes_since(since, store)
+            remaining = deadline - time.monotonic()
+            if page['changes'] or page['reset'] or remaining <= 0:
+                break
+            # Nothing for this client up to here; don't hold a connection while waiting
+            since = page['cursor']
+            db.session.rollback()
+            change_notifier.wait(seen, min(app.config['CHANGE_FEED_POLL'], remaining))
+    page['poll_after'] = 0 if long_poll or page['more'] else app.config['CHANGE_FEED_POLL_INTERVAL']
+    response = jsonify(page)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.cli.command('prune-changes')
+def prune_changes():
+    """Delete change feed rows older than CHANGE_FEED_KEEP_DAYS (always keeping the newest)."""
+    cutoff = (datetime.now() - timedelta(days=app.config['CHANGE_FEED_KEEP_DAYS'])).strftime("%Y-%m-%d %H:%M:%S")
+    deleted = db.session.execute(db.delete(ApplianceChange).where(
+        ApplianceChange.changed_at < cutoff, ApplianceChange.seq < change_cursor()
+    )).rowcount
+    db.session.commit()
+    print(f"Deleted {deleted} change feed rows older than {cutoff}.")
 
 from werkzeug.security import check_password_hash
 
+# Password hashing runs in a small bounded pool so a burst of logins can't
+# take every worker thread's CPU, and a sliding-window limiter turns away
+# floods per IP and per username before any hashing is done. With
+# LOGIN_LIMIT_SHARED=1 the limiter counts in the database so every gunicorn
+# worker sees the same attempts. Hashes made with older settings are
+# upgraded to PASSWORD_HASH_METHOD on the next successful login.
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash
+import multiprocessing
+
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+app.config['HASH_POOL'] = os.environ.get('HASH_POOL', 'thread')  # 'thread' or 'process'
+app.config['HASH_WORKERS'] = int(os.environ.get('HASH_WORKERS', '2'))
+app.config['HASH_QUEUE_MAX'] = int(os.environ.get('HASH_QUEUE_MAX', '16'))
+app.config['HASH_TIMEOUT'] = float(os.environ.get('HASH_TIMEOUT', '10'))
+app.config['LOGIN_LIMIT_IP'] = int(os.environ.get('LOGIN_LIMIT_IP', '30'))            # failures per IP
+app.config['LOGIN_LIMIT_USER'] = int(os.environ.get('LOGIN_LIMIT_USER', '5'))         # failures per username
+app.config['LOGIN_LIMIT_WINDOW'] = float(os.environ.get('LOGIN_LIMIT_WINDOW', '300'))  # seconds
+app.config['LOGIN_LIMIT_SHARED'] = os.environ.get('LOGIN_LIMIT_SHARED') == '1'
+app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', '0'))  # reverse proxies in front of the app
+
+# Behind a reverse proxy every request comes from the proxy's address; take the
+# client's from the X-Forwarded-For entries the trusted proxies appended
+if app.config['TRUSTED_PROXIES']:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
+class PasswordHasherBusy(Exception):
+    """More hashes are waiting than HASH_QUEUE_MAX allows."""
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded thread or process pool.
+
+    pbkdf2 and scrypt release the GIL, so with the thread pool the calling
+    worker's other threads keep serving while a hash runs; the process pool
+    also takes the work off this interpreter entirely. At most HASH_WORKERS
+    hashes run at once and HASH_QUEUE_MAX wait; beyond that callers get
+    PasswordHasherBusy straight away instead of queueing.
+    """
+
+    def __init__(self, kind, workers, queue_max, timeout):
+        self.kind = kind
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue_max)
+        self.pool = None
+        self.lock = threading.Lock()
+        self.current_prefix = {}
+
+    def executor(self):
+        with self.lock:
+            if self.pool is None:
+                if self.kind == 'process':
+                    # spawn rather than fork: this process holds database connections and threads
+                    context = multiprocessing.get_context('spawn')
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                else:
+                    self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self.pool
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self.executor().submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # A hash we stopped waiting for still occupies the pool, so the slot is
+        # given back when it actually finishes
+        future.add_done_callback(lambda future: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHasherBusy()
+
+    def verify(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+    def hash(self, password, method=None):
+        return self.run(generate_password_hash, password, method or app.config['PASSWORD_HASH_METHOD'])
+
+    def needs_rehash(self, password_hash, method=None):
+        """True if password_hash was made with other settings than the configured method."""
+        method = method or app.config['PASSWORD_HASH_METHOD']
+        if method not in self.current_prefix:
+            # The method string may leave out defaults (iterations etc.); a real hash spells them out
+            self.current_prefix[method] = self.hash('', method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self.current_prefix[method]
+
+password_hasher = PasswordHasher(
+    app.config['HASH_POOL'], app.config['HASH_WORKERS'], app.config['HASH_QUEUE_MAX'], app.config['HASH_TIMEOUT']
+)
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+class SlidingWindowLimiter:
+    """Counts events per key over the last `window` seconds, in memory or in the LoginAttempt table."""
+
+    def __init__(self, window, shared=False):
+        self.window = window
+        self.shared = shared
+        self.events = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+
+    def count(self, key):
+        """Events for key inside the window, and seconds until the oldest of them expires."""
+        now = time.time()
+        cutoff = now - self.window
+        if self.shared:
+            count, oldest = db.session.execute(
+                db.select(db.func.count(), db.func.min(LoginAttempt.at))
+                .where(LoginAttempt.key == key, LoginAttempt.at > cutoff)
+            ).one()
+            return count, (oldest + self.window - now) if oldest else 0
+        with self.lock:
+            events = self.events.get(key)
+            while events and events[0] <= cutoff:
+                events.popleft()
+            if not events:
+                self.events.pop(key, None)
+                return 0, 0
+            return len(events), events[0] + self.window - now
+
+    def hit(self, key):
+        now = time.time()
+        if self.shared:
+            db.session.add(LoginAttempt(key=key, at=now))
+            # Drop this key's expired attempts while we're here
+            db.session.execute(db.delete(LoginAttempt).where(
+                LoginAttempt.key == key, LoginAttempt.at <= now - self.window
+            ))
+            db.session.commit()
+            return
+        with self.lock:
+            self.events.setdefault(key, deque()).append(now)
+            self.hits += 1
+            if self.hits % 1000 == 0:
+                # Forget keys that have gone quiet, e.g. after a spray of made-up usernames
+                for stale in [k for k, events in self.events.items() if events[-1] <= now - self.window]:
+                    del self.events[stale]
+
+    def reset(self, key):
+        if self.shared:
+            db.session.execute(db.delete(LoginAttempt).where(LoginAttempt.key == key))
+            db.session.commit()
+            return
+        with self.lock:
+            self.events.pop(key, None)
+
+login_limiter = SlidingWindowLimiter(app.config['LOGIN_LIMIT_WINDOW'], app.config['LOGIN_LIMIT_SHARED'])
+
+def login_retry_after(ip_key, user_key):
+    """Seconds to wait if this IP or username is over its limit, else 0."""
+    for key, limit in ((ip_key, app.config['LOGIN_LIMIT_IP']), (user_key, app.config['LOGIN_LIMIT_USER'])):
+        count, retry_after = login_limiter.count(key)
+        if limit and count >= limit:
+            return max(int(retry_after) + 1, 1)
+    return 0
+
+dummy_password_hash = []
+
+def verify_login(username, password):
+    """The active User for these credentials, or None. Hashes exactly once."""
+    user = User.query.filter_by(username=username, active=True).first()
+    if user:
+        ok = password_hasher.verify(user.password_hash, password)
+    else:
+        # Verify against a throwaway hash so unknown usernames take as long as wrong passwords
+        if not dummy_password_hash:
+            dummy_password_hash.append(hash_password('not a password'))
+        ok = password_hasher.verify(dummy_password_hash[0], password)
+    if not (user and ok):
+        return None
+    if password_hasher.needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        db.session.commit()
+        app.logger.info("Upgraded password hash for %s", username)
+    return user
+
 @app.route('/', methods=['GET', 'POST'])
 def login():
     error = None
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user = User.query.filter_by(username=username, active=True).first()
-        print(f"User: {user}, Username: {username}, Password OK: {check_password_hash(user.password_hash, password) if user else 'N/A'}")
-        if user and check_password_hash(user.password_hash, password):
+        ip_key = f"ip:{request.remote_addr}"
+        user_key = f"user:{username.lower()}"
+        retry_after = login_retry_after(ip_key, user_key)
+        if retry_after:
+            app.logger.warning("Login rate limited for %s from %s", username, request.remote_addr)
+            error = f"Too many login attempts. Try again in {retry_after} seconds."
+            return render_template('login.html', error=error), 429, {'Retry-After': str(retry_after)}
+        try:
+            user = verify_login(username, password)
+        except PasswordHasherBusy:
+            error = "The server is busy. Please try again in a moment."
+            return render_template('login.html', error=error), 503, {'Retry-After': '2'}
+        if user:
+            login_limiter.reset(user_key)
             session['username'] = username
             session['role'] = user.role
             session['store'] = user.store
             session['user_id'] = user.id
+            session['auth_stamp'] = credential_stamp(user.password_hash)
             if user.role == 'admin':
                 return redirect('/admin-dashboard')
             elif user.role == 'tech':
                 return redirect('/tech-dashboard')
             elif user.role == 'store':
                 return redirect('/store-portal')
+        # Only failures count, so a shared office address isn't locked out by its own logins
+        login_limiter.hit(ip_key)
+        login_limiter.hit(user_key)
+        app.logger.info("Failed login for %s from %s", username, request.remote_addr)
         error = "Invalid credentials"
     return render_template('login.html', error=error)
 
 @app.route('/manage-users')
+@role_required('admin')
 def manage_users():
-    if session.get('role') != 'admin':
-        return redirect('/')
     users = User.query.all()
     return render_template('manage_users.html', users=users)
 
 @app.route('/deactivate-user/<int:user_id>', methods=['POST'])
+@role_required('admin')
 def deactivate_user(user_id):
-    if session.get('role') != 'admin':
-        return redirect('/')
     user = User.query.get(user_id)
     if user:
         user.active = False
         db.session.commit()
+        user_cache.forget(user.id)
         flash("User deactivated.", "success")
     return redirect('/manage-users')
 
 @app.route('/activate-user/<int:user_id>', methods=['POST'])
+@role_required('admin')
 def activate_user(user_id):
-    if session.get('role') != 'admin':
-        return redirect('/')
     user = User.query.get(user_id)
     if user:
         user.active = True
         db.session.commit()
+        user_cache.forget(user.id)
         flash("User activated.", "success")
     return redirect('/manage-users')
 
 from werkzeug.security import generate_password_hash
 
 @app.route('/change-password/<int:user_id>', methods=['GET', 'POST'])
+@role_required('admin', 'store', 'tech')
 def change_password(user_id):
     # Only allow admin or the user themselves to change password
-    user = User.query.get(user_id)
-    if not user or (session['role'] != 'admin' and session['username'] != user.username):
+    if current_user().role != 'admin' and current_user().id != user_id:
+        return redirect('/')
+    user = db.session.get(User, user_id)
+    if not user:
         return redirect('/')
     error = None
     if request.method == 'POST':
         new_password = request.form['new_password']
-        user.password_hash = generate_password_hash(new_password, method="pbkdf2:sha256")
+        user.password_hash = hash_password(new_password)
         db.session.commit()
+        user_cache.forget(user.id)
+        if user.id == current_user().id:
+            # Keep this session; the user's other sessions end
+            session['auth_stamp'] = credential_stamp(user.password_hash)
         flash('Password changed successfully', 'success')
         return redirect('/manage-users')
     return render_template('change_password.html', user=user, error=error)
@@ -135,10 +1530,8 @@ def change_password(user_id):
 from werkzeug.security import generate_password_hash
 
 @app.route('/register', methods=['GET', 'POST'])
+@role_required('admin')
 def register():
-    # Only allow admin to register new users
-    if not session.get('role') == 'admin':
-        return redirect('/')
     error = None
     if request.method == 'POST':
         username = request.form['username']
@@ -152,7 +1545,7 @@ def register():
         else:
             user = User(
                 username=username,
-                password_hash=generate_password_hash(password, method="pbkdf2:sha256"),
+                password_hash=hash_password(password),
                 role=role,
                 store=store
             )
@@ -162,151 +1555,865 @@ def register():
             return redirect('/admin-dashboard')
     return render_template('register.html', error=error)
 
-from flask import Response
+from flask import Response, stream_with_context
+import io
+import zlib
+
+CSV_EXPORT_BATCH_SIZE = 1000
+
+def date_range_filters(column, args=None):
+    """Filters for the optional ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD export arguments."""
+    args = request.args if args is None else args
+    filters = []
+    date_from = args.get('date_from', '').strip()
+    date_to = args.get('date_to', '').strip()
+    if date_from:
+        filters.append(column >= date_from)
+    if date_to:
+        filters.append(column <= f"{date_to} 23:59:59")
+    return filters
+
+def stream_csv(query, fieldnames, compress=False, progress=None):
+    """Yield the rows of a select() as CSV, one batch at a time.
+
+    Rows come off a server-side cursor in CSV_EXPORT_BATCH_SIZE batches and
+    each batch is written out before the next one is fetched, so memory use
+    stays flat however big the table is. progress, if given, is called with
+    the number of rows written so far.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(fieldnames)
+    result = db.session.execute(query.execution_options(yield_per=CSV_EXPORT_BATCH_SIZE))
+    rows = 0
+    for batch in result.partitions():
+        writer.writerows(batch)
+        rows += len(batch)
+        if progress:
+            progress(rows)
+        chunk = drain()
+        if chunk:
+            yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+def csv_response(query, fieldnames, filename):
+    """Stream a CSV download, gzipped on the fly when ?gzip=1 is passed."""
+    compress = request.args.get('gzip') == '1'
+    if compress:
+        filename += '.gz'
+    return Response(
+        stream_with_context(stream_csv(query, fieldnames, compress)),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @app.route('/file-options')
+@role_required('admin')
 def file_options_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
-    return render_template('file_options.html')
+    return render_template('file_options.html', status_options=STATUS_OPTIONS, job_id=request.args.get('job', type=int))
 
 @app.route('/export-audit-csv')
+@role_required('admin')
 def export_audit_csv_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
-    import io
-    output = io.StringIO()
-    fieldnames = ['timestamp', 'action', 'details']
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    for entry in AuditLog.query.all():
-        writer.writerow({
-            'timestamp': entry.timestamp,
-            'action': entry.action,
-            'details': entry.details,
-        })
-    csv_data = output.getvalue()
-    output.close()
-    return Response(
-        csv_data,
-        mimetype='text/csv',
-        headers={'Content-Disposition': 'attachment; filename=audit_log.csv'}
-    )
+    if request.args.get('background'):
+        return redirect(f"/file-options?job={enqueue_job('export-audit-csv', request.args.to_dict())}")
+    return csv_response(audit_export_query(request.args), AUDIT_EXPORT_FIELDS, 'audit_log.csv')
+
+AUDIT_EXPORT_FIELDS = ['timestamp', 'action', 'details']
+
+def audit_export_query(args):
+    return db.select(AuditLog.timestamp, AuditLog.action, AuditLog.details).where(
+        *date_range_filters(AuditLog.timestamp, args)
+    ).order_by(AuditLog.id)
 
 @app.route('/import-audit-csv', methods=['POST'])
+@role_required('admin')
 def import_audit_csv_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
     file = request.files.get('csvfile')
     if not file:
         flash('No file selected!', 'error')
         return redirect('/file-options')
-    import io
-    stream = io.StringIO(file.stream.read().decode('UTF8'), newline=None)
-    reader = csv.DictReader(stream)
+    if request.form.get('background'):
+        return redirect(f"/file-options?job={enqueue_job('import-audit-csv', {'path': save_job_upload(file)})}")
+    # Decode the upload as it is read rather than all at once
+    stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+    try:
+        count = import_audit_rows(csv.DictReader(stream))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        flash(f"Could not read '{file.filename}': {e}", 'error')
+        return redirect('/file-options')
+    flash(f'Imported {count} audit log entries.', 'success')
+    return redirect('/file-options')
+
+def import_audit_rows(reader, chunk_size=None, progress=None):
+    """Add audit log rows from a CSV reader; returns how many were imported.
+
+    Rows are inserted with one executemany per chunk and committed a chunk at
+    a time, so the upload is never held in memory. progress, if given, is
+    called with the number of rows imported after each chunk.
+    """
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
     count = 0
+    chunk = []
     for row in reader:
         if row.get('timestamp') and row.get('action') and row.get('details'):
-            entry = AuditLog(
-                timestamp=row['timestamp'],
-                action=row['action'],
-                details=row['details']
-            )
-            db.session.add(entry)
-            count += 1
+            chunk.append({'timestamp': row['timestamp'], 'action': row['action'], 'details': row['details']})
+            if len(chunk) >= chunk_size:
+                db.session.execute(db.insert(AuditLog), chunk)
+                db.session.commit()
+                count += len(chunk)
+                chunk.clear()
+                if progress:
+                    progress(count)
+    if chunk:
+        db.session.execute(db.insert(AuditLog), chunk)
+        count += len(chunk)
     db.session.commit()
-    flash(f'Imported {count} audit log entries.', 'success')
-    return redirect('/file-options')
+    if progress:
+        progress(count, force=True)
+    return count
+
+app.config.setdefault('IMPORT_CHUNK_SIZE', 1000)
+IMPORT_FIELDS = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes']
+IMPORT_REPORT_MAX_REJECTIONS = 20
+
+def insert_ignoring_duplicates(model, rows, returning=()):
+    """executemany INSERT of plain dicts, using ON CONFLICT DO NOTHING where the dialect has it.
+
+    With returning columns, returns those columns for the rows actually
+    inserted; rows dropped as duplicates don't come back.
+    """
+    stmt = dialect_insert(model)
+    stmt = db.insert(model) if stmt is None else stmt.on_conflict_do_nothing()
+    if returning:
+        if db.engine.dialect.insert_executemany_returning:
+            return db.session.execute(stmt.returning(*returning), rows).all()
+        # No RETURNING for executemany here: insert one row at a time
+        return [row for values in rows for row in db.session.execute(stmt.values(**values).returning(*returning))]
+    db.session.execute(stmt, rows)
+
+def import_appliance_rows(rows, chunk_size=None, first_row=2, progress=None):
+    """Bulk-import appliance rows (dicts), committing one chunk at a time.
+
+    Rows are validated and deduplicated as they stream in. Each chunk resolves
+    the keys that already exist with a single query and inserts the rest with
+    one executemany. Rows from a snapshot also carry archived and
+    last_updated, which are kept. progress, if given, is called with the
+    number of rows read after each chunk. Returns a report dict with
+    'inserted', 'duplicates' and 'rejected' (a list of (row number, reason) pairs).
+    """
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    report = {'inserted': 0, 'duplicates': 0, 'rejected': []}
+    columns = Appliance.__table__.c
+    seen = set()
+    chunk = []
+
+    def flush_chunk():
+        stores = {values['store_name'].lower() for values in chunk}
+        items = {values['item_number'] for values in chunk}
+        existing = {
+            (store.lower(), item) for store, item in db.session.execute(
+                db.select(Appliance.store_name, Appliance.item_number).where(
+                    db.func.lower(Appliance.store_name).in_(stores),
+                    Appliance.item_number.in_(items)
+                )
+            )
+        }
+        new_rows = [
+            values for values in chunk
+            if (values['store_name'].lower(), values['item_number']) not in existing
+        ]
+        report['duplicates'] += len(chunk) - len(new_rows)
+        if new_rows:
+            # Another import can add the same key between the lookup and the
+            # insert; those rows are dropped by the insert and count as duplicates
+            inserted = insert_ignoring_duplicates(
+                Appliance, new_rows, returning=(Appliance.id, Appliance.store_name, Appliance.status, Appliance.archived)
+            )
+            report['inserted'] += len(inserted)
+            report['duplicates'] += len(new_rows) - len(inserted)
+            record_changes(db.session, [(row.id, row.store_name, 'add') for row in inserted])
+            counts = {}
+            for row in inserted:
+                if not row.archived:
+                    counts[(row.store_name, row.status)] = counts.get((row.store_name, row.status), 0) + 1
+            for (store_name, status), count in counts.items():
+                adjust_status_count(store_name, status, count)
+        db.session.commit()
+        chunk.clear()
+        if progress:
+            progress(row_number - first_row + 1)
+
+    row_number = first_row - 1
+    for row_number, row in enumerate(rows, first_row):  # CSV row 1 is the header
+        values = {name: (row.get(name) or '').strip() for name in IMPORT_FIELDS}
+        if not values['store_name'] or not values['item_number']:
+            report['rejected'].append((row_number, 'missing store_name or item_number'))
+            continue
+        too_long = [name for name in IMPORT_FIELDS if len(values[name]) > columns[name].type.length]
+        if too_long:
+            report['rejected'].append((row_number, f"{', '.join(too_long)} too long"))
+            continue
+        key = (values['store_name'].lower(), values['item_number'])
+        if key in seen:
+            report['duplicates'] += 1
+            continue
+        seen.add(key)
+        last_updated = row.get('last_updated')
+        if not isinstance(last_updated, str) or not last_updated or len(last_updated) > columns['last_updated'].type.length:
+            last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        values.update(
+            archived=row.get('archived') is True,
+            invoice_file=None,
+            last_updated=last_updated
+        )
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    if chunk:
+        flush_chunk()
+    elif progress:
+        progress(row_number - first_row + 1)
+    return report
+
+def flash_import_report(report):
+    """Show an import report as flash messages on the File Options page."""
+    flash(
+        f"Imported {report['inserted']} appliances, skipped {report['duplicates']} duplicates, "
+        f"rejected {len(report['rejected'])} rows.",
+        'success'
+    )
+    for row_number, reason in report['rejected'][:IMPORT_REPORT_MAX_REJECTIONS]:
+        flash(f"Row {row_number}: {reason}", 'error')
+    if len(report['rejected']) > IMPORT_REPORT_MAX_REJECTIONS:
+        flash(f"...and {len(report['rejected']) - IMPORT_REPORT_MAX_REJECTIONS} more rejected rows.", 'error')
 
 @app.route('/import-csv', methods=['POST'])
+@role_required('admin')
 def import_csv_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
     file = request.files.get('csvfile')
     if not file:
         return redirect('/file-options')
-    import io
-    stream = io.StringIO(file.stream.read().decode('UTF8'), newline=None)
-    reader = csv.DictReader(stream)
-    for row in reader:
-        if 'store_name' in row and 'item_number' in row:
-            exists = Appliance.query.filter_by(
-                store_name=row['store_name'],
-                item_number=row['item_number']
-            ).first()
-            if not exists:
-                new_app = Appliance(
-                    store_name=row['store_name'],
-                    item_number=row['item_number'],
-                    brand=row.get('brand', ''),
-                    model=row.get('model', ''),
-                    serial=row.get('serial', ''),
-                    status=row.get('status', ''),
-                    notes=row.get('notes', ''),
-                    archived=False,
-                    invoice_file=None
-                )
-                db.session.add(new_app)
-    db.session.commit()
+    if request.form.get('background'):
+        return redirect(f"/file-options?job={enqueue_job('import-csv', {'paths': [save_job_upload(file)]})}")
+    # Decode the upload as it is read rather than all at once
+    stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+    try:
+        report = import_appliance_rows(csv.DictReader(stream))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        flash(f"Could not read '{file.filename}': {e}", 'error')
+        return redirect('/file-options')
+    log_action('import', (
+        f"CSV import {file.filename}: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates skipped, {len(report['rejected'])} rejected"
+    )[:255])
+    flash_import_report(report)
     return redirect('/file-options')
 
+import shutil
+import tempfile
+from flask import send_file
+from werkzeug.utils import secure_filename
+import ingest
+import snapshot
+
+app.config['INGEST_WORKERS'] = int(os.environ.get('INGEST_WORKERS', '0')) or os.cpu_count() or 1
+app.config.setdefault('INGEST_CHUNK_BYTES', ingest.CHUNK_BYTES)
+
+def ingest_csv_files(paths, workers=None, progress=None):
+    """Parse CSV files in a process pool and store them through import_appliance_rows.
+
+    The workers parse, normalize and validate; this process is the only
+    writer, so deduplication against the database happens in one place.
+    Returns an import report that also carries 'files'.
+    """
+    parsed = {}
+    max_lengths = {name: Appliance.__table__.c[name].type.length for name in ingest.FIELDS}
+    rows = ingest.parallel_rows(
+        paths, parsed,
+        workers=workers or app.config['INGEST_WORKERS'],
+        chunk_bytes=app.config['INGEST_CHUNK_BYTES'],
+        max_lengths=max_lengths
+    )
+    report = import_appliance_rows(rows, progress=progress)
+    report['files'] = parsed['files']
+    report['duplicates'] += parsed['duplicates']
+    report['rejected'] = parsed['rejected'] + report['rejected']
+    return report
+
+@app.cli.command('ingest-csv')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--workers', type=int, default=None, help='Parser processes (default: INGEST_WORKERS).')
+def ingest_csv_command(directory, workers):
+    """Import every .csv file in DIRECTORY using a pool of parser processes."""
+    paths = ingest.csv_files(directory)
+    started = time.perf_counter()
+    report = ingest_csv_files(paths, workers)
+    elapsed = time.perf_counter() - started
+    rows = report['inserted'] + report['duplicates'] + len(report['rejected'])
+    print(
+        f"{report['files']} files: {report['inserted']} inserted, {report['duplicates']} duplicates, "
+        f"{len(report['rejected'])} rejected in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s, "
+        f"{workers or app.config['INGEST_WORKERS']} workers)"
+    )
+    for where, reason in report['rejected'][:IMPORT_REPORT_MAX_REJECTIONS]:
+        print(f"  {where}: {reason}")
+    log_action('import', f"CSV ingest of {report['files']} files from {directory}: {report['inserted']} inserted"[:255])
+    audit_writer.flush()
+
+@app.route('/import-csv-batch', methods=['POST'])
+@role_required('admin')
+def import_csv_batch_web():
+    files = [file for file in request.files.getlist('csvfiles') if file.filename]
+    if not files:
+        flash('No files selected!', 'error')
+        return redirect('/file-options')
+    if request.form.get('background'):
+        paths = [save_job_upload(file) for file in files]
+        return redirect(f"/file-options?job={enqueue_job('import-csv', {'paths': paths})}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n, file in enumerate(files):
+            # One directory per upload so reports can use the original file names
+            os.makedirs(os.path.join(tmp, str(n)))
+            path = os.path.join(tmp, str(n), secure_filename(file.filename) or 'upload.csv')
+            file.save(path)
+            paths.append(path)
+        try:
+            report = ingest_csv_files(paths)
+        except (UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not read the upload: {e}', 'error')
+            return redirect('/file-options')
+    log_action('import', (
+        f"CSV batch import of {report['files']} files: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates skipped, {len(report['rejected'])} rejected"
+    )[:255])
+    flash_import_report(report)
+    return redirect('/file-options')
+
+SNAPSHOT_FIELDS = IMPORT_FIELDS + ['archived', 'last_updated']
+SNAPSHOT_DICTIONARY = ('store_name', 'brand', 'status')
+
+@app.route('/export-snapshot')
+@role_required('admin')
+def export_snapshot_web():
+    """Download appliances as a binary columnar snapshot (see snapshot.py)."""
+    compression = request.args.get('compression', 'zlib')
+    if compression not in snapshot.COMPRESSION:
+        compression = 'none'
+    query = db.select(*(getattr(Appliance, name) for name in SNAPSHOT_FIELDS)).order_by(Appliance.id)
+    if request.args.get('include_archived') != '1':
+        query = query.where(Appliance.archived == False)
+    columns = {name: [] for name in SNAPSHOT_FIELDS}
+    appends = [columns[name].append for name in SNAPSHOT_FIELDS]
+    for row in db.session.execute(query.execution_options(yield_per=CSV_EXPORT_BATCH_SIZE)):
+        for append, value in zip(appends, row):
+            append(value)
+    columns['archived'] = [bool(value) for value in columns['archived']]
+    columns['notes'] = [value or '' for value in columns['notes']]
+    out = io.BytesIO()
+    snapshot.write_snapshot(out, columns, SNAPSHOT_DICTIONARY, compression)
+    out.seek(0)
+    return send_file(out, mimetype='application/octet-stream', as_attachment=True, download_name='appliances.snap')
+
+@app.route('/import-snapshot', methods=['POST'])
+@role_required('admin')
+def import_snapshot_web():
+    file = request.files.get('snapfile')
+    if not file:
+        return redirect('/file-options')
+    if request.form.get('background'):
+        return redirect(f"/file-options?job={enqueue_job('import-snapshot', {'path': save_job_upload(file)})}")
+    # Spool the upload to disk so the reader can mmap it
+    with tempfile.TemporaryFile() as tmp:
+        shutil.copyfileobj(file.stream, tmp)
+        tmp.flush()
+        try:
+            count, columns = snapshot.read_snapshot(tmp)
+        except ValueError as e:
+            flash(f"Could not read '{file.filename}': {e}", 'error')
+            return redirect('/file-options')
+    report = import_appliance_rows(snapshot.rows(count, columns), first_row=1)
+    log_action('import', (
+        f"Snapshot import {file.filename}: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates skipped, {len(report['rejected'])} rejected"
+    )[:255])
+    flash_import_report(report)
+    return redirect('/file-options')
+
+from datetime import timedelta
+
+def bulk_selector_filters(stores, statuses, older_than_days, archived, everything=False):
+    """WHERE clauses for the bulk actions selector.
+
+    Raises ValueError when no store, status or age is given, unless
+    everything says the whole inventory was meant.
+    """
+    if not (stores or statuses or older_than_days or everything):
+        raise ValueError("Choose a store, status or age, or tick 'All appliances' to act on every item.")
+    filters = [Appliance.archived == archived]
+    if stores:
+        filters.append(Appliance.store_name.in_(stores))
+    if statuses:
+        filters.append(Appliance.status.in_(statuses))
+    if older_than_days:
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+        filters.append(Appliance.last_updated < cutoff)
+    return filters
+
+def bulk_set_archived(filters, archived, record_history=False, user_id=None):
+    """Flip archived on every appliance matching filters with one UPDATE.
+
+    Audit entries (and optionally StatusHistory rows) for the affected
+    appliances are bulk-inserted in the same transaction. The archive or
+    restore itself is in the audit entry; a history row only records who
+    saw the item at its current status then, since archived is not a status.
+    Returns the number of appliances changed; the caller commits.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    columns = (Appliance.id, Appliance.store_name, Appliance.item_number, Appliance.status)
+    update = db.update(Appliance).where(*filters).values(archived=archived, last_updated=now)
+    if db.engine.dialect.update_returning:
+        rows = db.session.execute(update.returning(*columns)).all()
+    else:
+        rows = db.session.execute(db.select(*columns).where(*filters)).all()
+        ids = [row.id for row in rows]
+        for i in range(0, len(ids), 500):
+            db.session.execute(
+                db.update(Appliance).where(Appliance.id.in_(ids[i:i + 500])).values(archived=archived, last_updated=now)
+            )
+    if not rows:
+        return 0
+    action = 'archive' if archived else 'unarchive'
+    verb = 'Archived' if archived else 'Unarchived'
+    db.session.execute(db.insert(AuditLog), [
+        {'timestamp': now, 'action': action, 'details': f'{verb} {row.store_name}/{row.item_number} (bulk)'}
+        for row in rows
+    ])
+    record_changes(db.session, [(row.id, row.store_name, action) for row in rows])
+    if record_history:
+        db.session.execute(db.insert(StatusHistory), [
+            {'appliance_id': row.id, 'user_id': user_id, 'timestamp': now, 'status': row.status}
+            for row in rows
+        ])
+    counts = {}
+    for row in rows:
+        counts[(row.store_name, row.status)] = counts.get((row.store_name, row.status), 0) + 1
+    for (store_name, status), count in counts.items():
+        adjust_status_count(store_name, status, -count if archived else count)
+    return len(rows)
+
+def store_names():
+    """Distinct store names, read straight off the store_name index."""
+    return db.session.execute(
+        db.select(Appliance.store_name).distinct().order_by(Appliance.store_name)
+    ).scalars().all()
+
 @app.route('/bulk-actions', methods=['GET', 'POST'])
+@role_required('admin')
 def bulk_actions_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
     message = ""
+    job_id = None
     if request.method == 'POST':
-        store = request.form['store_name']
-        status = request.form['status']
+        stores = request.form.getlist('store_name')
+        statuses = request.form.getlist('status')
         action = request.form['action']
-        count = 0
-
-        # Use a database query to get all appliances with the right store and status!
-        apps = Appliance.query.filter_by(store_name=store, status=status).all()
-        for app_rec in apps:
-            if action == 'archive' and not app_rec.archived:
-                app_rec.archived = True
-                count += 1
-            elif action == 'unarchive' and app_rec.archived:
-                app_rec.archived = False
-                count += 1
-        db.session.commit()
-        message = f"{count} appliances {'archived' if action == 'archive' else 'restored'}."
-
-    stores = sorted(set(app.store_name for app in Appliance.query.all()))
-    return render_template('bulk_actions.html', stores=stores, status_options=STATUS_OPTIONS, message=message)
+        try:
+            older_than_days = int(request.form.get('older_than_days') or 0)
+        except ValueError:
+            older_than_days = 0
+        archive = action == 'archive'
+        everything = bool(request.form.get('all_appliances'))
+        try:
+            filters = bulk_selector_filters(stores, statuses, older_than_days, archived=not archive, everything=everything)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect('/bulk-actions')
+        if request.form.get('dry_run'):
+            count = db.session.execute(db.select(db.func.count()).select_from(Appliance).where(*filters)).scalar()
+            message = f"Preview: {count} appliances would be {'archived' if archive else 'restored'}."
+        elif request.form.get('background'):
+            job_id = enqueue_job('bulk-archive', {
+                'stores': stores, 'statuses': statuses, 'older_than_days': older_than_days, 'everything': everything,
+                'archive': archive, 'record_history': bool(request.form.get('record_history')),
+                'user_id': current_user().id,
+            })
+            message = f"Job #{job_id} queued."
+        else:
+            count = bulk_set_archived(
+                filters, archive, record_history=bool(request.form.get('record_history')), user_id=current_user().id
+            )
+            db.session.commit()
+            message = f"{count} appliances {'archived' if archive else 'restored'}."
 
-import csv
-import io
-from flask import Response
+    return render_template(
+        'bulk_actions.html', stores=store_names(), status_options=STATUS_OPTIONS, message=message, job_id=job_id
+    )
 
 @app.route('/export-csv')
+@role_required('admin')
 def export_csv_web():
-    if session.get('role') != 'admin':
-        return redirect('/')
-    import io
-    output = io.StringIO()
-    fieldnames = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes']
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    for app in Appliance.query.filter_by(archived=False).all():
-        writer.writerow({
-            'store_name': app.store_name,
-            'item_number': app.item_number,
-            'brand': app.brand,
-            'model': app.model,
-            'serial': app.serial,
-            'status': app.status,
-            'notes': app.notes,
-        })
-    csv_data = output.getvalue()
-    output.close()
-    return Response(
-        csv_data,
-        mimetype='text/csv',
-        headers={'Content-Disposition': 'attachment; filename=appliances.csv'}
+    if request.args.get('background'):
+        return redirect(f"/file-options?job={enqueue_job('export-csv', request.args.to_dict())}")
+    return csv_response(appliance_export_query(request.args), APPLIANCE_EXPORT_FIELDS, 'appliances.csv')
+
+APPLIANCE_EXPORT_FIELDS = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes']
+
+def appliance_export_query(args):
+    """The appliance export select() for the store/status/date/include_archived arguments."""
+    query = db.select(*(getattr(Appliance, name) for name in APPLIANCE_EXPORT_FIELDS))
+    if args.get('include_archived') != '1':
+        query = query.where(Appliance.archived == False)
+    store = args.get('store', '').strip()
+    if store:
+        query = query.where(db.func.lower(Appliance.store_name) == store.lower())
+    status = args.get('status', '').strip()
+    if status:
+        query = query.where(Appliance.status == status)
+    return query.where(*date_range_filters(Appliance.last_updated, args)).order_by(Appliance.id)
+
+# Background jobs: long imports, exports and bulk changes are queued in the
+# job table and run by worker threads, so they do not hold a web request open.
+# Set JOB_WORKERS=0 to leave them to a separate `flask --app app_web run-jobs`.
+import json
+import uuid
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from contextlib import contextmanager
+from sqlalchemy.exc import OperationalError
+
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '2'))
+app.config['JOB_FOLDER'] = os.environ.get('JOB_FOLDER', 'jobs')
+app.config.setdefault('JOB_POLL_INTERVAL', 2.0)
+app.config.setdefault('JOB_PROGRESS_INTERVAL', 0.5)
+app.config['JOB_TIMEOUT'] = float(os.environ.get('JOB_TIMEOUT', '3600'))  # seconds a job may stay running
+os.makedirs(app.config['JOB_FOLDER'], exist_ok=True)
+
+JOB_HANDLERS = {}
+job_wakeup = threading.Event()
+job_workers = []
+job_workers_lock = threading.Lock()
+job_queue_thread_lock = threading.Lock()
+last_stale_job_check = 0.0
+
+def job_handler(kind):
+    """Register a function(params, progress) as the handler for a kind of job."""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+def save_job_upload(file):
+    """Save an uploaded file where a job worker can read it; returns its path."""
+    folder = os.path.join(app.config['JOB_FOLDER'], 'uploads', uuid.uuid4().hex)
+    os.makedirs(folder)
+    path = os.path.join(folder, secure_filename(file.filename) or 'upload')
+    file.save(path)
+    return path
+
+def discard_job_upload(path):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+def enqueue_job(kind, params):
+    """Queue a job and return its id."""
+    job = Job(
+        kind=kind,
+        params=json.dumps(params),
+        created_by=session.get('user_id'),
+        created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+    db.session.add(job)
+    log_action('job', f'Queued {kind} job')
+    db.session.commit()
+    job_wakeup.set()
+    return job.id
+
+@contextmanager
+def job_queue_lock():
+    """Serialize job claims on databases without SKIP LOCKED, across processes where possible."""
+    if fcntl is None:
+        with job_queue_thread_lock:
+            yield
+        return
+    with open(os.path.join(app.config['JOB_FOLDER'], 'queue.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def claim_job():
+    """Mark the oldest queued job as running and return its id, or None if the queue is empty."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    oldest = db.select(Job.id).where(Job.state == 'queued').order_by(Job.id).limit(1)
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            job_id = conn.execute(oldest.with_for_update(skip_locked=True)).scalar()
+            if job_id is not None:
+                conn.execute(db.update(Job).where(Job.id == job_id).values(state='running', started_at=now))
+            return job_id
+    with job_queue_lock(), db.engine.begin() as conn:
+        job_id = conn.execute(oldest).scalar()
+        if job_id is None:
+            return None
+        claimed = conn.execute(
+            db.update(Job).where(Job.id == job_id, Job.state == 'queued').values(state='running', started_at=now)
+        ).rowcount
+        return job_id if claimed else None
+
+def fail_stale_jobs():
+    """Fail jobs still running JOB_TIMEOUT seconds after they started; returns how many.
+
+    Such a job's worker was killed or restarted mid-run. Jobs aren't safe to
+    run twice (a bulk action or import may be half applied), so they are
+    failed rather than requeued and the admin can start them again.
+    """
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=app.config['JOB_TIMEOUT'])).strftime("%Y-%m-%d %H:%M:%S")
+    with db.engine.begin() as conn:
+        stale = conn.execute(
+            db.select(Job.id).where(Job.state == 'running', Job.started_at < cutoff)
+        ).scalars().all()
+        if not stale:
+            return 0
+        conn.execute(db.update(Job).where(Job.id.in_(stale), Job.state == 'running').values(
+            state='failed',
+            error=f"Timed out: still running {app.config['JOB_TIMEOUT']:.0f} seconds after it started "
+                  "(its worker was probably stopped). Start it again if needed.",
+            finished_at=now.strftime("%Y-%m-%d %H:%M:%S")
+        ))
+    app.logger.warning("Failed %d stale job(s): %s", len(stale), ', '.join(map(str, stale)))
+    return len(stale)
+
+class JobProgress:
+    """Callable handed to job handlers; writes progress back to the job row now and then."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last = 0
+
+    def __call__(self, done, total=None, force=False):
+        now = time.monotonic()
+        if not force and now - self.last < app.config['JOB_PROGRESS_INTERVAL']:
+            return
+        self.last = now
+        values = {'progress': done}
+        if total is not None:
+            values['total'] = total
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.update(Job).where(Job.id == self.job_id).values(**values))
+        except OperationalError:
+            pass  # progress is best effort; SQLite may be busy with the job's own writes
+
+def run_job(job_id):
+    """Run one claimed job and record its result or error."""
+    job = db.session.get(Job, job_id)
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job kind {job.kind}')
+        result = handler(json.loads(job.params), JobProgress(job_id))
+        state, error = 'done', None
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception("Job %s (%s) failed", job_id, job.kind)
+        result, state, error = None, 'failed', str(e) or e.__class__.__name__
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(
+        state=state,
+        result=json.dumps(result) if result is not None else None,
+        error=error,
+        finished_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ))
+    db.session.commit()
+
+def job_worker_loop():
+    global last_stale_job_check
+    while True:
+        try:
+            with app.app_context():
+                # Checked now and then, not on every poll
+                if time.monotonic() - last_stale_job_check > min(60, app.config['JOB_TIMEOUT'] / 10):
+                    last_stale_job_check = time.monotonic()
+                    fail_stale_jobs()
+                job_id = claim_job()
+                if job_id is not None:
+                    run_job(job_id)
+                    continue
+        except Exception:
+            app.logger.exception("Job worker error")
+        job_wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+        job_wakeup.clear()
+
+def start_job_workers(count):
+    with job_workers_lock:
+        while len(job_workers) < count:
+            worker = threading.Thread(target=job_worker_loop, name=f'job-worker-{len(job_workers)}', daemon=True)
+            worker.start()
+            job_workers.append(worker)
+
+@app.before_request
+def ensure_job_workers():
+    # Started with the first request rather than at import, so CLI commands don't run jobs
+    if len(job_workers) < app.config['JOB_WORKERS']:
+        start_job_workers(app.config['JOB_WORKERS'])
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=2, help='Worker threads.')
+def run_jobs_command(workers):
+    """Run background jobs in this process until interrupted."""
+    start_job_workers(workers)
+    print(f"Running jobs with {workers} workers. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+
+def job_summary(job):
+    result = json.loads(job.result) if job.result else {}
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'state': job.state,
+        'progress': job.progress,
+        'total': job.total,
+        'result': result,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'download_url': f'/jobs/{job.id}/download' if result.get('file') else None,
+    }
+
+@app.route('/jobs')
+@role_required('admin')
+def jobs_web():
+    jobs = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return jsonify([job_summary(job) for job in jobs])
+
+@app.route('/jobs/<int:job_id>')
+@role_required('admin')
+def job_status_web(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(job_summary(job))
+
+@app.route('/jobs/<int:job_id>/download')
+@role_required('admin')
+def job_download_web(job_id):
+    job = db.session.get(Job, job_id)
+    result = json.loads(job.result) if job and job.result else {}
+    if not result.get('file'):
+        flash('That export is not ready.', 'error')
+        return redirect('/file-options')
+    return send_from_directory(
+        os.path.abspath(os.path.join(app.config['JOB_FOLDER'], 'exports')), result['file'],
+        as_attachment=True, download_name=result['file'].split('-', 1)[1]
     )
 
+def import_report_result(report):
+    return {
+        'summary': (
+            f"Imported {report['inserted']} appliances, skipped {report['duplicates']} duplicates, "
+            f"rejected {len(report['rejected'])} rows."
+        ),
+        'inserted': report['inserted'],
+        'duplicates': report['duplicates'],
+        'rejected_count': len(report['rejected']),
+        'rejected': [list(item) for item in report['rejected'][:IMPORT_REPORT_MAX_REJECTIONS]],
+    }
+
+@job_handler('import-csv')
+def import_csv_job(params, progress):
+    try:
+        report = ingest_csv_files(params['paths'], progress=progress)
+    finally:
+        for path in params['paths']:
+            discard_job_upload(path)
+    log_action('import', (
+        f"CSV import of {report['files']} files: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates skipped, {len(report['rejected'])} rejected"
+    )[:255])
+    return import_report_result(report)
+
+@job_handler('import-snapshot')
+def import_snapshot_job(params, progress):
+    try:
+        count, columns = snapshot.read_snapshot(params['path'])
+    finally:
+        discard_job_upload(params['path'])
+    progress(0, count, force=True)
+    report = import_appliance_rows(snapshot.rows(count, columns), first_row=1, progress=progress)
+    log_action('import', (
+        f"Snapshot import: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates skipped, {len(report['rejected'])} rejected"
+    )[:255])
+    return import_report_result(report)
+
+@job_handler('import-audit-csv')
+def import_audit_csv_job(params, progress):
+    try:
+        with open(params['path'], newline='', encoding='utf-8-sig') as f:
+            count = import_audit_rows(csv.DictReader(f), progress=progress)
+    finally:
+        discard_job_upload(params['path'])
+    return {'summary': f'Imported {count} audit log entries.', 'imported': count}
+
+@job_handler('bulk-archive')
+def bulk_archive_job(params, progress):
+    archive = params['archive']
+    filters = bulk_selector_filters(
+        params['stores'], params['statuses'], params['older_than_days'], archived=not archive,
+        everything=params.get('everything', False)
+    )
+    count = bulk_set_archived(filters, archive, record_history=params['record_history'], user_id=params.get('user_id'))
+    db.session.commit()
+    progress(count, count, force=True)
+    return {'summary': f"{count} appliances {'archived' if archive else 'restored'}.", 'count': count}
+
+def export_csv_job(query, fieldnames, name, params, progress):
+    folder = os.path.join(app.config['JOB_FOLDER'], 'exports')
+    os.makedirs(folder, exist_ok=True)
+    compress = params.get('gzip') == '1'
+    filename = f"{uuid.uuid4().hex[:8]}-{name}" + ('.gz' if compress else '')
+    rows = []
+    def count_rows(done):
+        rows[:] = [done]
+        progress(done)
+    with open(os.path.join(folder, filename), 'wb') as f:
+        for chunk in stream_csv(query, fieldnames, compress, progress=count_rows):
+            f.write(chunk)
+    written = rows[0] if rows else 0
+    progress(written, written, force=True)
+    return {'summary': f'Exported {written} rows.', 'file': filename, 'rows': written}
+
+@job_handler('export-csv')
+def export_appliances_job(params, progress):
+    return export_csv_job(appliance_export_query(params), APPLIANCE_EXPORT_FIELDS, 'appliances.csv', params, progress)
+
+@job_handler('export-audit-csv')
+def export_audit_job(params, progress):
+    return export_csv_job(audit_export_query(params), AUDIT_EXPORT_FIELDS, 'audit_log.csv', params, progress)
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -315,29 +2422,109 @@ def logout():
 STATUS_OPTIONS = ["In", "Checked", "Parts Ordered", "Repaired", "Loaded", "Delivered"]
 
 @app.route('/admin-dashboard')
+@role_required('admin')
+@cached_view()
+@read_replica
 def admin_dashboard():
-    if session.get('role') != 'admin':
-        return redirect('/')
-    summary = {}
-    for app_rec in Appliance.query.filter_by(archived=False).all():
-        store = app_rec.store_name
-        status = app_rec.status
-        summary.setdefault(store, {})
-        summary[store][status] = summary[store].get(status, 0) + 1
-    return render_template('admin_dashboard.html', summary=summary)
+    return render_template('admin_dashboard.html', summary=status_summary())
 
 UPLOAD_FOLDER = 'invoices'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Invoice storage. Uploads are streamed to a temp file while being hashed and
+# then kept once per content under invoices/objects/ab/cd/<sha256>. The
+# appliance row stores '<sha256>/<original name>', so the name stays
+# searchable. Older rows holding a bare filename are still served from the
+# flat invoices/ folder. Thumbnails are made by a background job.
+import mimetypes
+import re
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # thumbnails are skipped without Pillow
+    Image = None
+
+app.config['INVOICE_MAX_BYTES'] = int(os.environ.get('INVOICE_MAX_BYTES', str(50 * 1024 * 1024)))
+app.config['INVOICE_CHUNK_BYTES'] = 1024 * 1024
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+INVOICE_THUMBNAIL_SIZES = {'thumb': (256, 70), 'preview': (1024, 80)}  # longest side, JPEG quality
+INVOICE_IMAGE_TYPES = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+INVOICE_REF = re.compile(r'^([0-9a-f]{64})/(.+)$')
+# The original name part of invoice_file, for searching; older bare filenames are all name
+INVOICE_NAME = db.case(
+    (Appliance.invoice_file.like('%/%'), db.func.substr(Appliance.invoice_file, 66)),
+    else_=Appliance.invoice_file
+)
+
+def invoice_object_path(digest):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'objects', digest[:2], digest[2:4], digest)
+
+def invoice_thumbnail_path(digest, size):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'thumbs', digest[:2], digest[2:4], f'{digest}-{size}.jpg')
+
+def store_invoice(file):
+    """Save an uploaded invoice once per content; returns (invoice_file reference, is new content).
+
+    Raises ValueError if the upload is larger than INVOICE_MAX_BYTES.
+    """
+    name = secure_filename(file.filename) or 'invoice'
+    tmp_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(tmp_folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=tmp_folder, delete=False) as tmp:
+        try:
+            while True:
+                chunk = file.stream.read(app.config['INVOICE_CHUNK_BYTES'])
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > app.config['INVOICE_MAX_BYTES']:
+                    raise ValueError(f"Invoice is larger than {app.config['INVOICE_MAX_BYTES'] // (1024 * 1024)} MB")
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    digest = digest.hexdigest()
+    path = invoice_object_path(digest)
+    if os.path.exists(path):
+        os.remove(tmp.name)
+        is_new = False
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp.name, path)
+        is_new = True
+    return f"{digest}/{name}"[:255], is_new
+
+def is_image_invoice(name):
+    return os.path.splitext(name)[1].lower() in INVOICE_IMAGE_TYPES
+
+def invoice_thumbnail_url(invoice_file, size='thumb'):
+    """URL of a generated thumbnail for an invoice reference, or None."""
+    match = INVOICE_REF.match(invoice_file or '')
+    if not match or not os.path.exists(invoice_thumbnail_path(match.group(1), size)):
+        return None
+    return f'/invoice-thumbs/{size}/{match.group(1)}.jpg'
+
+app.jinja_env.globals['invoice_thumbnail_url'] = invoice_thumbnail_url
+
 from flask import flash
 
 @app.route('/add', methods=['GET', 'POST'])
+@role_required('admin')
 def add_appliance_web():
     if request.method == 'POST':
+        # Stripped like the CSV import and the console app, so ' Store1' is Store1
+        store_name = request.form['store_name'].strip()
+        item_number = request.form['item_number'].strip()
+        if appliance_exists(store_name, item_number):
+            flash('An appliance with this store and item number already exists!', 'error')
+            return render_template('add.html', status_options=STATUS_OPTIONS)
         new_app = Appliance(
-            store_name=request.form['store_name'],
-            item_number=request.form['item_number'],
+            store_name=store_name,
+            item_number=item_number,
             brand=request.form['brand'],
             model=request.form['model'],
             serial=request.form['serial'],
@@ -347,16 +2534,60 @@ def add_appliance_web():
             invoice_file=None
         )
         db.session.add(new_app)
-        db.session.commit()
+        track_status_count(None, counter_key(new_app))
         log_action('add', f'Added {new_app.store_name}/{new_app.item_number}')
+        db.session.commit()
         flash('Appliance added successfully', 'success')
         return redirect('/admin-dashboard')
     return render_template('add.html', status_options=STATUS_OPTIONS)
 
+from flask import jsonify
+
+@app.route('/audit-metrics')
+@role_required('admin')
+def audit_metrics():
+    return jsonify(audit_writer.metrics())
+
+@app.route('/metrics')
+def metrics():
+    # Admins in the browser, or a scraper presenting METRICS_TOKEN
+    token = app.config['METRICS_TOKEN']
+    user = current_user()
+    authorized = (user and user.role == 'admin') or (
+        token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    )
+    if not authorized:
+        return redirect('/')
+    if not app.config['METRICS_ENABLED']:
+        return 'Metrics are disabled.', 404
+    lines = request_metrics.render()
+    audit = audit_writer.metrics()
+    lines += [
+        '# HELP appliance_audit_queue_depth Audit log entries waiting to be written.',
+        '# TYPE appliance_audit_queue_depth gauge',
+        f"appliance_audit_queue_depth {audit['queue_depth']}",
+        '# HELP appliance_audit_written_total Audit log entries written by the batch writer.',
+        '# TYPE appliance_audit_written_total counter',
+        f"appliance_audit_written_total {audit['written']}",
+        '# HELP appliance_audit_failed_total Audit log entries given up on after repeated write failures.',
+        '# TYPE appliance_audit_failed_total counter',
+        f"appliance_audit_failed_total {audit['failed']}",
+        '# HELP appliance_audit_flush_seconds_max Slowest audit log batch flush.',
+        '# TYPE appliance_audit_flush_seconds_max gauge',
+        f"appliance_audit_flush_seconds_max {audit['max_flush_ms'] / 1000:.6f}",
+    ]
+    # Counters are per process; the worker label keeps each gunicorn worker's series apart
+    worker = f'worker="{os.getpid()}"'
+    lines = [
+        line if line.startswith('#') else
+        line.replace('} ', f',{worker}}} ', 1) if '{' in line else line.replace(' ', f'{{{worker}}} ', 1)
+        for line in lines
+    ]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 @app.route('/view-audit-log')
+@role_required('admin')
 def view_audit_log():
-    if session.get('role') != 'admin':
-        return redirect('/')
     log = AuditLog.query.order_by(AuditLog.timestamp.desc()).all()
     return render_template('view_audit_log.html', log=log)
 
@@ -364,16 +2595,23 @@ from datetime import datetime
 from flask import flash
 
 @app.route('/edit/<store_name>/<item_number>', methods=['GET', 'POST'])
+@role_required('admin')
 def edit_appliance_web(store_name, item_number):
     app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number).first()
     if not app_rec:
         return 'Appliance not found', 404
     if request.method == 'POST':
+        new_store = request.form['store_name'].strip()
+        new_item = request.form['item_number'].strip()
+        if appliance_exists(new_store, new_item, exclude_id=app_rec.id):
+            flash('An appliance with this store and item number already exists!', 'error')
+            return render_template('edit.html', appliance=app_rec, status_options=STATUS_OPTIONS)
         old_store = app_rec.store_name
         old_item = app_rec.item_number
         old_status = app_rec.status
-        app_rec.store_name = request.form['store_name']
-        app_rec.item_number = request.form['item_number']
+        old_counter = counter_key(app_rec)
+        app_rec.store_name = new_store
+        app_rec.item_number = new_item
         app_rec.brand = request.form['brand']
         app_rec.model = request.form['model']
         app_rec.serial = request.form['serial']
@@ -389,15 +2627,24 @@ def edit_appliance_web(store_name, item_number):
             db.session.add(new_history)
         app_rec.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         # Invoice logic...
+        new_invoice = None
         if app_rec.status.lower() in ["delivered", "loaded"]:
             file = request.files.get('invoice')
             if file and file.filename:
-                filename = file.filename
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                app_rec.invoice_file = filename
+                try:
+                    app_rec.invoice_file, is_new = store_invoice(file)
+                except ValueError as e:
+                    db.session.rollback()
+                    flash(str(e), 'error')
+                    return render_template('edit.html', appliance=app_rec, status_options=STATUS_OPTIONS)
+                if is_new and Image is not None and is_image_invoice(app_rec.invoice_file):
+                    new_invoice = app_rec.invoice_file
                 flash('Invoice Added Successfully', 'success')
-        db.session.commit()
+        track_status_count(old_counter, counter_key(app_rec))
         log_action('edit', f'Edited {app_rec.store_name}/{app_rec.item_number}')
+        db.session.commit()
+        if new_invoice:
+            enqueue_job('invoice-thumbnails', {'invoice_file': new_invoice})
         flash('Appliance Updated', 'success')
         # If store or item number changed, redirect to the new edit URL
         if (app_rec.store_name != old_store) or (app_rec.item_number != old_item):
@@ -405,29 +2652,210 @@ def edit_appliance_web(store_name, item_number):
         return redirect('/list')
     return render_template('edit.html', appliance=app_rec, status_options=STATUS_OPTIONS)
 
+import base64
+import json
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+COUNT_ESTIMATE_CAP = 10000
+SORT_COLUMNS = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes', 'last_updated']
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (sort value, id) from a cursor, or None if it is missing or mangled."""
+    if not cursor:
+        return None
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if (value is not None and not isinstance(value, (str, int, float))) or not isinstance(row_id, int):
+        return None
+    return value, row_id
+
+class Page:
+    """One keyset page of appliances plus what the templates need to link around it."""
+
+    def __init__(self, items, sort, direction, per_page, count, next_cursor, prev_cursor):
+        self.items = items
+        self.sort = sort
+        self.direction = direction
+        self.per_page = per_page
+        self.count = count
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def count_label(self):
+        return f"{COUNT_ESTIMATE_CAP}+" if self.count > COUNT_ESTIMATE_CAP else str(self.count)
+
+    def url(self, **changes):
+        """The current URL with some query arguments changed (None removes one)."""
+        args = request.args.to_dict()
+        args.update(changes)
+        args = {key: value for key, value in args.items() if value is not None}
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self.url(after=self.next_cursor, before=None) if self.next_cursor else None
+
+    @property
+    def prev_url(self):
+        return self.url(before=self.prev_cursor, after=None) if self.prev_cursor else None
+
+    def sort_url(self, column):
+        direction = 'desc' if self.sort == column and self.direction == 'asc' else 'asc'
+        return self.url(sort=column, dir=direction, after=None, before=None)
+
+    def size_url(self, per_page):
+        return self.url(per_page=per_page, after=None, before=None)
+
+def null_aware_seek(column, value, last_id, ascending):
+    """Rows after (value, last_id) on a nullable column ordered with NULLs before every value."""
+    if ascending:
+        if value is None:
+            return db.or_(column.is_not(None), Appliance.id > last_id)
+        return db.and_(column.is_not(None), db.or_(
+            column > value, db.and_(column == value, Appliance.id > last_id)
+        ))
+    if value is None:
+        return db.and_(column.is_(None), Appliance.id < last_id)
+    return db.or_(column.is_(None), column < value, db.and_(column == value, Appliance.id < last_id))
+
+def paginate_appliances(query, default_sort='last_updated', default_dir='desc', args=None, sort_exprs=None):
+    """Fetch one page of an Appliance query using keyset (sort value, id) cursors.
+
+    Reads sort, dir, per_page, after and before from args (the request's query
+    string by default). Seeking past a cursor uses the WHERE clause rather than
+    OFFSET, so deep pages cost the same as the first one. sort_exprs adds extra
+    named sort keys, such as a search rank.
+    """
+    args = request.args if args is None else args
+    sort_exprs = sort_exprs or {}
+    sortable = SORT_COLUMNS + list(sort_exprs)
+    sort = args.get('sort') if args.get('sort') in sortable else default_sort
+    direction = args.get('dir') if args.get('dir') in ('asc', 'desc') else default_dir
+    try:
+        per_page = min(max(int(args.get('per_page', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+    except ValueError:
+        per_page = PAGE_SIZE_DEFAULT
+
+    count = db.session.execute(
+        db.select(db.func.count()).select_from(query.limit(COUNT_ESTIMATE_CAP + 1).subquery())
+    ).scalar()
+
+    # The raw column, not an expression over it, so the (archived, column, id)
+    # indexes hand rows over already in order with no sort step
+    if sort in sort_exprs:
+        sort_expr, nullable = sort_exprs[sort], False
+    else:
+        sort_expr = getattr(Appliance, sort)
+        nullable = Appliance.__table__.c[sort].nullable
+    before = decode_cursor(args.get('before'))
+    after = None if before else decode_cursor(args.get('after'))
+    cursor = before or after
+    # Paging backwards walks the index in the opposite order and flips the rows afterwards
+    ascending = (direction == 'asc') != (before is not None)
+    if cursor:
+        value, last_id = cursor
+        if nullable:
+            query = query.filter(null_aware_seek(sort_expr, value, last_id, ascending))
+        elif ascending:
+            query = query.filter(db.or_(sort_expr > value, db.and_(sort_expr == value, Appliance.id > last_id)))
+        else:
+            query = query.filter(db.or_(sort_expr < value, db.and_(sort_expr == value, Appliance.id < last_id)))
+    if ascending:
+        # NULLs sort first ascending and last descending, on every database
+        query = query.order_by(sort_expr.asc().nulls_first() if nullable else sort_expr.asc(), Appliance.id.asc())
+    else:
+        query = query.order_by(sort_expr.desc().nulls_last() if nullable else sort_expr.desc(), Appliance.id.desc())
+    rows = query.add_columns(sort_expr).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    def cursor_for(row):
+        app_rec, value = row
+        return encode_cursor(value, app_rec.id)
+
+    next_cursor = cursor_for(rows[-1]) if rows and (has_more or before) else None
+    prev_cursor = cursor_for(rows[0]) if rows and (has_more if before else after) else None
+    items = [app_rec for app_rec, value in rows]
+    return Page(items, sort, direction, per_page, count, next_cursor, prev_cursor)
+
+def page_headers(page):
+    return {'X-Count-Estimate': page.count_label}
+
 @app.route('/list')
+@role_required('admin')
+@cached_view()
+@read_replica
 def list_appliances_web():
-    active = Appliance.query.filter_by(archived=False).all()
-    return render_template('list.html', appliances=active)
+    page = paginate_appliances(Appliance.query.filter_by(archived=False))
+    return render_template('list.html', appliances=page.items, page=page), page_headers(page)
+
+from sqlalchemy.orm import joinedload, selectinload
+
+HISTORY_PAGE_SIZE = 50
+
+def appliance_with_history(store_name, item_number):
+    """Look up an appliance along with its status history.
+
+    The whole history, and the user behind each entry, comes back in one extra
+    query instead of one per entry. With ?history_page=N only that page of
+    history is loaded.
+    """
+    query = Appliance.query.filter_by(store_name=store_name, item_number=item_number)
+    history_page = request.args.get('history_page', type=int)
+    if not history_page:
+        app_rec = query.options(
+            selectinload(Appliance.status_history).joinedload(StatusHistory.user)
+        ).first()
+        return app_rec, (app_rec.status_history if app_rec else []), None
+    app_rec = query.first()
+    if not app_rec:
+        return None, [], None
+    history_page = max(history_page, 1)
+    entries = StatusHistory.query.options(joinedload(StatusHistory.user)).filter_by(
+        appliance_id=app_rec.id
+    ).order_by(StatusHistory.timestamp, StatusHistory.id).offset(
+        (history_page - 1) * HISTORY_PAGE_SIZE
+    ).limit(HISTORY_PAGE_SIZE + 1).all()
+    paging = {
+        'page': history_page,
+        'prev': history_page - 1 if history_page > 1 else None,
+        'next': history_page + 1 if len(entries) > HISTORY_PAGE_SIZE else None,
+    }
+    return app_rec, entries[:HISTORY_PAGE_SIZE], paging
 
 @app.route('/details/<store_name>/<item_number>')
+@role_required('admin')
+@read_replica
 def details_web(store_name, item_number):
-    app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number).first()
+    app_rec, history, history_paging = appliance_with_history(store_name, item_number)
     if not app_rec:
         return 'Appliance not found', 404
-    return render_template('details.html', appliance=app_rec)
+    return render_template('details.html', appliance=app_rec, history=history, history_paging=history_paging)
 
 from datetime import datetime
 
 @app.route('/archived')
+@role_required('admin')
+@cached_view()
+@read_replica
 def view_archived_web():
-    archived = Appliance.query.filter_by(archived=True).all()
-    return render_template('archived.html', appliances=archived)
+    page = paginate_appliances(Appliance.query.filter_by(archived=True))
+    return render_template('archived.html', appliances=page.items, page=page), page_headers(page)
 
 from datetime import datetime
 from flask import flash
 
 @app.route('/archive/<store_name>/<item_number>', methods=['POST'])
+@role_required('admin')
 def archive_web(store_name, item_number):
     app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number).first()
     if app_rec:
@@ -436,8 +2864,9 @@ def archive_web(store_name, item_number):
         else:
             app_rec.archived = True
             app_rec.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            db.session.commit()
+            track_status_count((app_rec.store_name, app_rec.status), None)
             log_action('archive', f'Archived {app_rec.store_name}/{app_rec.item_number}')
+            db.session.commit()
             flash("Appliance archived.", "success")
         return redirect('/list')
     flash("Appliance not found.", "error")
@@ -447,43 +2876,262 @@ from datetime import datetime
 from flask import flash
 
 @app.route('/unarchive/<store_name>/<item_number>', methods=['POST'])
+@role_required('admin')
 def unarchive_web(store_name, item_number):
     app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number, archived=True).first()
     if app_rec:
         app_rec.archived = False
         app_rec.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        db.session.commit()
+        track_status_count(None, (app_rec.store_name, app_rec.status))
         log_action('unarchive', f'Unarchived {app_rec.store_name}/{app_rec.item_number}')
+        db.session.commit()
         flash('Item Unarchived', 'success')
         return redirect('/archived')
     return "Appliance not found or not archived.", 404
 
+import re
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+SEARCH_COLUMNS = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status']
+FUZZY_COLUMNS = ['model', 'serial']
+
+def fuzzy_columns(columns):
+    """Columns to fuzzy-match for a search over columns: model/serial only.
+
+    Not invoice_file: its trigrams are mostly the content digest's, so nearly
+    any query would fuzzy-match some invoice.
+    """
+    if columns == SEARCH_COLUMNS:
+        return FUZZY_COLUMNS
+    return [column for column in columns if column in FUZZY_COLUMNS]
+
+def search_tokens(text):
+    """Split a search box entry into lowercase word tokens."""
+    return re.findall(r'\w+', text.lower())
+
+class LikeSearchBackend:
+    """Substring matching with ILIKE. Works on any database but cannot use an index."""
+    name = 'like'
+    ranked = False
+
+    def setup(self):
+        pass
+
+    def search(self, query, text, columns=SEARCH_COLUMNS, fuzzy=False):
+        """Filter an Appliance query down to matches for text.
+
+        Returns (query, rank) where rank is a sort expression (lower is a
+        better match) or None when the backend cannot rank results.
+        """
+        if fuzzy:
+            return query.filter(db.false()), None
+        return query.filter(db.or_(
+            *(getattr(Appliance, column).ilike(f"%{text}%") for column in columns)
+        )), None
+
+class SQLiteSearchBackend(LikeSearchBackend):
+    """SQLite FTS5 index kept in sync with the appliance table by triggers.
+
+    appliance_fts answers word-prefix queries ranked by bm25. appliance_trgm,
+    a trigram index over model, serial and invoice_file, answers substring
+    lookups on those columns and fuzzy matches on model/serial numbers.
+    """
+    name = 'sqlite-fts5'
+    ranked = True
+    TABLES = {
+        'appliance_fts': (SEARCH_COLUMNS + ['invoice_file'], "prefix='2 3'"),
+        'appliance_trgm': (['model', 'serial', 'invoice_file'], "tokenize='trigram'"),
+    }
+
+    def __init__(self):
+        self.trigram = True
+
+    def setup(self):
+        for name, (columns, options) in self.TABLES.items():
+            try:
+                self.create_index_table(name, columns, options)
+            except OperationalError as e:
+                if name != 'appliance_trgm':
+                    raise
+                # The trigram tokenizer needs SQLite 3.34+
+                app.logger.warning("Fuzzy search disabled: %s", e.orig)
+                self.trigram = False
+
+    def create_index_table(self, name, columns, options):
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f"new.{column}" for column in columns)
+        old_cols = ', '.join(f"old.{column}" for column in columns)
+        with db.engine.begin() as conn:
+            exists = conn.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {'name': name}).first()
+            conn.execute(db.text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+                f"{cols}, content='appliance', content_rowid='id', {options})"
+            ))
+            conn.execute(db.text(
+                f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON appliance BEGIN "
+                f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+            ))
+            conn.execute(db.text(
+                f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON appliance BEGIN "
+                f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+            ))
+            conn.execute(db.text(
+                f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON appliance BEGIN "
+                f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+                f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+            ))
+            if not exists:
+                # Index whatever was already in the table before the search index existed
+                conn.execute(db.text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+    def match(self, query, table, expression):
+        fts = db.table(table, db.column('rowid'), db.column('rank'))
+        if sqlite3.sqlite_version_info < (3, 35):
+            query = query.join(fts, fts.c.rowid == Appliance.id).filter(
+                db.text(f"{table} MATCH :expression").bindparams(expression=expression)
+            )
+            return query, fts.c.rank
+        # Materialize the matches first. As a plain join the planner drives it
+        # from the appliance indexes and runs the MATCH once per appliance row.
+        matches = db.select(fts.c.rowid, fts.c.rank).where(
+            db.text(f"{table} MATCH :expression").bindparams(expression=expression)
+        ).cte(f'{table}_matches').prefix_with('MATERIALIZED')
+        return query.join(matches, matches.c.rowid == Appliance.id), matches.c.rank
+
+    def search(self, query, text, columns=SEARCH_COLUMNS, fuzzy=False):
+        letters = ''.join(search_tokens(text))
+        if fuzzy:
+            if not self.trigram or len(letters) < 3 or not fuzzy_columns(columns):
+                return query.filter(db.false()), None
+            trigrams = {letters[i:i + 3] for i in range(len(letters) - 2)}
+            expression = '{%s} : (%s)' % (' '.join(fuzzy_columns(columns)), ' OR '.join(f'"{t}"' for t in sorted(trigrams)))
+            return self.match(query, 'appliance_trgm', expression)
+        if set(columns) <= set(self.TABLES['appliance_trgm'][0]) and self.trigram and len(text.strip()) >= 3:
+            # Substring lookups on model/serial/invoice names, e.g. the invoice search
+            phrase = text.strip().replace('"', '""')
+            return self.match(query, 'appliance_trgm', '{%s} : "%s"' % (' '.join(columns), phrase))
+        tokens = search_tokens(text)
+        if not tokens:
+            return super().search(query, text, columns)
+        expression = '{%s} : (%s)' % (' '.join(columns), ' '.join(f'"{t}"*' for t in tokens))
+        return self.match(query, 'appliance_fts', expression)
+
+class PostgresSearchBackend(LikeSearchBackend):
+    """PostgreSQL tsvector GIN index for prefix search, pg_trgm GIN indexes for substrings and fuzzy matches.
+
+    Both are expression indexes on the appliance table, so PostgreSQL keeps
+    them in sync with every write on its own.
+    """
+    name = 'postgresql'
+    ranked = True
+    DOCUMENT = " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+    TSVECTOR = f"to_tsvector('simple'::regconfig, {DOCUMENT})"
+
+    def __init__(self):
+        self.trigram = True
+
+    def setup(self):
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                f"CREATE INDEX IF NOT EXISTS ix_appliance_search_tsv ON appliance USING gin ({self.TSVECTOR})"
+            ))
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for column in ['model', 'serial', 'invoice_file']:
+                    conn.execute(db.text(
+                        f"CREATE INDEX IF NOT EXISTS ix_appliance_{column}_trgm "
+                        f"ON appliance USING gin ({column} gin_trgm_ops)"
+                    ))
+        except (OperationalError, ProgrammingError) as e:
+            app.logger.warning("Fuzzy search disabled, pg_trgm is not available: %s", e.orig)
+            self.trigram = False
+
+    def search(self, query, text, columns=SEARCH_COLUMNS, fuzzy=False):
+        if fuzzy:
+            if not self.trigram or not fuzzy_columns(columns):
+                return query.filter(db.false()), None
+            similarity = db.func.greatest(*(
+                db.func.similarity(getattr(Appliance, column), text) for column in fuzzy_columns(columns)
+            ))
+            return query.filter(db.or_(
+                *(getattr(Appliance, column).op('%')(text) for column in fuzzy_columns(columns))
+            )), -similarity
+        tokens = search_tokens(text)
+        if columns != SEARCH_COLUMNS or not tokens:
+            # ILIKE on the trigram-indexed columns can use those indexes
+            return super().search(query, text, columns)
+        tsquery = ' & '.join(f"{token}:*" for token in tokens)  # \w tokens need no quoting
+        query = query.filter(db.text(
+            f"{self.TSVECTOR} @@ to_tsquery('simple'::regconfig, :tsquery)"
+        ).bindparams(tsquery=tsquery))
+        rank = -db.func.ts_rank(
+            db.literal_column(self.TSVECTOR),
+            db.func.to_tsquery(db.literal_column("'simple'::regconfig"), tsquery)
+        )
+        return query, rank
+
+def get_search_backend():
+    """Pick the search backend for the configured database (SEARCH_BACKEND=like forces the fallback)."""
+    dialect = db.engine.dialect.name
+    if os.environ.get('SEARCH_BACKEND') == 'like':
+        return LikeSearchBackend()
+    if dialect == 'sqlite':
+        backend = SQLiteSearchBackend()
+    elif dialect == 'postgresql':
+        backend = PostgresSearchBackend()
+    else:
+        return LikeSearchBackend()
+    try:
+        backend.setup()
+    except (OperationalError, ProgrammingError) as e:
+        app.logger.warning("Falling back to LIKE search: %s", e.orig)
+        return LikeSearchBackend()
+    return backend
+
+search_backend = LikeSearchBackend()
+
+def search_page(query, text, columns=SEARCH_COLUMNS):
+    """One page of search results, falling back to fuzzy matching when nothing matches exactly."""
+    matches, rank = search_backend.search(query, text, columns)
+    if rank is not None and not db.session.query(matches.exists()).scalar():
+        fuzzy, fuzzy_rank = search_backend.search(query, text, columns, fuzzy=True)
+        if fuzzy_rank is not None:
+            matches, rank = fuzzy, fuzzy_rank
+    if rank is None:
+        return paginate_appliances(matches)
+    return paginate_appliances(matches, default_sort='rank', default_dir='asc', sort_exprs={'rank': rank})
+
 @app.route('/invoice-search', methods=['GET', 'POST'])
+@role_required('admin')
+@read_replica
 def invoice_search():
-    results = []
-    query = ""
-    if request.method == 'POST':
-        query = request.form['query'].strip().lower()
-        print("Query:", query)
-        print("Invoice files in DB:", [a.invoice_file for a in Appliance.query.all()])
+    page = None
+    query = request.values.get('query', '').strip().lower()
+    if 'query' in request.values:
+        with_invoice = Appliance.query.filter(Appliance.invoice_file != None)
         if query:
-            results = Appliance.query.filter(
-                Appliance.invoice_file.ilike(f"%{query}%")
-            ).all()
+            # The search indexes cover the whole '<sha256>/<name>' reference;
+            # only rows whose name holds every word count as matches
+            with_invoice = with_invoice.filter(
+                *(INVOICE_NAME.icontains(token, autoescape=True) for token in search_tokens(query))
+            )
+            page = search_page(with_invoice, query, columns=['invoice_file'])
         else:
-            results = Appliance.query.filter(Appliance.invoice_file != None).all()
-    return render_template('invoice_search.html', appliances=results, query=query)
+            page = paginate_appliances(with_invoice)
+    if page is None:
+        return render_template('invoice_search.html', appliances=[], query=query, page=None)
+    return render_template('invoice_search.html', appliances=page.items, query=query, page=page), page_headers(page)
 
 @app.route('/tech-edit/<store_name>/<item_number>', methods=['GET', 'POST'])
+@role_required('tech')
 def tech_edit_appliance(store_name, item_number):
     app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number).first()
     if not app_rec:
         return "Appliance not found", 404
 
-    # Only allow techs to access (and optionally their assigned store)
-    if session['role'] != 'tech':
-        return redirect('/')
-
     # Check if any StatusHistory exists for this appliance where status != "In"
     first_change = not StatusHistory.query.filter(
         StatusHistory.appliance_id == app_rec.id,
@@ -512,7 +3160,7 @@ def tech_edit_appliance(store_name, item_number):
         # Log the status change
         new_history = StatusHistory(
             appliance_id=app_rec.id,
-            user_id=session['user_id'],  # You should set this when logging in
+            user_id=current_user().id,
             timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             status=new_status,
             verified_model=verified_model,
@@ -520,9 +3168,11 @@ def tech_edit_appliance(store_name, item_number):
         )
         db.session.add(new_history)
 
+        old_counter = counter_key(app_rec)
         app_rec.status = new_status
         app_rec.notes = new_notes
         app_rec.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        track_status_count(old_counter, counter_key(app_rec))
 
         db.session.commit()
         flash("Status updated.", "success")
@@ -535,32 +3185,53 @@ def tech_edit_appliance(store_name, item_number):
         status_options=STATUS_OPTIONS
         )
 
+TECH_STORES_PER_PAGE = 10
+TECH_ITEMS_PER_STORE = 20
+
 @app.route('/tech-dashboard', methods=['GET', 'POST'])
+@role_required('tech')
+@cached_view()
+@read_replica
 def tech_dashboard():
-    if session.get('role') != 'tech':
-        return redirect('/')
-    # Always get all active appliances first
-    appliances = Appliance.query.filter_by(archived=False).all()
-    grouped = {}
-    # Group by store name
-    for app_rec in appliances:
-        store = app_rec.store_name
-        grouped.setdefault(store, []).append(app_rec)
-    return render_template('tech_dashboard.html', grouped=grouped)
+    active = Appliance.query.filter_by(archived=False)
+    # One store, paged through in full
+    store = request.args.get('store')
+    if store:
+        page = paginate_appliances(active.filter_by(store_name=store), default_sort='item_number', default_dir='asc')
+        return render_template(
+            'tech_dashboard.html', grouped={store: page}, store=store
+        ), page_headers(page)
+    # Otherwise a page of stores, each showing the first few of its items
+    store_query = db.select(Appliance.store_name).where(Appliance.archived == False).distinct()
+    store_after = request.args.get('store_after')
+    if store_after:
+        store_query = store_query.where(Appliance.store_name > store_after)
+    stores = db.session.execute(
+        store_query.order_by(Appliance.store_name).limit(TECH_STORES_PER_PAGE + 1)
+    ).scalars().all()
+    next_store_after = stores[TECH_STORES_PER_PAGE - 1] if len(stores) > TECH_STORES_PER_PAGE else None
+    grouped = {
+        name: paginate_appliances(
+            active.filter_by(store_name=name), default_sort='item_number', default_dir='asc',
+            args={'per_page': TECH_ITEMS_PER_STORE}
+        )
+        for name in stores[:TECH_STORES_PER_PAGE]
+    }
+    return render_template('tech_dashboard.html', grouped=grouped, store=None, next_store_after=next_store_after)
 
 @app.route('/tech-appliance-details/<store_name>/<item_number>')
+@role_required('tech')
 def tech_appliance_details(store_name, item_number):
-    if session.get('role') != 'tech':
-        return redirect('/')
-    app_rec = Appliance.query.filter_by(store_name=store_name, item_number=item_number).first()
+    app_rec, history, history_paging = appliance_with_history(store_name, item_number)
     if not app_rec:
         return "Appliance not found", 404
-    return render_template('tech_appliance_details.html', appliance=app_rec)
+    return render_template(
+        'tech_appliance_details.html', appliance=app_rec, history=history, history_paging=history_paging
+    )
 
 @app.route('/tech-lookup', methods=['POST'])
+@role_required('tech')
 def tech_lookup():
-    if session.get('role') != 'tech':
-        return redirect('/')
     store = request.form.get('store_name', '').strip()
     item = request.form.get('item_number', '').strip()
     query = Appliance.query.filter_by(archived=False)
@@ -585,38 +3256,101 @@ def tech_lookup():
     return render_template('tech_lookup_results.html', appliances=results)
 
 @app.route('/store-portal')
+@role_required('store')
+@cached_view(per_user=True)
+@read_replica
 def store_portal():
-    store = session.get('store')
-    store_items = Appliance.query.filter_by(store_name=store, archived=False).all()
-    user = User.query.filter_by(username=session['username']).first()
-    return render_template('store_portal.html', appliances=store_items, store=store, user=user)
+    user = current_user()
+    # Read before the rows, so the page's feed picks up anything written in between
+    cursor = change_cursor()
+    store_items = Appliance.query.filter_by(store_name=user.store, archived=False).all()
+    return render_template('store_portal.html', appliances=store_items, store=user.store, user=user, cursor=cursor)
+
+INVOICE_MAX_AGE = 365 * 24 * 3600
 
-@app.route('/invoices/<filename>')
+@app.route('/invoices/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Content-addressed invoices never change, so browsers may keep them for a year.
+    # send_file handles Range, If-None-Match and the sendfile/X-Sendfile fast paths.
+    match = INVOICE_REF.match(filename)
+    if not match:
+        # Older uploads are bare filenames at the top of the folder; nothing
+        # below it (objects/, tmp/, thumbs/) is served by path
+        if '/' in filename or '\\' in filename or filename.startswith('.'):
+            return 'Invoice not found', 404
+        return send_from_directory(os.path.abspath(app.config['UPLOAD_FOLDER']), filename, conditional=True, max_age=3600)
+    digest, name = match.groups()
+    path = invoice_object_path(digest)
+    if not os.path.exists(path):
+        return 'Invoice not found', 404
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        download_name=name,
+        conditional=True,
+        etag=digest,
+        max_age=INVOICE_MAX_AGE,
+    )
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/invoice-thumbs/<size>/<digest>.jpg')
+def invoice_thumbnail(size, digest):
+    if size not in INVOICE_THUMBNAIL_SIZES or not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return 'Not found', 404
+    path = invoice_thumbnail_path(digest, size)
+    if not os.path.exists(path):
+        return 'Not found', 404
+    response = send_file(
+        os.path.abspath(path), mimetype='image/jpeg', conditional=True,
+        etag=f'{digest}-{size}', max_age=INVOICE_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    return response
+
+@job_handler('invoice-thumbnails')
+def invoice_thumbnails_job(params, progress):
+    """Write the JPEG thumbnail and preview for an image invoice."""
+    if Image is None:
+        return {'summary': 'Pillow is not installed; no thumbnails made.'}
+    digest = INVOICE_REF.match(params['invoice_file']).group(1)
+    with Image.open(invoice_object_path(digest)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size, (longest, quality) in INVOICE_THUMBNAIL_SIZES.items():
+            path = invoice_thumbnail_path(digest, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            copy = image.copy()
+            copy.thumbnail((longest, longest))
+            tmp = f'{path}.tmp'
+            copy.save(tmp, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, path)
+    # Pages rendered before the thumbnails existed are cached under the
+    # current DataVersion; move it on and tell the store portals
+    appliances = db.session.execute(
+        db.select(Appliance.id, Appliance.store_name).where(Appliance.invoice_file.like(f'{digest}/%'))
+    ).all()
+    bump_data_version(db.session)
+    record_changes(db.session, [(appliance_id, store_name, 'edit') for appliance_id, store_name in appliances])
+    db.session.commit()
+    return {'summary': f"Thumbnails made for {params['invoice_file']}."}
 
 from flask import flash
 
 @app.route('/search', methods=['GET', 'POST'])
+@role_required('admin')
+@read_replica
 def search_appliances():
-    if session.get('role') != 'admin':
-        return redirect('/')
-    results = []
-    query = ""
-    if request.method == 'POST':
-        query = request.form['query'].strip().lower()
-        if query:
-            results = Appliance.query.filter(
-                (Appliance.store_name.ilike(f"%{query}%")) |
-                (Appliance.brand.ilike(f"%{query}%")) |
-                (Appliance.model.ilike(f"%{query}%")) |
-                (Appliance.serial.ilike(f"%{query}%")) |
-                (Appliance.item_number.ilike(f"%{query}%")) |
-                (Appliance.status.ilike(f"%{query}%"))
-            ).filter_by(archived=False).all()
-            if not results and query:
-                flash('Item Not Found', 'error')
-    return render_template('search.html', appliances=results, query=query)
+    page = None
+    query = request.values.get('query', '').strip().lower()
+    if query:
+        page = search_page(Appliance.query.filter_by(archived=False), query)
+        if not page.items:
+            flash('Item Not Found', 'error')
+    if page is None:
+        return render_template('search.html', appliances=[], query=query, page=None)
+    return render_template(
+        'search.html', appliances=page.items, query=query, page=page, ranked=search_backend.ranked
+    ), page_headers(page)
 
 #@app.route('/create-default-admin')
 #def create_default_admin():
@@ -634,8 +3368,45 @@ def search_appliances():
 #    db.session.commit()
 #    return "Admin user created! You can now log in as admin/main."
 
+# Replaced by a wider index on the model; dropped so writes don't keep both up
+SUPERSEDED_INDEXES = ['ix_appliance_archived_updated']
+
+def ensure_indexes():
+    """Create indexes declared on the models that an older database is missing.
+
+    db.create_all() only builds indexes together with a new table, so existing
+    SQLite and PostgreSQL databases pick them up here on startup instead.
+    """
+    for name in SUPERSEDED_INDEXES:
+        with db.engine.begin() as conn:
+            conn.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+    for table in (Appliance.__table__, StatusHistory.__table__, AuditLog.__table__):
+        for index in table.indexes:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            except IntegrityError:
+                app.logger.warning(
+                    "Could not create %s: duplicate store/item numbers exist. "
+                    "Merge or renumber them and restart to enable it.", index.name
+                )
+
 with app.app_context():
     db.create_all()
+    ensure_indexes()
+    if not db.session.get(DataVersion, 1):
+        # Every gunicorn worker runs this at import; the one that loses the race
+        # skips its row (ON CONFLICT DO NOTHING) or, elsewhere, gets the error
+        try:
+            insert_ignoring_duplicates(DataVersion, [{'id': 1, 'version': 0}])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+    search_backend = get_search_backend()
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)
+    for line in engine_settings():
+        app.logger.info("Database %s", line)
 
 if __name__ == '__main__':
     app.run(debug=True)
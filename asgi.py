@@ -0,0 +1,378 @@
+"""ASGI entry point for the web app: uvicorn asgi:application
+
+The sync mode (gunicorn app_web:app, flask run) is unchanged; this serves the
+same Flask app from an event loop so an idle or slow connection costs a
+coroutine instead of a worker thread.
+
+- Request bodies are read from the socket asynchronously and spooled to a
+  temporary file before any view runs, so a slow upload holds no thread.
+  Bodies over ASGI_MAX_BODY_BYTES are refused with a 413, from their
+  Content-Length when they declare one and otherwise once that much arrives.
+- Read-only views (the ones marked @read_replica: list, archived, search,
+  details, invoice search and the dashboards/store portal) run on the event
+  loop with their database IO going through async drivers (aiosqlite,
+  asyncpg), via an AsyncSession whose sync session stands in for db.session.
+- Everything else runs on a bounded thread pool (ASGI_THREADS) like a sync
+  worker would, and the response is pumped back chunk by chunk, so streamed
+  downloads (CSV export, invoices) keep their backpressure without pinning a
+  thread while the client reads.
+
+Queries that name the primary explicitly (data_version, the user cache) are
+mapped to the async primary engine too. Long-polling /changes requests wait on
+the loop, so an open store portal costs no thread either. Async reads skip
+app.wsgi_app, so they have its ProxyFix (TRUSTED_PROXIES) applied separately.
+"""
+import asyncio
+import contextvars
+import copy
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import app_web
+from app_web import app, db
+
+app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', '16'))
+app.config['ASGI_SPOOL_BYTES'] = int(os.environ.get('ASGI_SPOOL_BYTES', str(1024 * 1024)))
+app.config['ASGI_ASYNC_READS'] = os.environ.get('ASGI_ASYNC_READS', '1') != '0'
+app.config['ASGI_MAX_BODY_BYTES'] = int(os.environ.get('ASGI_MAX_BODY_BYTES', str(100 * 1024 * 1024)))  # 0: no limit
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+# sync engine (db.engines) -> async engine over the same database
+async_engines = {}
+async_primary = None
+executor = None
+# app.wsgi_app's ProxyFix with the app replaced by one returning the rewritten environ
+proxy_fix = None
+
+
+def async_url(url):
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == 'postgresql':
+        # asyncpg doesn't take libpq's sslmode; it has its own ssl argument
+        sslmode = url.query.get('sslmode')
+        if sslmode:
+            url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': sslmode})
+    return url
+
+
+def set_async_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    app_web.apply_sqlite_pragmas(cursor)
+    cursor.close()
+
+
+def start():
+    """Create the async engines and the thread pool; called once at startup."""
+    global async_primary, executor, proxy_fix
+    executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='asgi')
+    if isinstance(app.wsgi_app, ProxyFix):
+        proxy_fix = copy.copy(app.wsgi_app)
+        proxy_fix.app = lambda environ, start_response: environ
+    if not app.config['ASGI_ASYNC_READS']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            url = engine.url
+            if url.get_backend_name() == 'sqlite':
+                options = {'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+            else:
+                options = {key: value for key, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+                           if key.startswith('pool_') or key == 'max_overflow'}
+            async_engine = create_async_engine(async_url(url), **options)
+            if url.get_backend_name() == 'sqlite':
+                event.listen(async_engine.sync_engine, 'connect', set_async_sqlite_pragmas)
+            async_engines[engine] = async_engine
+        async_primary = async_engines[db.engine]
+
+
+async def stop():
+    for async_engine in async_engines.values():
+        await async_engine.dispose()
+    async_engines.clear()
+    if executor:
+        executor.shutdown(wait=False)
+
+
+class AsyncRoutingSession(app_web.RoutingSession):
+    """The sync half of an AsyncSession: routes like db.session, onto the async engines."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+        async_engine = async_engines.get(engine)
+        return async_engine.sync_engine if async_engine else engine
+
+
+class AsyncChangeNotifier(app_web.ChangeNotifier):
+    """Lets a long-polling /changes request on the event loop wait without blocking it."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiters = set()
+
+    def notify(self):
+        super().notify()
+        for loop, waiter in list(self.waiters):
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def wait(self, seen, timeout):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # A thread pool request or job worker
+            return super().wait(seen, timeout)
+        # Inside run_sync's greenlet: suspend it and let the loop run
+        waiter = (loop, asyncio.Event())
+        self.waiters.add(waiter)
+        try:
+            if self.generation == seen:
+                await_only(wait_for_event(waiter[1], timeout))
+        finally:
+            self.waiters.discard(waiter)
+
+
+async def wait_for_event(waiter, timeout):
+    try:
+        await asyncio.wait_for(waiter.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+app_web.change_notifier = AsyncChangeNotifier()
+
+
+def is_async_read(environ):
+    """True for requests to a read-only (@read_replica) view."""
+    if not async_engines:
+        return False
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except Exception:
+        return False
+    view = app.view_functions.get(endpoint)
+    return bool(view and getattr(view, 'read_only', False))
+
+
+def build_environ(scope, body, length):
+    """A WSGI environ for an ASGI http scope, with the spooled body as wsgi.input."""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            continue
+        key = 'CONTENT_TYPE' if name == 'content-type' else 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def declared_length(scope):
+    """The request's Content-Length, or None if it has none (or not a usable one)."""
+    for name, value in scope['headers']:
+        if name.lower() == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def read_body(receive, limit=0):
+    """Spool the request body to a temporary file as it arrives; None if the client went away.
+
+    Raises BodyTooLarge once more than limit bytes have arrived (0 for no limit).
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=app.config['ASGI_SPOOL_BYTES'])
+    length = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None, 0
+        chunk = message.get('body', b'')
+        if limit and length + len(chunk) > limit:
+            body.close()
+            raise BodyTooLarge
+        if chunk:
+            # Past ASGI_SPOOL_BYTES this is a disk write; keep it off the loop
+            if length + len(chunk) > app.config['ASGI_SPOOL_BYTES']:
+                await asyncio.get_running_loop().run_in_executor(None, body.write, chunk)
+            else:
+                body.write(chunk)
+            length += len(chunk)
+        if not message.get('more_body'):
+            body.seek(0)
+            return body, length
+
+
+def call_wsgi(environ):
+    """Run the Flask app; returns (status, headers, iterator over the body)."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    app_iter = app(environ, start_response)
+    return started[0], started[1], app_iter
+
+
+def dispatch_read(sync_session, environ):
+    """Run a read-only view with db.session bound to the async session (inside run_sync)."""
+    ctx = app.request_context(environ)
+    error = None
+    try:
+        try:
+            ctx.push()
+            db.session.registry.set(sync_session)
+            response = app.full_dispatch_request()
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+        except:  # noqa: E722 - same as Flask.wsgi_app
+            error = sys.exc_info()[1]
+            raise
+        started = []
+        app_iter = response(environ, lambda status, headers, exc_info=None: started.extend([status, headers]))
+        try:
+            return started[0], started[1], b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+    finally:
+        if app.should_ignore_error(error):
+            error = None
+        ctx.pop(error)
+
+
+async def send_start(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+
+
+async def send_too_large(send):
+    await send_start(send, '413 Request Entity Too Large', [
+        ('Content-Type', 'text/plain; charset=utf-8'), ('Connection', 'close'),
+    ])
+    await send({'type': 'http.response.body', 'body': b'Request body too large'})
+
+
+async def serve_async_read(environ, send):
+    if proxy_fix:
+        environ = proxy_fix(environ, None)
+    async with AsyncSession(async_primary, sync_session_class=AsyncRoutingSession, db=db, query_cls=db.Query) as s:
+        status, headers, body = await s.run_sync(dispatch_read, environ)
+    await send_start(send, status, headers)
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def serve_threaded(environ, send):
+    loop = asyncio.get_running_loop()
+    # Flask's contexts live in contextvars; running every step in one copied
+    # context keeps a streamed response's request context alive between chunks
+    # whichever pool thread picks the step up
+    context = contextvars.copy_context()
+    status, headers, app_iter = await loop.run_in_executor(executor, context.run, call_wsgi, environ)
+    iterator = iter(app_iter)
+    try:
+        await send_start(send, status, headers)
+        while True:
+            chunk = await loop.run_in_executor(executor, context.run, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(app_iter, 'close'):
+            await loop.run_in_executor(executor, context.run, app_iter.close)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                start()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+    if executor is None:
+        # Server without lifespan support
+        start()
+    limit = app.config['ASGI_MAX_BODY_BYTES']
+    if limit and (declared_length(scope) or 0) > limit:
+        # Refuse before reading any of it
+        await send_too_large(send)
+        return
+    try:
+        body, length = await read_body(receive, limit)
+    except BodyTooLarge:
+        await send_too_large(send)
+        return
+    if body is None:
+        return
+    try:
+        environ = build_environ(scope, body, length)
+        if is_async_read(environ):
+            await serve_async_read(environ, send)
+        else:
+            await serve_threaded(environ, send)
+    finally:
+        body.close()
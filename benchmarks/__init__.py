@@ -0,0 +1,32 @@
+"""Benchmarks and load tests for app_web.py and app.py.
+
+    python -m benchmarks generate --stores 40 --appliances 100000
+    python -m benchmarks client --out client.json
+    python -m benchmarks http --serve --gunicorn-workers 4 --concurrency 16 --seconds 30
+    python -m benchmarks http --serve --asgi --gunicorn-workers 4 --concurrency 16 --seconds 30
+    python -m benchmarks console --records 200000
+    python -m benchmarks indexes --sizes 10000,100000,1000000
+    python -m benchmarks export --sizes 100000,1000000
+    python -m benchmarks capacity --workers 2 --levels 16,64,256,1024
+    python -m benchmarks check client.json --baseline old-client.json
+
+DATABASE_URL selects the database (SQLite or PostgreSQL) the same way it does
+for the web app. The client and http suites log in as the users made by
+`generate` and write to the database (edits, CSV imports), so point them at a
+generated copy rather than live data. They turn off the per-IP login limit
+(LOGIN_LIMIT_IP=0); set the same on a server started outside the suite.
+
+`indexes` times the store/item lookups against scratch tables of each size
+with the Appliance indexes dropped and then created.
+`export` downloads the streamed CSV exports of scratch tables that size in a
+fresh process and reports how far its memory grew during the download.
+`capacity` starts gunicorn (sync) and uvicorn (asgi.py) with the same number
+of workers, holds more and more slow uploads open against each and reports
+whether other requests still get through and how much memory that takes.
+
+Each suite writes its results as JSON. `check`, or --baseline/--thresholds on
+any suite, compares them against an earlier run and a thresholds file and
+exits non-zero on a regression. snapshot.py, ingest.py and
+`flask --app app_web db-benchmark` keep their own format, parse and database
+throughput benchmarks.
+"""
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import results as result_files
+
+
+def import_app_web(no_cache=False):
+    # The suites log in far more often than the per-IP login limit allows
+    # (gunicorn started with --serve inherits this too)
+    os.environ.setdefault('LOGIN_LIMIT_IP', '0')
+    if no_cache:
+        os.environ['CACHE_ENABLED'] = '0'
+    sys.path.insert(0, result_files.ROOT)
+    import app_web
+    return app_web
+
+
+def database_name(app_web):
+    with app_web.app.app_context():
+        return app_web.db.engine.dialect.name
+
+
+def add_check_options(parser):
+    parser.add_argument('--baseline', help='Earlier result file of the same suite to compare against.')
+    parser.add_argument('--thresholds', default=result_files.DEFAULT_THRESHOLDS,
+                        help='JSON limits per suite and benchmark (default: benchmarks/thresholds.json).')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline, as a fraction (default 0.25).')
+
+
+def check(run, args):
+    baseline = result_files.load(args.baseline) if args.baseline else None
+    thresholds = result_files.load(args.thresholds) if args.thresholds and os.path.exists(args.thresholds) else None
+    failures = result_files.check(run, baseline, thresholds, args.max_regression)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures and (baseline or thresholds):
+        print("PASS")
+    return 1 if failures else 0
+
+
+def finish(suite, results, meta, args):
+    result_files.print_table(results)
+    run = {'suite': suite, 'meta': result_files.environment(**meta), 'results': results}
+    if args.out:
+        result_files.save(args.out, suite, results, run['meta'])
+        print(f"Results written to {args.out}")
+    return check(run, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks and load tests.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Fill the database with a synthetic chain.')
+    generate.add_argument('--stores', type=int, default=40)
+    generate.add_argument('--appliances', type=int, default=100000)
+    generate.add_argument('--history', type=float, default=3.0, help='Mean status history entries per appliance.')
+    generate.add_argument('--audit', type=int, default=200000, help='Audit log entries.')
+    generate.add_argument('--archived', type=float, default=0.15, help='Share of appliances archived.')
+    generate.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for store sizes.')
+    generate.add_argument('--seed', type=int, default=1)
+
+    client = commands.add_parser('client', help='Route, lookup and search latencies through the test client.')
+    client.add_argument('--iterations', type=int, default=50)
+    client.add_argument('--no-cache', action='store_true', help='Turn the response cache off.')
+
+    load = commands.add_parser('http', help='Concurrent HTTP load against a server.')
+    load.add_argument('--url', help='Base URL of a running server.')
+    load.add_argument('--serve', action='store_true', help='Start gunicorn on app_web:app for the run.')
+    load.add_argument('--asgi', action='store_true', help='With --serve, start uvicorn on asgi:application instead.')
+    load.add_argument('--gunicorn-workers', type=int, default=4)
+    load.add_argument('--gunicorn-threads', type=int, default=1)
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--seconds', type=float, default=30.0)
+    load.add_argument('--routes', help='Comma-separated scenario names (default: all).')
+    load.add_argument('--no-cache', action='store_true', help='Turn the response cache off (with --serve).')
+
+    console = commands.add_parser('console', help='Micro-benchmarks of the console app.')
+    console.add_argument('--records', type=int, default=100000)
+
+    indexes = commands.add_parser('indexes', help='Appliance lookups before/after the indexes, in scratch SQLite files.')
+    indexes.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated appliance counts.')
+    indexes.add_argument('--lookups', type=int, default=200)
+
+    export = commands.add_parser('export', help='Memory of the streamed CSV exports at growing table sizes.')
+    export.add_argument('--sizes', default='100000,1000000', help='Comma-separated row counts.')
+
+    capacity = commands.add_parser('capacity', help='Slow connections held by gunicorn vs uvicorn at fixed workers.')
+    capacity.add_argument('--levels', default='16,64,256,1024', help='Comma-separated slow connection counts.')
+    capacity.add_argument('--modes', default='sync,asgi', help='sync (gunicorn), asgi (uvicorn) or both.')
+    capacity.add_argument('--workers', type=int, default=2, help='Worker processes for both servers.')
+    capacity.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    capacity.add_argument('--seconds', type=float, default=10.0, help='Probe time per level.')
+    capacity.add_argument('--timeout', type=float, default=5.0, help='Probe request timeout.')
+
+    for command in (client, load, console, indexes, export, capacity):
+        command.add_argument('--seed', type=int, default=1)
+        command.add_argument('--out', help='Write the results to this JSON file.')
+        add_check_options(command)
+
+    check_command = commands.add_parser('check', help='Check a result file against a baseline and thresholds.')
+    check_command.add_argument('results')
+    add_check_options(check_command)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        from benchmarks.generate import generate as generate_chain
+        written = generate_chain(
+            import_app_web(), stores=args.stores, appliances=args.appliances, history=args.history,
+            audit=args.audit, archived=args.archived, skew=args.skew, seed=args.seed,
+        )
+        print(json.dumps(written))
+        return 0
+
+    if args.command == 'client':
+        from benchmarks import client as client_suite
+        app_web = import_app_web(args.no_cache)
+        results, meta = client_suite.run(app_web, args.iterations, args.seed)
+        meta.update(database=database_name(app_web), cache=app_web.app.config['CACHE_ENABLED'])
+        return finish('client', results, meta, args)
+
+    if args.command == 'http':
+        from benchmarks import load as load_suite
+        from benchmarks.routes import SCENARIOS, Samples
+        if not args.url and not args.serve:
+            parser.error('http needs --url or --serve')
+        app_web = import_app_web()
+        samples = Samples(app_web, seed=args.seed)
+        names = args.routes.split(',') if args.routes else None
+        unknown = [name for name in names or [] if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown routes: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+        process = None
+        url = args.url
+        if args.serve:
+            env = {'CACHE_ENABLED': '0'} if args.no_cache else {}
+            process, url = load_suite.serve(args.gunicorn_workers, args.gunicorn_threads, env=env, asgi=args.asgi)
+        try:
+            results = load_suite.run(url, samples, args.concurrency, args.seconds, names)
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+        meta = {'database': database_name(app_web), 'url': url, 'concurrency': args.concurrency,
+                'seconds': args.seconds}
+        if args.serve:
+            meta.update(server='uvicorn' if args.asgi else 'gunicorn', workers=args.gunicorn_workers,
+                        gunicorn_threads=args.gunicorn_threads, cache=not args.no_cache)
+        return finish('http', results, meta, args)
+
+    if args.command == 'console':
+        from benchmarks import console as console_suite
+        results, meta = console_suite.run(args.records, seed=args.seed)
+        return finish('console', results, meta, args)
+
+    if args.command == 'indexes':
+        from benchmarks import indexes as indexes_suite
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results, meta = indexes_suite.run(import_app_web(), sizes, lookups=args.lookups, seed=args.seed)
+        return finish('indexes', results, meta, args)
+
+    if args.command == 'export':
+        from benchmarks import export as export_suite
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results, meta = export_suite.run(import_app_web(), sizes, seed=args.seed)
+        return finish('export', results, meta, args)
+
+    if args.command == 'capacity':
+        from benchmarks import capacity as capacity_suite
+        modes = args.modes.split(',')
+        if set(modes) - {'sync', 'asgi'}:
+            parser.error('--modes takes sync, asgi or sync,asgi')
+        app_web = import_app_web()
+        levels = [int(level) for level in args.levels.split(',')]
+        results = capacity_suite.run(levels, modes, args.workers, args.threads, args.seconds, args.timeout)
+        capacity_suite.print_memory(results)
+        meta = {'database': database_name(app_web), 'levels': levels, 'workers': args.workers,
+                'gunicorn_threads': args.threads, 'seconds': args.seconds}
+        return finish('capacity', results, meta, args)
+
+    run = result_files.load(args.results)
+    result_files.print_table(run['results'])
+    return check(run, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
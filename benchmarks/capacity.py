@@ -0,0 +1,157 @@
+"""Concurrent-connection capacity of the sync (gunicorn) and ASGI (uvicorn) modes.
+
+Each mode is started with the same number of worker processes. At each level
+the suite holds that many slow clients open, each trickling a login POST body
+one byte at a time the way a phone on a bad connection uploads, and meanwhile
+probes GET / to see whether the server still answers other users. The
+server's resident memory (all of its processes) is sampled at every level.
+
+A level's row counts probe requests; probes that timed out or failed are in
+`failed` (they are the measurement, not a harness error). The "<mode>
+capacity" row is the highest level the probes all got through at, with the
+memory at that level and connections held per MB.
+"""
+import os
+import socket
+import threading
+import time
+
+from benchmarks import load, routes
+from benchmarks.results import summarize
+
+SLOW_BODY_BYTES = 4096
+
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name can hold spaces; ppid is the second field after it
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children in MB (Linux only)."""
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+class SlowClients:
+    """Connections that send a POST's headers and then a byte of body every interval."""
+
+    def __init__(self, port, count, interval=1.0):
+        self.port = port
+        self.interval = interval
+        self.sockets = []
+        self.stopped = threading.Event()
+        for _ in range(count):
+            try:
+                s = socket.create_connection(('127.0.0.1', port), timeout=5)
+                s.sendall(
+                    b'POST / HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                    b'Content-Type: application/x-www-form-urlencoded\r\n'
+                    b'Content-Length: ' + str(SLOW_BODY_BYTES).encode() + b'\r\n\r\nusername='
+                )
+            except OSError:
+                continue
+            self.sockets.append(s)
+        self.thread = threading.Thread(target=self.trickle, daemon=True)
+        self.thread.start()
+
+    def trickle(self):
+        while not self.stopped.wait(self.interval):
+            for s in self.sockets:
+                if s.fileno() == -1:
+                    continue
+                try:
+                    s.send(b'a')
+                except OSError:
+                    s.close()
+
+    def held(self):
+        return sum(1 for s in self.sockets if s.fileno() != -1)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        for s in self.sockets:
+            s.close()
+
+
+def probe(base_url, seconds, timeout):
+    """GET / one request at a time for seconds; returns (timings, failures)."""
+    session = load.opener()
+    timings, failed = [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            ok = load.send(session, base_url, routes.Request('GET', '/', None), timeout=timeout) == 200
+        except OSError:
+            ok = False
+        timings.append(time.perf_counter() - start)
+        failed += not ok
+    return timings, failed
+
+
+def run(levels=(16, 64, 256, 1024), modes=('sync', 'asgi'), workers=2, threads=4,
+        seconds=10.0, timeout=5.0, interval=1.0, env=None):
+    results = {}
+    for mode in modes:
+        process, url = load.serve(workers, threads, env=env, asgi=mode == 'asgi')
+        port = int(url.rsplit(':', 1)[1])
+        capacity = None
+        try:
+            probe(url, 1.0, timeout)  # workers import the app lazily
+            baseline_mb = rss_mb(process.pid)
+            for level in levels:
+                clients = SlowClients(port, level, interval)
+                try:
+                    time.sleep(min(2.0, seconds))
+                    timings, failed = probe(url, seconds, timeout)
+                    row = summarize(timings, seconds)
+                    row.update(failed=failed, held=clients.held(), rss_mb=rss_mb(process.pid))
+                finally:
+                    clients.close()
+                results[f'{mode} {level} slow'] = row
+                if not failed and row['count']:
+                    capacity = (level, row)
+        finally:
+            process.terminate()
+            process.wait()
+        row = {'count': 0, 'errors': 0, 'rss_mb': baseline_mb, 'idle_rss_mb': baseline_mb}
+        if capacity:
+            level, best = capacity
+            row.update(count=level, rss_mb=best['rss_mb'],
+                       connections_per_mb=round(level / best['rss_mb'], 2) if best['rss_mb'] else None)
+        results[f'{mode} capacity'] = row
+    return results
+
+
+def print_memory(results):
+    print(f"{'benchmark':<28}{'held':>8}{'failed':>8}{'rss MB':>10}{'conn/MB':>9}")
+    for name, row in results.items():
+        held = row.get('held', row['count'] if name.endswith('capacity') else '')
+        print(f"{name:<28}{held:>8}{row.get('failed', ''):>8}{row['rss_mb']:>10}{row.get('connections_per_mb', ''):>9}")
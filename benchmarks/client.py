@@ -0,0 +1,95 @@
+"""Route latencies through Flask's test client, plus direct lookup and search timings.
+
+No server or network is involved, so this measures the view code, the ORM
+and the database. The lookup:* and search:* rows time appliance_exists()
+(the unique store/item index) and the search backend on their own.
+"""
+import io
+import time
+
+from benchmarks import routes
+from benchmarks.results import summarize
+
+
+def send(client, request):
+    """Send a Request through a test client and read the whole body; returns the status code."""
+    if request.files:
+        data = dict(request.form or {})
+        data.update({field: (io.BytesIO(content), name) for field, (content, name) in request.files.items()})
+        response = client.open(request.path, method=request.method, data=data, content_type='multipart/form-data')
+    else:
+        response = client.open(request.path, method=request.method, data=request.form)
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def login(app, role, samples):
+    client = app.test_client()
+    username, password = routes.credentials(role, samples)
+    response = client.post('/', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise ValueError(f"Could not log in as {username}; run `python -m benchmarks generate` first.")
+    return client
+
+
+def run_routes(app_web, samples, iterations=50, names=None):
+    app = app_web.app
+    clients = {role: login(app, role, samples) for role in ('admin', 'tech', 'store')}
+    results = {}
+    for name in names or routes.SCENARIOS:
+        role, _, share = routes.SCENARIOS[name]
+        count = max(1, iterations * share // 10)
+        timings = []
+        errors = 0
+        send(clients[role] if role else app.test_client(), routes.build(name, samples))  # warm up
+        for _ in range(count):
+            request = routes.build(name, samples)
+            client = clients[role] if role else app.test_client()
+            start = time.perf_counter()
+            status = send(client, request)
+            timings.append(time.perf_counter() - start)
+            if status not in request.expect:
+                errors += 1
+        results[name] = summarize(timings, errors=errors)
+    return results
+
+
+def run_queries(app_web, samples, iterations=200):
+    """Time the unique-key lookup and each kind of search query directly."""
+    app, db = app_web.app, app_web.db
+    results = {}
+    with app.test_request_context('/'):
+        timings = []
+        for _ in range(iterations):
+            appliance = samples.appliance()
+            start = time.perf_counter()
+            app_web.appliance_exists(appliance['store_name'], appliance['item_number'])
+            timings.append(time.perf_counter() - start)
+        results['lookup:appliance_exists'] = summarize(timings)
+
+        kinds = {
+            'search:brand': lambda appliance: appliance['brand'].lower(),
+            'search:model-prefix': lambda appliance: appliance['model'][:4],
+            'search:serial-prefix': lambda appliance: appliance['serial'][:8],
+            'search:serial-typo': lambda appliance: appliance['serial'][:5] + 'x' + appliance['serial'][6:],
+        }
+        for name, text_for in kinds.items():
+            timings = []
+            for _ in range(max(1, iterations // 4)):
+                text = text_for(samples.appliance())
+                start = time.perf_counter()
+                page = app_web.search_page(app_web.Appliance.query.filter_by(archived=False), text)
+                len(page.items)
+                timings.append(time.perf_counter() - start)
+            results[name] = summarize(timings)
+        db.session.remove()
+    return results
+
+
+def run(app_web, iterations=50, seed=1):
+    samples = routes.Samples(app_web, seed=seed)
+    results = run_routes(app_web, samples, iterations)
+    results.update(run_queries(app_web, samples, iterations * 4))
+    meta = {'backend': app_web.search_backend.name, 'iterations': iterations}
+    return results, meta
@@ -0,0 +1,107 @@
+"""Micro-benchmarks of the console app's inventory, import and save paths.
+
+Runs in a scratch directory so the console app's own inventory, journal and
+backup files are never touched. Menu output is discarded.
+"""
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generate import BRANDS, STATUS_WEIGHTS, store_sizes
+from benchmarks.results import Timer, summarize, throughput
+
+
+def synthetic_records(count, stores=40, seed=1):
+    rng = random.Random(seed)
+    statuses = [status for status in STATUS_WEIGHTS if status != 'Delivered']
+    records = []
+    for n, size in enumerate(store_sizes(stores, count, 1.1)):
+        for i in range(size):
+            records.append({
+                'store_name': f'Store {n + 1:03d}',
+                'item_number': f'{i + 1:07d}',
+                'brand': rng.choice(BRANDS),
+                'model': f'M{rng.randrange(100000):05d}',
+                'serial': f'SN{rng.randrange(10 ** 10):010d}',
+                'status': rng.choice(statuses),
+                'notes': '',
+                'archived': rng.random() < 0.15,
+                'history': [(f'2025-01-0{d + 1} 09:00:00', statuses[d]) for d in range(rng.randrange(4))],
+            })
+    return records
+
+
+def timed_calls(func, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def run(records=100000, lookups=20000, seed=1):
+    import app
+
+    rng = random.Random(seed)
+    data = synthetic_records(records, seed=seed)
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(tmp)
+        try:
+            inventory = app.inventory
+            inventory.journal = None
+            inventory.clear()
+            with Timer() as t:
+                for record in data:
+                    inventory.add(record, allow_duplicate=True)
+            results['inventory.add'] = throughput(records, t.seconds)
+
+            keys = [(record['store_name'], record['item_number']) for record in rng.sample(data, min(lookups, records))]
+            results['inventory.find'] = timed_calls(inventory.find, keys)
+            stores = [(record['store_name'].lower(),) for record in rng.sample(data, 200)]
+            results['inventory.filter store'] = timed_calls(
+                lambda store: inventory.filter(store=store, archived=False), stores
+            )
+            statuses = [(rng.choice(list(STATUS_WEIGHTS)[:-1]),) for _ in range(50)]
+            results['inventory.filter status'] = timed_calls(
+                lambda status: inventory.filter(status=status, archived=False), statuses
+            )
+            results['inventory.status_counts'] = timed_calls(inventory.status_counts, [()] * 1000)
+
+            with Timer() as t:
+                app.export_to_csv('export.csv')
+            results['export_to_csv'] = throughput(records, t.seconds)
+            inventory.clear()
+            with Timer() as t:
+                app.import_from_csv('export.csv')
+            results['import_from_csv'] = throughput(records, t.seconds)
+            inventory.clear()
+            inventory.extend(data)
+
+            with Timer() as t:
+                app.write_snapshot()
+            results['write_snapshot (json)'] = throughput(records, t.seconds)
+            app.write_json_lines('backup.jsonl')
+            app.write_binary_backup('backup.snap', 'zlib')
+            for name, filename, load in (
+                ('load_records (json)', app.SNAPSHOT_FILE, app.load_records),
+                ('load_records (jsonl)', 'backup.jsonl', app.load_records),
+                ('load_binary_backup', 'backup.snap', app.load_binary_backup),
+            ):
+                target = app.Inventory()
+                with Timer() as t:
+                    load(filename, target, strict=False)
+                results[name] = throughput(len(target), t.seconds)
+            with Timer() as t:
+                app.write_binary_backup('backup.snap', 'zlib')
+            results['write_binary_backup'] = throughput(records, t.seconds)
+        finally:
+            app.journal.close()
+            inventory.clear()
+            os.chdir(cwd)
+    return results, {'records': records}
@@ -0,0 +1,113 @@
+"""Memory of the streamed CSV exports at growing table sizes.
+
+Each size gets a scratch SQLite database filled with that many appliances
+and audit log entries. A fresh child process then downloads /export-csv and
+/export-audit-csv (plain and gzipped) through the test client, sampling its
+own resident memory after every chunk. rss_growth_mb is the peak over what
+the process held before the download started, so a flat number across sizes
+means the export doesn't grow with the table.
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+
+from benchmarks.capacity import rss_mb
+from benchmarks.generate import PASSWORD
+from benchmarks.indexes import fill
+from benchmarks.results import ROOT
+
+EXPORTS = {
+    '/export-csv': '/export-csv?include_archived=1',
+    '/export-csv gzip': '/export-csv?include_archived=1&gzip=1',
+    '/export-audit-csv': '/export-audit-csv',
+}
+
+
+def fill_audit(engine, table, size, batch=20000):
+    with engine.begin() as conn:
+        for start in range(0, size, batch):
+            conn.execute(insert(table), [
+                {'timestamp': '2025-01-01 09:00:00', 'action': 'edit', 'details': f'Edited Bench Store 001/{n:07d}'}
+                for n in range(start, min(start + batch, size))
+            ])
+
+
+def measure(database_url):
+    """Child process: download each export once and report rows, time and memory."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('LOGIN_LIMIT_IP', '0')
+    os.environ['JOB_WORKERS'] = '0'
+    sys.path.insert(0, ROOT)
+    import app_web
+    from werkzeug.security import generate_password_hash
+
+    app = app_web.app
+    with app.app_context():
+        app_web.db.session.add(app_web.User(
+            username='bench-admin', role='admin', active=True,
+            password_hash=generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD']),
+        ))
+        app_web.db.session.commit()
+    client = app.test_client()
+    if client.post('/', data={'username': 'bench-admin', 'password': PASSWORD}).status_code != 302:
+        raise SystemExit('could not log in')
+    # Load every code path once so only the download itself is measured
+    for path in EXPORTS.values():
+        client.get(path + ('&' if '?' in path else '?') + 'date_from=2999-01-01').get_data()
+    results = {}
+    for name, path in EXPORTS.items():
+        start_mb = peak_mb = rss_mb(os.getpid())
+        started = time.perf_counter()
+        response = client.get(path)
+        size = 0
+        newlines = 0
+        for chunk in response.response:
+            size += len(chunk)
+            newlines += chunk.count(b'\n')
+            peak_mb = max(peak_mb, rss_mb(os.getpid()))
+        response.close()
+        seconds = time.perf_counter() - started
+        results[name] = {
+            'count': newlines - 1 if 'gzip' not in name else None, 'bytes': size,
+            'seconds': round(seconds, 3), 'rss_start_mb': start_mb, 'rss_peak_mb': peak_mb,
+            'rss_growth_mb': round(peak_mb - start_mb, 1), 'status': response.status_code,
+        }
+    print(json.dumps(results))
+
+
+def run(app_web, sizes=(100000, 1000000), seed=1, progress=print):
+    appliance_table = app_web.Appliance.__table__
+    audit_table = app_web.AuditLog.__table__
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'export.db')}"
+            engine = create_engine(url)
+            app_web.db.metadata.create_all(engine)
+            fill(engine, appliance_table, size, 40, random.Random(seed))
+            fill_audit(engine, audit_table, size)
+            engine.dispose()
+            child = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.export', url], cwd=tmp, capture_output=True, text=True,
+                env=dict(os.environ, PYTHONPATH=ROOT),
+            )
+            if child.returncode:
+                raise RuntimeError(f"export child failed:\n{child.stderr}")
+            measured = json.loads(child.stdout.strip().splitlines()[-1])
+        for name, row in measured.items():
+            # Plain exports must contain every row; the gzipped one is checked by size only
+            wrong = row['status'] != 200 or (row['count'] is not None and row['count'] != size)
+            row.update(count=size, errors=int(wrong), ops_per_s=round(size / row['seconds'], 1))
+            results[f'{size} {name}'] = row
+        progress(f"{size} rows: " + ', '.join(f"{name} +{row['rss_growth_mb']} MB" for name, row in measured.items()))
+    return results, {'sizes': list(sizes), 'database': 'sqlite (scratch)'}
+
+
+if __name__ == '__main__':
+    measure(sys.argv[1])
@@ -0,0 +1,143 @@
+"""Synthetic appliance chains written straight into the web app's database.
+
+Store sizes follow a Zipf-like skew, statuses are weighted towards the early
+and delivered states the way a real floor looks, status history lengths have
+a long Pareto tail, and the audit log is filled to a separate size. Users
+bench-admin, bench-tech and bench-store-NNN (one per store) are created with
+the password PASSWORD.
+"""
+import random
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench'
+STORE_NAME = 'Bench Store {:03d}'
+BRANDS = ['Whirlpool', 'GE', 'Samsung', 'LG', 'Frigidaire', 'Maytag', 'Bosch', 'KitchenAid', 'Electrolux', 'Amana']
+STATUS_WEIGHTS = {'In': 30, 'Checked': 22, 'Parts Ordered': 14, 'Repaired': 10, 'Loaded': 6, 'Delivered': 18}
+AUDIT_ACTIONS = {'edit': 60, 'add': 20, 'import': 10, 'archive': 8, 'unarchive': 2}
+NOTES = ['', '', '', 'customer called', 'door dented', 'waiting on control board', 'left at dock, fragile']
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def store_sizes(stores, appliances, skew):
+    """Split appliances across stores with weights 1 / rank ** skew."""
+    weights = [1 / (rank + 1) ** skew for rank in range(stores)]
+    total = sum(weights)
+    sizes = [int(appliances * weight / total) for weight in weights]
+    sizes[0] += appliances - sum(sizes)
+    return sizes
+
+
+def history_length(rng, mean):
+    """Mostly short histories with a long tail (Pareto, alpha 1.5, mean 3 before scaling)."""
+    return min(round(rng.paretovariate(1.5) * mean / 3), 1000)
+
+
+def timestamp(rng, now, days=365):
+    return (now - timedelta(seconds=rng.randrange(days * 86400))).strftime(TIME_FORMAT)
+
+
+def insert_batches(db, model, rows, batch):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            db.session.execute(db.insert(model), chunk)
+            db.session.commit()
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(model), chunk)
+        db.session.commit()
+
+
+def generate(app_web, stores=40, appliances=100000, history=3.0, audit=200000, archived=0.15,
+             skew=1.1, seed=1, batch=5000, progress=print):
+    """Fill the database behind app_web with a synthetic chain; returns what was written."""
+    from werkzeug.security import generate_password_hash
+
+    db, app = app_web.db, app_web.app
+    Appliance, StatusHistory, AuditLog, User = app_web.Appliance, app_web.StatusHistory, app_web.AuditLog, app_web.User
+    rng = random.Random(seed)
+    now = datetime.now()
+    names = [STORE_NAME.format(n + 1) for n in range(stores)]
+    statuses, status_weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+
+    with app.app_context():
+        if db.session.execute(db.select(Appliance.id).where(Appliance.store_name.in_(names)).limit(1)).first():
+            raise ValueError("This database already has generated stores; generate into a fresh one.")
+
+        password_hash = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+        users = [('bench-admin', 'admin', None), ('bench-tech', 'tech', None)]
+        users += [(f'bench-store-{n + 1:03d}', 'store', name) for n, name in enumerate(names)]
+        existing = {name for (name,) in db.session.execute(db.select(User.username))}
+        db.session.add_all(
+            User(username=username, password_hash=password_hash, role=role, store=store, active=True)
+            for username, role, store in users if username not in existing
+        )
+        db.session.commit()
+
+        def appliance_rows():
+            for name, size in zip(names, store_sizes(stores, appliances, skew)):
+                for i in range(size):
+                    yield {
+                        'store_name': name,
+                        'item_number': f'{i + 1:07d}',
+                        'brand': rng.choice(BRANDS),
+                        'model': f'{rng.choice("WGSLFMBKEA")}{rng.randrange(100000):05d}',
+                        'serial': f'SN{rng.randrange(10 ** 10):010d}',
+                        'status': rng.choices(statuses, status_weights)[0],
+                        'notes': rng.choice(NOTES),
+                        'archived': rng.random() < archived,
+                        'last_updated': timestamp(rng, now),
+                    }
+
+        started = datetime.now()
+        insert_batches(db, Appliance, appliance_rows(), batch)
+        progress(f"{appliances} appliances in {stores} stores ({(datetime.now() - started).total_seconds():.1f}s)")
+
+        ids = db.session.execute(
+            db.select(Appliance.id, Appliance.status, Appliance.last_updated)
+            .where(Appliance.store_name.in_(names)).order_by(Appliance.id)
+        ).all()
+        user_ids = [user_id for (user_id,) in db.session.execute(
+            db.select(User.id).where(User.username.in_(['bench-admin', 'bench-tech']))
+        )]
+        written = {'history': 0}
+
+        def history_rows():
+            for appliance_id, status, last_updated in ids:
+                count = history_length(rng, history)
+                when = datetime.strptime(last_updated, TIME_FORMAT)
+                step = statuses.index(status)
+                for _ in range(count):
+                    written['history'] += 1
+                    yield {
+                        'appliance_id': appliance_id,
+                        'user_id': rng.choice(user_ids),
+                        'timestamp': when.strftime(TIME_FORMAT),
+                        'status': statuses[step],
+                    }
+                    when -= timedelta(minutes=rng.randrange(30, 4 * 24 * 60))
+                    step = max(step - 1, 0) if rng.random() < 0.8 else rng.randrange(len(statuses))
+
+        started = datetime.now()
+        insert_batches(db, StatusHistory, history_rows(), batch)
+        progress(f"{written['history']} status history entries ({(datetime.now() - started).total_seconds():.1f}s)")
+
+        actions, action_weights = list(AUDIT_ACTIONS), list(AUDIT_ACTIONS.values())
+        audit_rows = (
+            {
+                'timestamp': timestamp(rng, now),
+                'action': rng.choices(actions, action_weights)[0],
+                'details': f'{rng.choice(names)}/{rng.randrange(1, 10 ** 5):07d}',
+            }
+            for _ in range(audit)
+        )
+        started = datetime.now()
+        insert_batches(db, AuditLog, audit_rows, batch)
+        progress(f"{audit} audit log entries ({(datetime.now() - started).total_seconds():.1f}s)")
+
+        if app.config['STATUS_COUNTERS']:
+            app_web.rebuild_status_counts.callback()
+
+    return {'stores': stores, 'appliances': appliances, 'history': written['history'], 'audit': audit,
+            'users': len(users)}
@@ -0,0 +1,96 @@
+"""Appliance lookups with and without the model's indexes, at several table sizes.
+
+Each size is built in a scratch SQLite file from the Appliance table
+definition, then the lookups the routes make are timed twice: with every
+index on the table dropped (how the table was before the indexes were
+declared) and again with them created. The live database is never touched.
+"""
+import os
+import random
+import tempfile
+
+from sqlalchemy import create_engine, exists, func, insert, select
+
+from benchmarks.console import timed_calls
+from benchmarks.generate import BRANDS, STATUS_WEIGHTS, STORE_NAME, store_sizes
+
+
+def appliance_rows(size, stores, rng):
+    statuses = list(STATUS_WEIGHTS)
+    for n, count in enumerate(store_sizes(stores, size, 1.1)):
+        for i in range(count):
+            yield {
+                'store_name': STORE_NAME.format(n + 1),
+                'item_number': f'{i + 1:07d}',
+                'brand': rng.choice(BRANDS),
+                'model': f'M{rng.randrange(100000):05d}',
+                'serial': f'SN{rng.randrange(10 ** 10):010d}',
+                'status': rng.choice(statuses),
+                'notes': '',
+                'archived': rng.random() < 0.15,
+                'last_updated': '2025-01-01 09:00:00',
+            }
+
+
+def fill(engine, table, size, stores, rng, batch=20000):
+    rows = appliance_rows(size, stores, rng)
+    with engine.begin() as conn:
+        while True:
+            chunk = [row for _, row in zip(range(batch), rows)]
+            if not chunk:
+                break
+            conn.execute(insert(table), chunk)
+
+
+def time_lookups(engine, table, keys, stores):
+    c = table.c
+    results = {}
+    with engine.connect() as conn:
+        def exists_ci(store, item):
+            # appliance_exists(): the case-insensitive duplicate check
+            conn.execute(select(exists().where(func.lower(c.store_name) == store.lower(), c.item_number == item))).scalar()
+
+        def store_item(store, item):
+            # edit/details/archive/tech routes
+            conn.execute(select(table).where(c.store_name == store, c.item_number == item)).first()
+
+        def store_portal(store):
+            conn.execute(select(table).where(c.store_name == store, c.archived == False)).all()
+
+        results['exists'] = timed_calls(exists_ci, keys)
+        results['store/item'] = timed_calls(store_item, keys)
+        results['store portal'] = timed_calls(store_portal, [(store,) for store in stores])
+    return results
+
+
+def run(app_web, sizes=(10000, 100000, 1000000), stores=40, lookups=200, seed=1, progress=print):
+    table = app_web.Appliance.__table__
+    results = {}
+    for size in sizes:
+        rng = random.Random(seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'indexes.db')}")
+            table.create(engine)
+            for index in table.indexes:
+                index.drop(engine)
+            fill(engine, table, size, stores, rng)
+            sizes_by_store = store_sizes(stores, size, 1.1)
+            keys = []
+            for _ in range(lookups):
+                n = rng.randrange(stores)
+                keys.append((STORE_NAME.format(n + 1), f'{rng.randrange(1, sizes_by_store[n] + 1):07d}'))
+            portal_stores = [STORE_NAME.format(rng.randrange(stores) + 1) for _ in range(max(lookups // 20, 5))]
+            # The full scans are slow at 1M rows; fewer samples are plenty
+            scan_keys = keys[:max(lookups // 10, 10)] if size >= 1000000 else keys
+            before = time_lookups(engine, table, scan_keys, portal_stores)
+            for index in table.indexes:
+                index.create(engine)
+            with engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+            after = time_lookups(engine, table, keys, portal_stores)
+            engine.dispose()
+        for name in before:
+            results[f'{size} {name} before'] = before[name]
+            results[f'{size} {name} after'] = after[name]
+        progress(f"{size} rows: exists p50 {before['exists'].get('p50_ms')} ms -> {after['exists'].get('p50_ms')} ms")
+    return results, {'sizes': list(sizes), 'stores': stores, 'lookups': lookups, 'database': 'sqlite (scratch)'}
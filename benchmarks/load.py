@@ -0,0 +1,149 @@
+"""Concurrent HTTP load against a running server, optionally a gunicorn or uvicorn started here.
+
+Worker threads each hold a logged-in session per role and send a weighted
+mix of the hot routes (routes.SCENARIOS) until time runs out. Latencies are
+measured end to end, including reading the whole response.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmarks import routes
+from benchmarks.results import ROOT, summarize
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as they are instead of following them, like the test client."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+
+def encode(request):
+    """Body and content type for a Request."""
+    if request.files:
+        boundary = uuid.uuid4().hex
+        parts = []
+        for field, value in (request.form or {}).items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"\r\n\r\n{value}\r\n'.encode())
+        for field, (content, name) in request.files.items():
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+                f'Content-Type: text/csv\r\n\r\n'.encode() + content + b'\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+    if request.form is not None:
+        return urllib.parse.urlencode(request.form).encode(), 'application/x-www-form-urlencoded'
+    return None, None
+
+
+def send(session, base_url, request, timeout=60):
+    """Send a Request and read the whole body; returns the status code."""
+    body, content_type = encode(request)
+    req = urllib.request.Request(base_url + request.path, data=body, method=request.method)
+    if content_type:
+        req.add_header('Content-Type', content_type)
+    try:
+        with session.open(req, timeout=timeout) as response:
+            while response.read(1 << 16):
+                pass
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def login(base_url, role, samples):
+    session = opener()
+    username, password = routes.credentials(role, samples)
+    status = send(session, base_url, routes.Request('POST', '/', {'username': username, 'password': password}))
+    if status != 302:
+        raise ValueError(f"Could not log in as {username} at {base_url} (HTTP {status})")
+    return session
+
+
+def run(base_url, samples, concurrency=8, seconds=30.0, names=None):
+    names = names or list(routes.SCENARIOS)
+    weights = [routes.SCENARIOS[name][1] for name in names]
+    timings = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    sessions = [
+        {role: login(base_url, role, samples) for role in ('admin', 'tech', 'store')}
+        for _ in range(concurrency)
+    ]
+    deadline = time.monotonic() + seconds
+
+    def worker(n):
+        while time.monotonic() < deadline:
+            name = samples.rng.choices(names, weights)[0]
+            request = routes.build(name, samples)
+            role = routes.SCENARIOS[name][0]
+            session = sessions[n][role] if role else opener()
+            start = time.perf_counter()
+            try:
+                status = send(session, base_url, request)
+            except OSError:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                timings[name].append(elapsed)
+                if status not in request.expect:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    results = {name: summarize(timings[name], elapsed, errors[name]) for name in names if timings[name]}
+    every = [t for name in names for t in timings[name]]
+    results['total'] = summarize(every, elapsed, sum(errors.values()))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(workers=4, threads=1, port=None, env=None, timeout=60, asgi=False):
+    """Start gunicorn on app_web:app (or uvicorn on asgi:application) from the
+    repository root; returns (process, base URL)."""
+    port = port or free_port()
+    if asgi:
+        server = 'uvicorn'
+        command = ['--workers', str(workers), '--host', '127.0.0.1', '--port', str(port),
+                   '--log-level', 'warning', 'asgi:application']
+    else:
+        server = 'gunicorn'
+        command = ['--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app_web:app']
+    process = subprocess.Popen([sys.executable, '-m', server] + command, cwd=ROOT, env=dict(os.environ, **(env or {})))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{server} did not start listening on port {port} within {timeout}s")
@@ -0,0 +1,139 @@
+"""Summaries, JSON result files and pass/fail checks shared by the suites."""
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples, seconds=None, errors=0):
+    """Latency summary in ms for a list of per-operation timings in seconds.
+
+    seconds is the wall time the samples were taken over (for ops/s); it
+    defaults to their sum, which is right for one-at-a-time runs.
+    """
+    ordered = sorted(samples)
+    if seconds is None:
+        seconds = sum(ordered)
+    summary = {'count': len(ordered), 'errors': errors}
+    if ordered:
+        summary.update({
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        })
+    if seconds:
+        summary['ops_per_s'] = round(len(ordered) / seconds, 1)
+    return summary
+
+
+def throughput(count, seconds):
+    """Summary for one timed bulk operation over count items."""
+    return {'count': count, 'errors': 0, 'seconds': round(seconds, 4), 'ops_per_s': round(count / seconds, 1) if seconds else None}
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+
+
+def environment(**extra):
+    """Where and on what the results were measured."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    meta = {
+        'commit': commit,
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+    meta.update(extra)
+    return meta
+
+
+def save(path, suite, results, meta):
+    with open(path, 'w') as f:
+        json.dump({'suite': suite, 'meta': meta, 'results': results}, f, indent=2)
+        f.write('\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_table(results):
+    print(f"{'benchmark':<28}{'count':>8}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'seconds':>9}{'ops/s':>11}")
+    for name, row in results.items():
+        p50, p95, seconds = (row.get(key, '') for key in ('p50_ms', 'p95_ms', 'seconds'))
+        ops = row.get('ops_per_s') or ''
+        print(f"{name:<28}{row['count']:>8}{row['errors']:>7}{p50:>10}{p95:>10}{seconds:>9}{ops:>11}")
+
+
+def headline(row):
+    """The latency figure regressions are judged on: p50 per operation, else total seconds."""
+    if 'p50_ms' in row:
+        return 'p50_ms', row['p50_ms']
+    if row.get('seconds') is not None:
+        return 'seconds', row['seconds']
+    return None, None
+
+
+def check(run, baseline=None, thresholds=None, max_regression=0.25):
+    """Failures for a result file against a baseline run and a thresholds file.
+
+    A benchmark fails if its headline latency is more than max_regression
+    slower than in the baseline, if it had errors, or if it breaks a limit in
+    thresholds[suite][name]: *_ms and seconds are maxima, ops_per_s a minimum.
+    """
+    failures = []
+    results = run['results']
+    for name, row in results.items():
+        if row.get('errors'):
+            failures.append(f"{name}: {row['errors']} errors")
+    if baseline:
+        if baseline.get('suite') != run.get('suite'):
+            failures.append(f"baseline is a {baseline.get('suite')} run, not {run.get('suite')}")
+        for name, row in results.items():
+            old = baseline['results'].get(name)
+            if not old:
+                continue
+            metric, value = headline(row)
+            old_metric, old_value = headline(old)
+            if metric and metric == old_metric and old_value and value > old_value * (1 + max_regression):
+                failures.append(
+                    f"{name}: {metric} {value} vs {old_value} in {baseline['meta'].get('commit') or 'baseline'}"
+                    f" (+{(value / old_value - 1) * 100:.0f}%)"
+                )
+    for name, limits in ((thresholds or {}).get(run.get('suite')) or {}).items():
+        row = results.get(name)
+        if row is None:
+            continue
+        for metric, limit in limits.items():
+            value = row.get(metric)
+            if value is None:
+                continue
+            if metric == 'ops_per_s' and value < limit:
+                failures.append(f"{name}: {metric} {value} below {limit}")
+            elif metric != 'ops_per_s' and value > limit:
+                failures.append(f"{name}: {metric} {value} above {limit}")
+    return failures
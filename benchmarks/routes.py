@@ -0,0 +1,119 @@
+"""The hot web routes as request scenarios, shared by the test-client and HTTP suites.
+
+Each scenario builds one request from sampled data; the suites only differ
+in how they send it.
+"""
+import itertools
+import random
+import time
+from collections import namedtuple
+from urllib.parse import quote
+
+from benchmarks.generate import PASSWORD, STATUS_WEIGHTS
+
+Request = namedtuple('Request', 'method path form files expect')
+Request.__new__.__defaults__ = (None, None, (200,))
+
+# name -> (role the client is logged in as, share of the HTTP load mix, test-client iterations per 10)
+SCENARIOS = {
+    'login': (None, 4, 10),
+    '/list': ('admin', 20, 10),
+    '/search': ('admin', 15, 10),
+    '/store-portal': ('store', 20, 10),
+    '/tech-lookup': ('tech', 15, 10),
+    '/edit GET': ('admin', 10, 10),
+    '/edit POST': ('admin', 10, 10),
+    '/import-csv': ('admin', 2, 2),
+    '/export-csv': ('admin', 1, 1),
+}
+IMPORT_ROWS = 200
+IMPORT_STORE = 'Bench Import'
+
+
+class Samples:
+    """Appliances, search terms and logins drawn from the generated chain."""
+
+    def __init__(self, app_web, count=2000, seed=1):
+        db, Appliance = app_web.db, app_web.Appliance
+        with app_web.app.app_context():
+            rows = db.session.execute(
+                db.select(Appliance.store_name, Appliance.item_number, Appliance.brand, Appliance.model,
+                          Appliance.serial, Appliance.status)
+                .where(Appliance.archived == False, Appliance.store_name.like('Bench Store %'))
+                .order_by(db.func.random()).limit(count)
+            ).all()
+        if not rows:
+            raise ValueError("No generated appliances found; run `python -m benchmarks generate` first.")
+        self.appliances = [row._asdict() for row in rows]
+        self.rng = random.Random(seed)
+        # The largest store is the worst case for the store portal
+        self.store = 'Bench Store 001'
+        self.token = int(time.time())
+        self.imports = itertools.count(1)
+
+    def appliance(self):
+        return self.rng.choice(self.appliances)
+
+    def search_text(self):
+        appliance = self.appliance()
+        kind = self.rng.randrange(4)
+        if kind == 0:
+            return appliance['brand'].lower()
+        if kind == 1:
+            return appliance['model'][:4]
+        if kind == 2:
+            return appliance['serial'][:8]
+        # one character off, to exercise the fuzzy fallback
+        serial = appliance['serial']
+        return serial[:5] + ('0' if serial[5] != '0' else '1') + serial[6:]
+
+    def import_csv(self):
+        n = next(self.imports)
+        lines = ['store_name,item_number,brand,model,serial,status,notes']
+        for i in range(IMPORT_ROWS):
+            lines.append(f'{IMPORT_STORE},{self.token}-{n}-{i},GE,M{i},SN{i},In,')
+        return ('\n'.join(lines) + '\n').encode(), f'bench-{n}.csv'
+
+
+def credentials(role, samples):
+    if role == 'store':
+        return f"bench-store-{samples.store[-3:]}", PASSWORD
+    return f'bench-{role}', PASSWORD
+
+
+def edit_path(appliance):
+    return f"/edit/{quote(appliance['store_name'])}/{quote(appliance['item_number'])}"
+
+
+def build(name, samples):
+    """One Request for the named scenario."""
+    if name == 'login':
+        username, password = credentials(samples.rng.choice(['admin', 'tech', 'store']), samples)
+        return Request('POST', '/', {'username': username, 'password': password}, expect=(302,))
+    if name == '/list':
+        return Request('GET', f'/list?per_page={samples.rng.choice([25, 50, 100])}')
+    if name == '/search':
+        return Request('POST', '/search', {'query': samples.search_text()})
+    if name == '/store-portal':
+        return Request('GET', '/store-portal')
+    if name == '/tech-lookup':
+        appliance = samples.appliance()
+        if samples.rng.random() < 0.8:
+            form = {'store_name': appliance['store_name'], 'item_number': appliance['item_number']}
+        else:
+            form = {'store_name': '', 'item_number': appliance['item_number']}
+        return Request('POST', '/tech-lookup', form, expect=(200, 302))
+    if name == '/edit GET':
+        appliance = samples.appliance()
+        return Request('GET', edit_path(appliance))
+    if name == '/edit POST':
+        appliance = samples.appliance()
+        statuses = list(STATUS_WEIGHTS)
+        appliance['status'] = statuses[(statuses.index(appliance['status']) + 1) % len(statuses)]
+        form = dict(appliance, notes=f'bench {samples.rng.randrange(10 ** 6)}')
+        return Request('POST', edit_path(appliance), form, expect=(302,))
+    if name == '/import-csv':
+        return Request('POST', '/import-csv', files={'csvfile': samples.import_csv()}, expect=(200, 302))
+    if name == '/export-csv':
+        return Request('GET', '/export-csv')
+    raise KeyError(name)
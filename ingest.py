@@ -0,0 +1,169 @@
+"""Parallel CSV ingest, shared by app.py and app_web.py.
+
+Large files are split into byte ranges at line boundaries (never inside a
+quoted field), and the ranges are parsed, normalized and validated in a
+process pool. The caller stays the single writer: parallel_rows() hands the
+clean rows back in file order for it to deduplicate and store.
+
+Run `python ingest.py [directory]` for parse throughput per worker count.
+"""
+import csv
+import io
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+FIELDS = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes']
+CHUNK_BYTES = 8 << 20
+
+
+def csv_files(directory):
+    """The .csv files in a directory, in name order."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith('.csv') and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def plan_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """Split one CSV file into tasks of roughly chunk_bytes each.
+
+    Returns a list of (path, start, end, first line number, header) tuples.
+    A cut is only made at a newline with an even number of quotes before it,
+    so quoted fields containing newlines stay in one piece.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            newline = data.find(b'\n')
+            header_end = size if newline == -1 else newline + 1
+            header = next(csv.reader([data[:header_end].decode('utf-8-sig')]), [])
+            header = [name.strip() for name in header]
+            tasks = []
+            start, line, quotes = header_end, 2, 0
+            while start < size:
+                end = size
+                pos = start + chunk_bytes - 1
+                while pos < size:
+                    cut = data.find(b'\n', pos)
+                    if cut == -1:
+                        break
+                    end = cut + 1
+                    if (quotes + data[start:end].count(b'"')) % 2 == 0:
+                        break
+                    pos, end = end, size
+                piece = data[start:end]
+                quotes += piece.count(b'"')
+                tasks.append((path, start, end, line, header))
+                line += piece.count(b'\n')
+                start = end
+    return tasks
+
+
+def parse_chunk(task, max_lengths=None):
+    """Parse, normalize and validate one planned chunk (runs in a worker process).
+
+    Returns (rows, rejected, duplicates): rows are tuples in FIELDS order,
+    deduplicated within the chunk; rejected holds ('file:line', reason) pairs.
+    """
+    path, start, end, first_line, header = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    where = os.path.basename(path)
+    reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=header)
+    rows = []
+    rejected = []
+    duplicates = 0
+    seen = set()
+    line = first_line
+    for row in reader:
+        values = tuple((row.get(name) or '').strip() for name in FIELDS)
+        if not values[0] or not values[1]:
+            rejected.append((f'{where}:{line}', 'missing store_name or item_number'))
+        elif max_lengths and any(len(value) > max_lengths[name] for name, value in zip(FIELDS, values)):
+            too_long = [name for name, value in zip(FIELDS, values) if len(value) > max_lengths[name]]
+            rejected.append((f'{where}:{line}', f"{', '.join(too_long)} too long"))
+        else:
+            key = (values[0].lower(), values[1])
+            if key in seen:
+                duplicates += 1
+            else:
+                seen.add(key)
+                rows.append(values)
+        line = first_line + reader.line_num
+    return rows, rejected, duplicates
+
+
+def parallel_rows(paths, report, workers=None, chunk_bytes=CHUNK_BYTES, max_lengths=None):
+    """Yield clean rows (dicts) from every file, parsed in a process pool.
+
+    Rows come back in file order, chunk by chunk, as the workers finish them.
+    Worker-side rejections and duplicates are added to report['rejected'] and
+    report['duplicates']; report['files'] counts the files read.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = []
+    for path in paths:
+        tasks.extend(plan_chunks(path, chunk_bytes))
+    report['files'] = report.get('files', 0) + len(paths)
+    report.setdefault('rejected', [])
+    report.setdefault('duplicates', 0)
+    if not tasks:
+        return
+    if workers == 1 or len(tasks) == 1:
+        results = (parse_chunk(task, max_lengths) for task in tasks)
+        yield from _merge(results, report)
+        return
+    # spawn rather than fork: the parent may hold database connections and threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+        results = pool.map(parse_chunk, tasks, [max_lengths] * len(tasks))
+        yield from _merge(results, report)
+
+
+def _merge(results, report):
+    for rows, rejected, duplicates in results:
+        report['rejected'].extend(rejected)
+        report['duplicates'] += duplicates
+        for values in rows:
+            yield dict(zip(FIELDS, values))
+
+
+def benchmark(directory=None, rows=500000):
+    """Print parse throughput for 1..cpu_count workers over a directory (or synthetic files)."""
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if directory:
+            paths = csv_files(directory)
+        else:
+            paths = []
+            for n in range(8):
+                path = os.path.join(tmp, f'store{n}.csv')
+                with open(path, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(FIELDS)
+                    for i in range(rows // 8):
+                        writer.writerow([f'Store {n}', f'{n}-{i:07d}', 'Whirlpool', f'M{i % 900}',
+                                         f'SN{i:09d}', 'In', 'left at dock, "fragile"' if i % 5 == 0 else ''])
+                paths.append(path)
+        size = sum(os.path.getsize(path) for path in paths) / 1e6
+        print(f"{len(paths)} files, {size:.1f} MB")
+        print(f"{'workers':>8}{'seconds':>10}{'rows/s':>12}{'MB/s':>8}")
+        counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        for workers in counts:
+            report = {}
+            start = time.perf_counter()
+            count = sum(1 for _ in parallel_rows(paths, report, workers=workers, chunk_bytes=4 << 20))
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>8}{elapsed:>10.2f}{count / elapsed:>12.0f}{size / elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
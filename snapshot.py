@@ -0,0 +1,261 @@
+"""Compact binary snapshots of appliance data, shared by app.py and app_web.py.
+
+A snapshot stores a table column by column:
+
+    header   b'APSN', version (u8), compression (u8), row count (u32), column count (u16)
+    column   name length (u16), name (utf-8), kind (u8), flags (u8),
+             stored length (u32), raw length (u32), block
+
+Column kinds:
+
+    TEXT  the values joined with NUL into one utf-8 string
+    DICT  a TEXT block of the distinct values followed by one code per row
+          (u8/u16/u32, whichever fits; the width is in the flags byte)
+    BOOL  one byte per row
+    JSON  a JSON array, for columns holding None, non-strings or NULs
+
+Each block is compressed on its own with zlib or lzma when asked to. The
+reader maps the file with mmap and only copies out one column at a time.
+
+Run `python snapshot.py [rows]` to compare it against JSON and CSV.
+"""
+import io
+import json
+import lzma
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b'APSN'
+VERSION = 1
+HEADER = struct.Struct('<4sBBIH')
+COLUMN = struct.Struct('<BBII')
+NAME_LENGTH = struct.Struct('<H')
+
+TEXT, DICT, BOOL, JSON = range(4)
+COMPRESSION = {'none': 0, 'zlib': 1, 'lzma': 2}
+CODE_TYPES = {1: 'B', 2: 'H', 4: 'I'}
+
+
+def compress(data, method):
+    if method == 1:
+        return zlib.compress(data, 6)
+    if method == 2:
+        return lzma.compress(data, preset=1)
+    return data
+
+
+def decompress(data, method):
+    if method == 1:
+        return zlib.decompress(data)
+    if method == 2:
+        return lzma.decompress(data)
+    return data
+
+
+def is_text(values):
+    return all(type(value) is str for value in values) and '\x00' not in ''.join(values)
+
+
+def encode_column(values, dictionary=False):
+    """Encode one column of values; returns (kind, flags, raw bytes)."""
+    if all(type(value) is bool for value in values):
+        return BOOL, 0, bytes(values)
+    if not is_text(values):
+        return JSON, 0, json.dumps(values, separators=(',', ':')).encode('utf-8')
+    if dictionary:
+        distinct = {}
+        codes = [distinct.setdefault(value, len(distinct)) for value in values]
+        width = 1 if len(distinct) <= 0xFF else 2 if len(distinct) <= 0xFFFF else 4
+        code_array = array(CODE_TYPES[width], codes)
+        if sys.byteorder != 'little':
+            code_array.byteswap()
+        table = '\x00'.join(distinct).encode('utf-8')
+        return DICT, width, struct.pack('<I', len(table)) + table + code_array.tobytes()
+    return TEXT, 0, '\x00'.join(values).encode('utf-8')
+
+
+def split_text(data, count):
+    if count == 0:
+        return []
+    return str(data, 'utf-8').split('\x00')
+
+
+def decode_column(kind, flags, data, count):
+    if kind == BOOL:
+        return [byte == 1 for byte in data]
+    if kind == JSON:
+        return json.loads(str(data, 'utf-8'))
+    if kind == TEXT:
+        return split_text(data, count)
+    table_length = struct.unpack_from('<I', data)[0]
+    table = split_text(data[4:4 + table_length], 1) if table_length or count else []
+    codes = array(CODE_TYPES[flags])
+    codes.frombytes(data[4 + table_length:])
+    if sys.byteorder != 'little':
+        codes.byteswap()
+    if len(codes) != count or (codes and max(codes) >= len(table)):
+        raise ValueError("dictionary codes are corrupt")
+    return list(map(table.__getitem__, codes))
+
+
+def write_snapshot(f, columns, dictionary=(), compression='none'):
+    """Write a dict of column name -> list of values to the binary file object f.
+
+    Columns named in `dictionary` are dictionary-encoded, which suits
+    low-cardinality text like store, brand and status.
+    """
+    method = COMPRESSION[compression]
+    counts = {len(values) for values in columns.values()}
+    if len(counts) > 1:
+        raise ValueError("snapshot columns must all be the same length")
+    count = counts.pop() if counts else 0
+    f.write(HEADER.pack(MAGIC, VERSION, method, count, len(columns)))
+    for name, values in columns.items():
+        kind, flags, raw = encode_column(values, name in dictionary)
+        stored = compress(raw, method)
+        encoded_name = name.encode('utf-8')
+        f.write(NAME_LENGTH.pack(len(encoded_name)) + encoded_name)
+        f.write(COLUMN.pack(kind, flags, len(stored), len(raw)))
+        f.write(stored)
+
+
+def parse_snapshot(buf):
+    """Decode a snapshot held in a bytes-like object; returns (row count, {column: values})."""
+    if len(buf) < HEADER.size:
+        raise ValueError("not a snapshot file (too short)")
+    magic, version, method, count, column_count = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("not a snapshot file")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    offset = HEADER.size
+    columns = {}
+    try:
+        for _ in range(column_count):
+            (name_length,) = NAME_LENGTH.unpack_from(buf, offset)
+            offset += NAME_LENGTH.size
+            name = str(buf[offset:offset + name_length], 'utf-8')
+            offset += name_length
+            kind, flags, stored_length, raw_length = COLUMN.unpack_from(buf, offset)
+            offset += COLUMN.size
+            # Slicing an mmap copies just this column out of the page cache
+            block = buf[offset:offset + stored_length]
+            offset += stored_length
+            if len(block) != stored_length:
+                raise ValueError(f"column {name} is truncated")
+            raw = decompress(block, method)
+            if len(raw) != raw_length:
+                raise ValueError(f"column {name} is corrupt")
+            values = decode_column(kind, flags, raw, count)
+            if len(values) != count:
+                raise ValueError(f"column {name} has {len(values)} values, expected {count}")
+            columns[name] = values
+            del raw, block
+    except (struct.error, zlib.error, lzma.LZMAError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"corrupt snapshot: {e}")
+    return count, columns
+
+
+def read_snapshot(source):
+    """Read a snapshot from a path or binary file object, through mmap when it is a real file."""
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        with open(source, 'rb') as f:
+            return read_snapshot(f)
+    try:
+        fileno = source.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return parse_snapshot(source.read())
+    source.seek(0, io.SEEK_END)
+    if source.tell() == 0:
+        raise ValueError("not a snapshot file (empty)")
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm:
+        return parse_snapshot(mm)
+
+
+def is_snapshot(filename):
+    """True if the file starts with the snapshot magic bytes."""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def rows(count, columns):
+    """Turn decoded columns back into one dict per row."""
+    names = list(columns)
+    return (dict(zip(names, values)) for values in zip(*(columns[name] for name in names)))
+
+
+def benchmark(count=1000000):
+    """Time writing and reading `count` synthetic appliances as JSON, CSV and snapshots."""
+    import csv
+    import os
+    import tempfile
+    import time
+
+    fields = ['store_name', 'item_number', 'brand', 'model', 'serial', 'status', 'notes', 'archived']
+    brands = ['Whirlpool', 'GE', 'Samsung', 'LG', 'Frigidaire', 'Maytag', 'Bosch']
+    statuses = ['In', 'Checked', 'Parts Ordered', 'Repaired', 'Loaded', 'Delivered']
+    columns = {
+        'store_name': [f'Store {i % 40}' for i in range(count)],
+        'item_number': [f'{i:08d}' for i in range(count)],
+        'brand': [brands[i % len(brands)] for i in range(count)],
+        'model': [f'M{i % 5000:05d}' for i in range(count)],
+        'serial': [f'SN{i * 7919 % 10 ** 9:09d}' for i in range(count)],
+        'status': [statuses[i % len(statuses)] for i in range(count)],
+        'notes': ['' if i % 3 else 'customer called' for i in range(count)],
+        'archived': [i % 10 == 0 for i in range(count)],
+    }
+    records = list(rows(count, columns))
+    dictionary = ('store_name', 'brand', 'status')
+
+    def write_json(path):
+        with open(path, 'w') as f:
+            json.dump(records, f)
+
+    def read_json(path):
+        with open(path) as f:
+            return len(json.load(f))
+
+    def write_csv(path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+
+    def read_csv(path):
+        with open(path, newline='') as f:
+            return sum(1 for _ in csv.DictReader(f))
+
+    def snapshot_writer(method):
+        def write(path):
+            with open(path, 'wb') as f:
+                write_snapshot(f, columns, dictionary, method)
+        return write
+
+    def read_snap(path):
+        return sum(1 for _ in rows(*read_snapshot(path)))
+
+    formats = [('json', write_json, read_json), ('csv', write_csv, read_csv)]
+    formats += [(f'snapshot/{method}', snapshot_writer(method), read_snap) for method in COMPRESSION]
+    print(f"{count} appliances")
+    print(f"{'format':<16}{'size MB':>10}{'write s':>10}{'read s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write, read in formats:
+            path = os.path.join(tmp, name.replace('/', '-'))
+            start = time.perf_counter()
+            write(path)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            assert read(path) == count
+            read_time = time.perf_counter() - start
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:<16}{size:>10.1f}{written:>10.2f}{read_time:>10.2f}")
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
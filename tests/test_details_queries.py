@@ -0,0 +1,97 @@
+"""The appliance detail pages load the history and its users in a fixed number of statements."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TMP, 'test.db')
+os.environ['JOB_WORKERS'] = '0'
+os.environ['JOB_FOLDER'] = os.path.join(TMP, 'jobs')
+os.environ['CACHE_ENABLED'] = '0'
+os.environ['USER_CACHE_STAMP'] = os.path.join(TMP, 'users.stamp')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app_web import Appliance, StatusHistory, User, app, db  # noqa: E402
+
+HISTORY_USERS = 20
+
+
+@pytest.fixture(scope='module')
+def client():
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.session.add_all([
+            User(username='admin', password_hash=generate_password_hash('a'), role='admin'),
+            User(username='tech', password_hash=generate_password_hash('t'), role='tech'),
+        ])
+        users = [User(username=f'tech{n}', password_hash='-', role='tech') for n in range(HISTORY_USERS)]
+        db.session.add_all(users)
+        for item, entries in (('1', 1), ('2', 300)):
+            appliance = Appliance(store_name='Main', item_number=item, brand='GE', model='M', serial='S',
+                                  status='In', notes='', archived=False, last_updated='2025-01-01 09:00:00')
+            db.session.add(appliance)
+            db.session.flush()
+            db.session.add_all(
+                StatusHistory(appliance_id=appliance.id, user=users[n % HISTORY_USERS], status='Checked',
+                              timestamp=f'2025-01-01 09:{n // 60:02d}:{n % 60:02d}')
+                for n in range(entries)
+            )
+        db.session.commit()
+    return app.test_client()
+
+
+def count_statements(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+        assert response.status_code == 200, response.data[:300]
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def login(client, username, password):
+    client.get('/logout')
+    assert client.post('/', data={'username': username, 'password': password}).status_code == 302
+
+
+@pytest.mark.parametrize('username, password, path', [
+    ('admin', 'a', '/details'),
+    ('tech', 't', '/tech-appliance-details'),
+])
+def test_history_does_not_add_statements(client, username, password, path):
+    login(client, username, password)
+    # Warm up the user and data version caches so both counts see the same state
+    count_statements(client, f'{path}/Main/1')
+    few = count_statements(client, f'{path}/Main/1')
+    many = count_statements(client, f'{path}/Main/2')
+    assert len(many) == len(few), many
+    # The appliance, then its history joined to the users behind it
+    assert len([s for s in many if 'status_history' in s]) == 1, many
+    assert len(many) <= 3, many
+
+
+@pytest.mark.parametrize('username, password, path', [
+    ('admin', 'a', '/details'),
+    ('tech', 't', '/tech-appliance-details'),
+])
+def test_history_page_does_not_add_statements(client, username, password, path):
+    login(client, username, password)
+    count_statements(client, f'{path}/Main/2?history_page=2')
+    statements = count_statements(client, f'{path}/Main/2?history_page=2')
+    assert len([s for s in statements if 'status_history' in s]) == 1, statements
+    assert len(statements) <= 3, statements